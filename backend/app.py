@@ -5,23 +5,37 @@ Stores NULL (not 'NaN') for missing categories, and computes consolidated `final
 import re
 import pdfplumber
 import io
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import pandas as pd
 import json
 import os
 import sqlite3
 import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
+import time
 from datetime import datetime
 from decimal import Decimal
 
 from v2.analytics import AnalyticsService
 from v2.category_store import CategoryStore
 from v2.classifier import RuleBasedClassifier
+from v2.import_jobs import TERMINAL_STATUSES, ImportJobRunner, ImportJobStore
+from v2.importer import (
+    UploadTooLargeError,
+    duplicate_file_payload,
+    expand_uploads,
+    import_statement,
+    import_statements_parallel,
+    spool_upload,
+)
 from v2.models import Transaction
-from v2.parsers import parse_statement, supported_sources
-from v2.rule_store import RuleStore
+from v2.parsers import resolve_source, supported_sources
+from v2.rule_store import RuleStore, pattern_rule
+from v2.rule_suggestions import suggest_rules
 from v2.storage import DuplicateImportError, TransactionRepository, init_v2_db
 
 # --- Robust date to YYYY-MM helper ---
@@ -71,7 +85,19 @@ KEYWORDS_PATH = os.getenv("KEYWORDS_PATH", os.path.join(DATA_DIR, "keywords.json
 SUMMARY_PATH = os.getenv("SUMMARY_PATH", os.path.join(DATA_DIR, "summary_spendings.json"))
 DB_PATH = os.getenv("DB_PATH", os.path.join(DATA_DIR, "transactions.db"))
 V2_CATEGORIES_PATH = os.getenv("V2_CATEGORIES_PATH", os.path.join(APP_DIR, "data", "categories.v2.json"))
-V2_RULES_PATH = os.getenv("V2_RULES_PATH", os.path.join(APP_DIR, "data", "classification_rules.v2.json"))
+# Rules created from the UI are written back, so the live rules file lives in DATA_DIR like
+# keywords.json and is seeded from the one shipped with the app.
+V2_BUNDLED_RULES_PATH = os.path.join(APP_DIR, "data", "classification_rules.v2.json")
+V2_RULES_PATH = os.getenv("V2_RULES_PATH", os.path.join(DATA_DIR, "classification_rules.v2.json"))
+V2_IMPORT_JOBS_DIR = os.getenv("V2_IMPORT_JOBS_DIR", os.path.join(DATA_DIR, "import_jobs"))
+V2_IMPORT_WORKERS = int(os.getenv("V2_IMPORT_WORKERS", "2"))
+V2_MAX_UPLOAD_BYTES = int(os.getenv("V2_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+# Whole request body, checked by Werkzeug before a form is parsed: one maximum size upload
+# plus room for the multipart boundaries, headers and form fields.
+V2_MAX_REQUEST_BYTES = int(os.getenv("V2_MAX_REQUEST_BYTES", str(V2_MAX_UPLOAD_BYTES + 1024 * 1024)))
+# Second classification stage learned from manual categories, for rows no rule matches.
+V2_LEARNED_CLASSIFIER = os.getenv("V2_LEARNED_CLASSIFIER", "0") == "1"
+V2_PARSE_PROCESSES = int(os.getenv("V2_PARSE_PROCESSES", str(min(os.cpu_count() or 1, 4))))
 
 # --- Simple DB helper (sqlite) ---
 def init_db():
@@ -96,6 +122,7 @@ def init_db():
 
 init_db()
 init_v2_db(DB_PATH)
+RuleStore.seed_json_file(V2_RULES_PATH, V2_BUNDLED_RULES_PATH)
 
 # --- Load categories and keywords ---
 with open(CATEGORIES_PATH, "r", encoding="utf-8") as f:
@@ -525,16 +552,70 @@ def clean_amount_string(amount_str: str) -> str:
 
 # --- App ---
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = V2_MAX_REQUEST_BYTES if V2_MAX_UPLOAD_BYTES > 0 else None
 CORS(app)
 
 
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"detail": f"Request exceeds the maximum size of {app.config['MAX_CONTENT_LENGTH']} bytes"}), 413
+
+
 def get_v2_services():
     category_store = CategoryStore.from_json_file(V2_CATEGORIES_PATH)
     rule_store = RuleStore.from_json_file(V2_RULES_PATH, category_store=category_store)
-    classifier = RuleBasedClassifier(rule_store)
+    fallback = None
+    if V2_LEARNED_CLASSIFIER:
+        # Imported here so numpy is only loaded when the learned classifier is enabled.
+        from v2.learned_classifier import NaiveBayesClassifier
+
+        fallback = NaiveBayesClassifier(TransactionRepository(DB_PATH), category_store.active_keys())
+    classifier = RuleBasedClassifier(rule_store, fallback=fallback)
     return category_store, rule_store, classifier
 
 
+_v2_import_jobs: Optional[ImportJobRunner] = None
+_v2_import_jobs_lock = threading.Lock()
+
+
+def get_v2_import_jobs() -> ImportJobRunner:
+    # Created lazily so each gunicorn worker gets its own pool and sweeper thread after fork.
+    global _v2_import_jobs
+    with _v2_import_jobs_lock:
+        if _v2_import_jobs is None:
+            _v2_import_jobs = ImportJobRunner(
+                ImportJobStore(DB_PATH, V2_IMPORT_JOBS_DIR),
+                lambda: get_v2_services()[2],
+                max_workers=V2_IMPORT_WORKERS,
+            )
+            _v2_import_jobs.start()
+        return _v2_import_jobs
+
+
+_v2_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_v2_parse_pool() -> ProcessPoolExecutor:
+    # pdfplumber is CPU-bound and holds the GIL, so PDFs are parsed in separate processes.
+    # "spawn" avoids forking a process that already runs request and import threads.
+    global _v2_parse_pool
+    with _v2_import_jobs_lock:
+        if _v2_parse_pool is None:
+            _v2_parse_pool = ProcessPoolExecutor(
+                max_workers=V2_PARSE_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _v2_parse_pool
+
+
+@app.before_request
+def start_v2_import_jobs():
+    # Each worker resumes jobs queued or interrupted by a previous one on its first request;
+    # from then on its sweeper picks up the jobs of workers that die.
+    if _v2_import_jobs is None:
+        get_v2_import_jobs()
+
+
 def get_v2_analytics():
     category_store, _, _ = get_v2_services()
     return AnalyticsService(DB_PATH, category_store)
@@ -558,6 +639,49 @@ def get_v2_classification_rules():
         return jsonify({"detail": f"Error loading v2 classification rules: {e}"}), 500
 
 
+@app.route("/v2/classification-rules", methods=["POST"])
+def create_v2_classification_rule():
+    try:
+        payload = request.get_json() or {}
+        pattern = str(payload.get("pattern") or "").strip()
+        category_key = str(payload.get("category_key") or "").strip()
+        if not pattern or not category_key:
+            return jsonify({"detail": "pattern and category_key are required"}), 400
+
+        category_store, _, _ = get_v2_services()
+        category_store.require(category_key)
+        rule = pattern_rule(pattern, category_key)
+        RuleStore.append_to_json_file(V2_RULES_PATH, rule)
+        return jsonify({"ok": True, "rule_key": rule.key})
+    except (KeyError, ValueError) as e:
+        return jsonify({"detail": str(e)}), 400
+    except Exception as e:
+        return jsonify({"detail": f"Error creating v2 classification rule: {e}"}), 500
+
+
+@app.route("/v2/classification-rules/suggestions", methods=["GET"])
+def get_v2_classification_rule_suggestions():
+    try:
+        min_cluster_size = max(request.args.get("min_cluster_size", default=3, type=int), 1)
+        limit = min(request.args.get("limit", default=50, type=int), 500)
+        category_store, _, _ = get_v2_services()
+        active_keys = category_store.active_keys()
+        repo = TransactionRepository(DB_PATH)
+        suggestions = suggest_rules(
+            repo.unclassified_descriptions(),
+            [
+                (description, category_key)
+                for description, _, category_key in repo.manual_labels()
+                if category_key in active_keys
+            ],
+            min_cluster_size=min_cluster_size,
+            limit=limit,
+        )
+        return jsonify({"suggestions": [suggestion.as_api_payload() for suggestion in suggestions]})
+    except Exception as e:
+        return jsonify({"detail": f"Error suggesting v2 classification rules: {e}"}), 500
+
+
 @app.route("/v2/sources", methods=["GET"])
 def get_v2_sources():
     return jsonify({"sources": supported_sources()})
@@ -643,6 +767,18 @@ def classify_v2_transaction(tx_id):
         return jsonify({"detail": f"Error updating v2 transaction: {e}"}), 500
 
 
+@app.route("/v2/transactions/<int:tx_id>/raw", methods=["GET"])
+def get_v2_transaction_raw(tx_id):
+    try:
+        repo = TransactionRepository(DB_PATH)
+        raw_data = repo.get_raw_data(tx_id)
+        if raw_data is None:
+            return jsonify({"detail": f"Transaction {tx_id} not found"}), 404
+        return jsonify({"id": tx_id, "raw_data": raw_data})
+    except Exception as e:
+        return jsonify({"detail": f"Error fetching v2 transaction raw data: {e}"}), 500
+
+
 @app.route("/v2/transactions/<int:tx_id>", methods=["DELETE"])
 def delete_v2_transaction(tx_id):
     try:
@@ -655,6 +791,147 @@ def delete_v2_transaction(tx_id):
         return jsonify({"detail": f"Error deleting v2 transaction: {e}"}), 500
 
 
+def _v2_bulk_target_ids(payload: dict, repo: TransactionRepository) -> list[int]:
+    if "ids" in payload:
+        if not isinstance(payload["ids"], list):
+            raise ValueError("'ids' must be a list")
+        ids = [int(i) for i in payload["ids"] if str(i).isdigit()]
+        if not ids:
+            raise ValueError("No valid ids provided")
+        return ids
+
+    filters = payload.get("filter")
+    if not isinstance(filters, dict):
+        raise ValueError("JSON body with 'ids' list or 'filter' object required")
+    classified = str(filters.get("classified") or "all").strip().lower()
+    if classified not in ("all", "classified", "unclassified"):
+        raise ValueError("classified must be all, classified or unclassified")
+    criteria = {
+        name: (str(filters.get(name) or "").strip() or None)
+        for name in ("year", "month", "budget_month", "source")
+    }
+    # An empty filter selects every transaction; that has to be asked for explicitly.
+    if classified == "all" and not any(criteria.values()) and payload.get("all") is not True:
+        raise ValueError("filter must narrow by year, month, budget_month, source or classified, or set 'all': true")
+    return repo.list_ids(classified=classified, **criteria)
+
+
+def _v2_bulk_results(outcome: dict[int, bool]) -> list[dict[str, object]]:
+    return [
+        {"id": tx_id, "ok": ok} if ok else {"id": tx_id, "ok": False, "detail": "not found"}
+        for tx_id, ok in outcome.items()
+    ]
+
+
+@app.route("/v2/transactions/classify_many", methods=["POST"])
+def classify_v2_transactions_many():
+    try:
+        payload = request.get_json() or {}
+        category_key = payload.get("category_key")
+        if category_key is not None:
+            category_key = str(category_key).strip() or None
+
+        category_store, _, _ = get_v2_services()
+        if category_key is not None:
+            category_store.require(category_key)
+
+        repo = TransactionRepository(DB_PATH)
+        ids = _v2_bulk_target_ids(payload, repo)
+        outcome = repo.set_manual_category_many(ids, category_key)
+        return jsonify({
+            "ok": True,
+            "category_key": category_key,
+            "updated": sum(1 for ok in outcome.values() if ok),
+            "results": _v2_bulk_results(outcome),
+        })
+    except (KeyError, ValueError) as e:
+        return jsonify({"detail": str(e)}), 400
+    except Exception as e:
+        return jsonify({"detail": f"Error updating v2 transactions: {e}"}), 500
+
+
+@app.route("/v2/transactions/classify_counterparty", methods=["POST"])
+def classify_v2_counterparty():
+    try:
+        payload = request.get_json() or {}
+        counterparty_key = str(payload.get("counterparty_key") or "").strip()
+        category_key = str(payload.get("category_key") or "").strip()
+        if not counterparty_key or not category_key:
+            return jsonify({"detail": "counterparty_key and category_key are required"}), 400
+
+        category_store, _, _ = get_v2_services()
+        category_store.require(category_key)
+
+        repo = TransactionRepository(DB_PATH)
+        updated = repo.classify_counterparty(counterparty_key, category_key)
+
+        # The rows are classified either way; a rule that already exists for this
+        # counterparty is reported, not an error.
+        rule = None
+        rule_created = False
+        if payload.get("create_rule"):
+            rule = pattern_rule(counterparty_key, category_key)
+            try:
+                RuleStore.append_to_json_file(V2_RULES_PATH, rule)
+                rule_created = True
+            except ValueError:
+                pass
+        return jsonify({
+            "ok": True,
+            "counterparty_key": counterparty_key,
+            "category_key": category_key,
+            "updated": updated,
+            "rule_key": rule.key if rule else None,
+            "rule_created": rule_created,
+        })
+    except (KeyError, ValueError) as e:
+        return jsonify({"detail": str(e)}), 400
+    except Exception as e:
+        return jsonify({"detail": f"Error classifying v2 counterparty: {e}"}), 500
+
+
+@app.route("/v2/transactions/delete_many", methods=["POST"])
+def delete_v2_transactions_many():
+    try:
+        payload = request.get_json() or {}
+        repo = TransactionRepository(DB_PATH)
+        ids = _v2_bulk_target_ids(payload, repo)
+        outcome = repo.delete_many(ids)
+        return jsonify({
+            "ok": True,
+            "deleted": sum(1 for ok in outcome.values() if ok),
+            "results": _v2_bulk_results(outcome),
+        })
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), 400
+    except Exception as e:
+        return jsonify({"detail": f"Error deleting v2 transactions: {e}"}), 500
+
+
+@app.route("/v2/import-batches", methods=["GET"])
+def get_v2_import_batches():
+    try:
+        source = (request.args.get("source") or "").strip() or None
+        limit = min(request.args.get("limit", default=200, type=int), 2000)
+        offset = max(request.args.get("offset", default=0, type=int), 0)
+        repo = TransactionRepository(DB_PATH)
+        return jsonify({"import_batches": repo.list_import_batches(source=source, limit=limit, offset=offset)})
+    except Exception as e:
+        return jsonify({"detail": f"Error fetching v2 import batches: {e}"}), 500
+
+
+@app.route("/v2/import-batches/<int:batch_id>", methods=["DELETE"])
+def rollback_v2_import_batch(batch_id):
+    try:
+        repo = TransactionRepository(DB_PATH)
+        deleted = repo.rollback_import_batch(batch_id)
+        if deleted is None:
+            return jsonify({"detail": f"Import batch {batch_id} not found"}), 404
+        return jsonify({"ok": True, "import_batch_id": batch_id, "deleted": deleted})
+    except Exception as e:
+        return jsonify({"detail": f"Error rolling back v2 import batch: {e}"}), 500
+
+
 @app.route("/v2/analytics/summary", methods=["GET"])
 def get_v2_analytics_summary():
     try:
@@ -673,16 +950,39 @@ def get_v2_analytics_monthly():
         return jsonify({"detail": f"Error generating v2 monthly analytics: {e}"}), 500
 
 
+@app.route("/v2/analytics/dashboard", methods=["GET"])
+def get_v2_analytics_dashboard():
+    try:
+        year = (request.args.get("year") or "").strip() or None
+        month = (request.args.get("month") or "").strip() or None
+        return jsonify(get_v2_analytics().dashboard(year=year, month=month))
+    except Exception as e:
+        return jsonify({"detail": f"Error generating v2 dashboard: {e}"}), 500
+
+
 @app.route("/v2/analytics/details", methods=["GET"])
 def get_v2_analytics_details():
     try:
         category_key = (request.args.get("category_key") or "").strip()
-        budget_month = (request.args.get("budget_month") or "").strip()
-        if not category_key or not budget_month:
-            return jsonify({"detail": "category_key and budget_month are required"}), 400
-        return jsonify(get_v2_analytics().details(category_key=category_key, budget_month=budget_month))
+        budget_month = (request.args.get("budget_month") or "").strip() or None
+        from_month = (request.args.get("from_month") or "").strip() or None
+        to_month = (request.args.get("to_month") or "").strip() or None
+        limit = min(request.args.get("limit", default=500, type=int), 2000)
+        offset = max(request.args.get("offset", default=0, type=int), 0)
+        if not category_key or not (budget_month or from_month or to_month):
+            return jsonify({"detail": "category_key and budget_month or from_month/to_month are required"}), 400
+        return jsonify(get_v2_analytics().details(
+            category_key=category_key,
+            budget_month=budget_month,
+            from_month=from_month,
+            to_month=to_month,
+            limit=limit,
+            offset=offset,
+        ))
     except KeyError as e:
         return jsonify({"detail": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), 400
     except Exception as e:
         return jsonify({"detail": f"Error fetching v2 analytics details: {e}"}), 500
 
@@ -697,6 +997,25 @@ def get_v2_analytics_unclassified():
         return jsonify({"detail": f"Error generating v2 unclassified stats: {e}"}), 500
 
 
+@app.route("/v2/analytics/unclassified/groups", methods=["GET"])
+def get_v2_analytics_unclassified_groups():
+    try:
+        year = (request.args.get("year") or "").strip() or None
+        month = (request.args.get("month") or "").strip() or None
+        source = (request.args.get("source") or "").strip() or None
+        limit = min(request.args.get("limit", default=100, type=int), 2000)
+        offset = max(request.args.get("offset", default=0, type=int), 0)
+        return jsonify(get_v2_analytics().unclassified_groups(
+            year=year,
+            month=month,
+            source=source,
+            limit=limit,
+            offset=offset,
+        ))
+    except Exception as e:
+        return jsonify({"detail": f"Error generating v2 unclassified groups: {e}"}), 500
+
+
 @app.route("/v2/upload-statement", methods=["POST"])
 def upload_statement_v2():
     if "file" not in request.files:
@@ -705,70 +1024,136 @@ def upload_statement_v2():
     if file.filename == "":
         return jsonify({"detail": "No selected file"}), 400
 
-    source = (request.form.get("source") or request.form.get("bank") or "").strip()
-    if not source:
-        return jsonify({"detail": "Missing statement source"}), 400
+    requested_source = (request.form.get("source") or request.form.get("bank") or "").strip() or None
+    if requested_source is not None and requested_source not in supported_sources():
+        return jsonify({"detail": f"Unknown v2 statement source: {requested_source}"}), 400
+
+    run_async = (request.form.get("async") or request.args.get("async") or "").strip().lower() in ("1", "true", "yes")
 
     try:
-        _, _, classifier = get_v2_services()
         repo = TransactionRepository(DB_PATH)
-        file_bytes = file.read()
-        file_hash = hashlib.sha256(file_bytes).hexdigest()
-        transactions = parse_statement(source, file_bytes)
-        import_batch_id = repo.create_import_batch(
-            source=source,
-            filename=file.filename,
-            file_hash=file_hash,
-            transaction_count=len(transactions),
-        )
+        spooled, file_hash = spool_upload(file.stream, max_bytes=V2_MAX_UPLOAD_BYTES)
+        with spooled:
+            # Route or verify the upload from its signature, then reject files that were
+            # already imported, all before spending any time on parsing.
+            source = resolve_source(requested_source, spooled)
+            existing_batch_id = repo.find_import_batch(source, file_hash)
+            if existing_batch_id is not None:
+                return jsonify({**duplicate_file_payload(existing_batch_id), "source": source}), 200
+
+            if run_async:
+                job_id = get_v2_import_jobs().store.create(source, file.filename, spooled)
+                get_v2_import_jobs().submit(job_id)
+                return jsonify({"job_id": job_id, "status": "queued", "source": source}), 202
+
+            _, _, classifier = get_v2_services()
+            summary = import_statement(
+                repo,
+                classifier,
+                source=source,
+                filename=file.filename,
+                stream=spooled,
+                file_hash=file_hash,
+            )
+        return jsonify({**summary.as_api_payload(), "source": source})
+    except UploadTooLargeError as e:
+        return jsonify({"detail": str(e)}), 413
+    except DuplicateImportError as e:
+        return jsonify(duplicate_file_payload(e.import_batch_id)), 200
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), 400
+    except Exception as e:
+        return jsonify({"detail": f"v2 import failed: {e}"}), 500
 
-        inserted_ids = []
-        classified_inserted = 0
-        skipped_duplicates = 0
-        for tx in transactions:
-            result = classifier.classify(tx)
-            tx.apply_classification(result)
-            tx.import_batch_id = import_batch_id
-            inserted_id = repo.insert(tx)
-            if inserted_id is None:
-                skipped_duplicates += 1
-            else:
-                inserted_ids.append(inserted_id)
-                if tx.category_key:
-                    classified_inserted += 1
-
-        repo.update_import_batch_counts(
-            import_batch_id=import_batch_id,
-            inserted_count=len(inserted_ids),
-            duplicate_count=skipped_duplicates,
-        )
 
+@app.route("/v2/upload-statements", methods=["POST"])
+def upload_statements_v2():
+    files = [f for f in request.files.getlist("file") if f.filename]
+    if not files:
+        return jsonify({"detail": "No file part"}), 400
+
+    default_source = (request.form.get("source") or request.form.get("bank") or "").strip() or None
+    try:
+        per_file_sources = json.loads(request.form.get("sources") or "{}")
+    except ValueError:
+        return jsonify({"detail": "sources must be a JSON object of filename to source"}), 400
+    if not isinstance(per_file_sources, dict):
+        return jsonify({"detail": "sources must be a JSON object of filename to source"}), 400
+    known_sources = set(supported_sources())
+    for source in [default_source, *per_file_sources.values()]:
+        if source is not None and source not in known_sources:
+            return jsonify({"detail": f"Unknown v2 statement source: {source}"}), 400
+
+    try:
+        started = time.perf_counter()
+        raw_uploads = []
+        for f in files:
+            spooled, file_hash = spool_upload(f.stream, max_bytes=V2_MAX_UPLOAD_BYTES)
+            with spooled:
+                raw_uploads.append((f.filename, spooled.read(), file_hash))
+        uploads = expand_uploads(raw_uploads)
+        if not uploads:
+            return jsonify({"detail": "No statement files found in upload"}), 400
+
+        _, _, classifier = get_v2_services()
+        repo = TransactionRepository(DB_PATH)
+        results = import_statements_parallel(
+            repo,
+            classifier,
+            [(name, per_file_sources.get(name) or default_source, data, file_hash) for name, data, file_hash in uploads],
+            get_v2_parse_pool(),
+        )
         return jsonify({
-            "duplicate_file": False,
-            "import_batch_id": import_batch_id,
-            "inserted": len(inserted_ids),
-            "skipped_duplicates": skipped_duplicates,
-            "parsed": len(transactions),
-            "classified": classified_inserted,
-            "unclassified": len(inserted_ids) - classified_inserted,
-            "ids": inserted_ids,
+            "files": results,
+            "inserted": sum(int(r.get("inserted", 0)) for r in results),
+            "failed": sum(1 for r in results if not r.get("ok")),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000),
         })
-    except DuplicateImportError as e:
-        return jsonify({
-            "duplicate_file": True,
-            "import_batch_id": e.import_batch_id,
-            "inserted": 0,
-            "skipped_duplicates": 0,
-            "parsed": 0,
-            "classified": 0,
-            "unclassified": 0,
-            "ids": [],
-        }), 200
+    except UploadTooLargeError as e:
+        return jsonify({"detail": str(e)}), 413
     except ValueError as e:
         return jsonify({"detail": str(e)}), 400
     except Exception as e:
         return jsonify({"detail": f"v2 import failed: {e}"}), 500
 
+
+@app.route("/v2/import-jobs/<job_id>", methods=["GET"])
+def get_v2_import_job(job_id):
+    try:
+        job = get_v2_import_jobs().store.get(job_id)
+        if job is None:
+            return jsonify({"detail": f"Import job {job_id} not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({"detail": f"Error fetching v2 import job: {e}"}), 500
+
+
+@app.route("/v2/import-jobs/<job_id>/events", methods=["GET"])
+def stream_v2_import_job(job_id):
+    store = get_v2_import_jobs().store
+    if store.get(job_id) is None:
+        return jsonify({"detail": f"Import job {job_id} not found"}), 404
+
+    def events():
+        last_payload = None
+        while True:
+            job = store.get(job_id)
+            if job is None:
+                return
+            payload = json.dumps(job, ensure_ascii=False)
+            if payload != last_payload:
+                yield f"event: progress\ndata: {payload}\n\n"
+                last_payload = payload
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            time.sleep(0.5)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.route("/upload-statement", methods=["POST"])
 def upload_statement():
     if 'file' not in request.files:
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import re
 import sqlite3
 from collections import defaultdict
 from decimal import Decimal
@@ -9,7 +10,17 @@ from pathlib import Path
 from typing import Optional
 
 from .category_store import CategoryStore
-from .models import CategoryType
+from .models import Category, CategoryType
+from .storage import UNCLASSIFIED_TABLE_SQL, budget_period_sql
+
+
+# Columns the summary, monthly and details views read; the rest of the row stays on disk.
+_ENTRY_COLUMNS = (
+    "id, category_key, budget_month, booking_date, value_date, amount, currency, "
+    "description, counterparty, source"
+)
+
+_BUDGET_MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
 
 
 def _money(value: object) -> float:
@@ -22,6 +33,22 @@ def _display_total(category_type: CategoryType, signed_total: float) -> float:
     return signed_total
 
 
+def _month_bound(value: str) -> str:
+    # Budget months compare as strings, which only works for zero-padded YYYY-MM.
+    if not _BUDGET_MONTH_RE.match(value):
+        raise ValueError(f"Invalid budget month: {value}")
+    return value
+
+
+def _in_period(budget_month: Optional[str], *, year: Optional[str], month: Optional[str]) -> bool:
+    # Mirrors budget_period_sql(), which never matches a NULL month.
+    if year and not (budget_month or "").startswith(f"{year}-"):
+        return False
+    if month and (budget_month or "")[5:7] != month.zfill(2):
+        return False
+    return True
+
+
 def _category_payload(category) -> dict[str, object]:
     return {
         "key": category.key,
@@ -38,138 +65,116 @@ class AnalyticsService:
         self.category_store = category_store
 
     def summary(self, *, year: Optional[str] = None, month: Optional[str] = None) -> dict[str, object]:
-        rows = self._classified_rows(year=year, month=month)
-        grouped: dict[str, dict[str, dict[str, dict[str, object]]]] = {
-            "income": defaultdict(dict),
-            "expense": defaultdict(dict),
-        }
-
-        for row in rows:
+        grouped = self._summary_groups()
+        for row in self._classified_rows(year=year, month=month):
             category = self.category_store.get(row["category_key"])
-            if not category:
-                continue
-
-            signed_amount = _money(row["amount"])
-            type_key = category.type.value
-            group = grouped[type_key][category.group]
-            entry = group.setdefault(
-                category.key,
-                {
-                    "category": _category_payload(category),
-                    "signed_total": 0.0,
-                    "display_total": 0.0,
-                    "count": 0,
-                    "entries": [],
-                },
-            )
-            entry["signed_total"] += signed_amount
-            entry["display_total"] = _display_total(category.type, entry["signed_total"])
-            entry["count"] += 1
-            entry["entries"].append(self._transaction_entry(row))
-
-        return {
-            "income": self._finalize_summary_groups(grouped["income"]),
-            "expense": self._finalize_summary_groups(grouped["expense"]),
-            "unclassified": self.unclassified(year=year, month=month),
-        }
+            if category:
+                self._add_summary_entry(grouped, category, row)
+        return self._summary_payload(grouped, self.unclassified(year=year, month=month))
 
     def monthly(self) -> dict[str, object]:
         rows = self._classified_rows()
-        months = sorted({row["budget_month"] for row in rows if row["budget_month"]})
-
-        by_type: dict[str, dict[str, dict[str, float]]] = {
-            "income": defaultdict(lambda: defaultdict(float)),
-            "expense": defaultdict(lambda: defaultdict(float)),
-        }
-        category_meta = {}
-
+        months = {row["budget_month"] for row in rows if row["budget_month"]}
+        by_type = self._monthly_amounts()
+        category_meta: dict[str, Category] = {}
         for row in rows:
             category = self.category_store.get(row["category_key"])
+            if category and row["budget_month"]:
+                self._add_monthly_amount(by_type, category_meta, category, row)
+        return self._monthly_payload(sorted(months), by_type, category_meta)
+
+    def dashboard(self, *, year: Optional[str] = None, month: Optional[str] = None) -> dict[str, object]:
+        # summary() and monthly() share one scan of the classified rows, and the unclassified
+        # aggregate is queried once for both places it appears. Rows arrive in the order the
+        # separate views read them, so every total is summed identically.
+        grouped = self._summary_groups()
+        by_type = self._monthly_amounts()
+        category_meta: dict[str, Category] = {}
+        months: set[str] = set()
+
+        for row in self._classified_rows():
             budget_month = row["budget_month"]
-            if not category or not budget_month:
+            if budget_month:
+                months.add(budget_month)
+            category = self.category_store.get(row["category_key"])
+            if not category:
                 continue
+            if _in_period(budget_month, year=year, month=month):
+                self._add_summary_entry(grouped, category, row)
+            if budget_month:
+                self._add_monthly_amount(by_type, category_meta, category, row)
 
-            signed_amount = _money(row["amount"])
-            by_type[category.type.value][category.key][budget_month] += signed_amount
-            category_meta[category.key] = category
-
-        def build_payload(type_key: str) -> dict[str, object]:
-            keys = sorted(
-                by_type[type_key].keys(),
-                key=lambda key: category_meta[key].sort_order,
-            )
-            categories = [_category_payload(category_meta[key]) for key in keys]
-            signed_data = {
-                key: [by_type[type_key][key].get(month, 0.0) for month in months]
-                for key in keys
-            }
-            display_data = {
-                key: [
-                    _display_total(category_meta[key].type, by_type[type_key][key].get(month, 0.0))
-                    for month in months
-                ]
-                for key in keys
-            }
-            return {
-                "months": months,
-                "categories": categories,
-                "signed_data": signed_data,
-                "display_data": display_data,
-            }
-
-        income_totals = self._monthly_totals(by_type["income"], months, category_meta, display=False)
-        expense_totals = self._monthly_totals(by_type["expense"], months, category_meta, display=True)
-        net_totals = [income_totals[i] - expense_totals[i] for i in range(len(months))]
-
+        unclassified = self.unclassified(year=year, month=month)
         return {
-            "income": build_payload("income"),
-            "expense": build_payload("expense"),
-            "totals": {
-                "months": months,
-                "income": income_totals,
-                "expense": expense_totals,
-                "net": net_totals,
-            },
+            "summary": self._summary_payload(grouped, unclassified),
+            "monthly": self._monthly_payload(sorted(months), by_type, category_meta),
+            "unclassified": unclassified,
         }
 
-    def details(self, *, category_key: str, budget_month: str) -> dict[str, object]:
+    def details(
+        self,
+        *,
+        category_key: str,
+        budget_month: Optional[str] = None,
+        from_month: Optional[str] = None,
+        to_month: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> dict[str, object]:
         category = self.category_store.require(category_key)
+        if budget_month:
+            from_month = to_month = budget_month
+        where = ["category_key = ?"]
+        params: list[object] = [category_key]
+        if from_month:
+            where.append("budget_month >= ?")
+            params.append(_month_bound(from_month))
+        if to_month:
+            where.append("budget_month <= ?")
+            params.append(_month_bound(to_month))
+        where_sql = " AND ".join(where)
+        # Index order of idx_v2_tx_category_month, so the page query needs no sort step.
+        order_sql = "ORDER BY budget_month, value_date, booking_date, id"
+
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         try:
+            # Count and total of the whole range in one pass over the covering index, so a
+            # page does not fetch every amount in the range.
+            count, signed_total = conn.execute(
+                f"SELECT COUNT(*), TOTAL(amount) FROM v2_transactions WHERE {where_sql}",
+                params,
+            ).fetchone()
             rows = conn.execute(
-                """
-                SELECT *
+                f"""
+                SELECT {_ENTRY_COLUMNS}
                 FROM v2_transactions
-                WHERE category_key = ?
-                  AND budget_month = ?
-                ORDER BY value_date, booking_date, id
+                WHERE {where_sql}
+                {order_sql}
+                LIMIT ? OFFSET ?
                 """,
-                (category_key, budget_month),
+                [*params, -1 if limit is None else limit, offset],
             ).fetchall()
         finally:
             conn.close()
 
         entries = [self._transaction_entry(row) for row in rows]
-        signed_total = sum(_money(row["amount"]) for row in rows)
         return {
             "category": _category_payload(category),
             "budget_month": budget_month,
+            "from_month": from_month,
+            "to_month": to_month,
             "signed_total": signed_total,
             "display_total": _display_total(category.type, signed_total),
-            "count": len(entries),
+            "count": count,
+            "limit": limit,
+            "offset": offset,
             "entries": entries,
         }
 
     def unclassified(self, *, year: Optional[str] = None, month: Optional[str] = None) -> dict[str, object]:
-        where = ["(category_key IS NULL OR TRIM(category_key) = '')"]
-        params: list[object] = []
-        if year:
-            where.append("substr(budget_month, 1, 4) = ?")
-            params.append(year)
-        if month:
-            where.append("substr(budget_month, 6, 2) = ?")
-            params.append(month.zfill(2))
+        period_where, params = budget_period_sql(year, month)
+        where = ["category_key IS NULL", *period_where]
 
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
@@ -177,7 +182,7 @@ class AnalyticsService:
             rows = conn.execute(
                 f"""
                 SELECT budget_month, source, COUNT(*) AS count
-                FROM v2_transactions
+                FROM {UNCLASSIFIED_TABLE_SQL}
                 WHERE {" AND ".join(where)}
                 GROUP BY budget_month, source
                 ORDER BY budget_month DESC, source
@@ -187,37 +192,78 @@ class AnalyticsService:
         finally:
             conn.close()
 
-        total = sum(int(row["count"]) for row in rows)
+        return self._unclassified_payload([(row["budget_month"], row["source"], int(row["count"])) for row in rows])
+
+    def unclassified_groups(
+        self,
+        *,
+        year: Optional[str] = None,
+        month: Optional[str] = None,
+        source: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> dict[str, object]:
+        # Unclassified rows grouped by counterparty_key, biggest absolute total first. The
+        # aggregate runs over idx_v2_tx_unclassified_counterparty alone, already in group order.
+        where, params = budget_period_sql(year, month)
+        where = ["category_key IS NULL", *where]
+        if source:
+            where.append("source = ?")
+            params.append(source)
+
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute(
+                f"""
+                SELECT counterparty_key,
+                       COUNT(*) AS count,
+                       TOTAL(amount) AS signed_total,
+                       MIN(COALESCE(value_date, booking_date)) AS first_date,
+                       MAX(COALESCE(value_date, booking_date)) AS last_date
+                FROM v2_transactions INDEXED BY idx_v2_tx_unclassified_counterparty
+                WHERE {" AND ".join(where)}
+                GROUP BY counterparty_key
+                ORDER BY ABS(signed_total) DESC, count DESC, counterparty_key
+                LIMIT ? OFFSET ?
+                """,
+                [*params, limit, offset],
+            ).fetchall()
+        finally:
+            conn.close()
+
         return {
-            "total": total,
-            "buckets": [
+            "limit": limit,
+            "offset": offset,
+            "groups": [
                 {
-                    "budget_month": row["budget_month"],
-                    "source": row["source"],
+                    "counterparty_key": row["counterparty_key"],
                     "count": int(row["count"]),
+                    "signed_total": row["signed_total"],
+                    "display_total": abs(row["signed_total"]),
+                    "first_date": row["first_date"],
+                    "last_date": row["last_date"],
                 }
                 for row in rows
             ],
         }
 
     def _classified_rows(self, *, year: Optional[str] = None, month: Optional[str] = None) -> list[sqlite3.Row]:
-        where = ["category_key IS NOT NULL", "TRIM(category_key) <> ''"]
-        params: list[object] = []
-        if year:
-            where.append("substr(budget_month, 1, 4) = ?")
-            params.append(year)
-        if month:
-            where.append("substr(budget_month, 6, 2) = ?")
-            params.append(month.zfill(2))
+        period_where, params = budget_period_sql(year, month)
+        where = ["category_key IS NOT NULL", *period_where]
 
+        return self._entry_rows(where, params)
+
+    def _entry_rows(self, where: list[str], params: list[object]) -> list[sqlite3.Row]:
+        where_sql = " WHERE " + " AND ".join(where) if where else ""
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         try:
             return conn.execute(
                 f"""
-                SELECT *
+                SELECT {_ENTRY_COLUMNS}
                 FROM v2_transactions
-                WHERE {" AND ".join(where)}
+                {where_sql}
                 ORDER BY budget_month DESC, value_date DESC, booking_date DESC, id DESC
                 """,
                 params,
@@ -225,6 +271,126 @@ class AnalyticsService:
         finally:
             conn.close()
 
+    @staticmethod
+    def _summary_groups() -> dict[str, dict[str, dict[str, dict[str, object]]]]:
+        return {
+            "income": defaultdict(dict),
+            "expense": defaultdict(dict),
+        }
+
+    @classmethod
+    def _add_summary_entry(
+        cls,
+        grouped: dict[str, dict[str, dict[str, dict[str, object]]]],
+        category: Category,
+        row: sqlite3.Row,
+    ) -> None:
+        signed_amount = _money(row["amount"])
+        group = grouped[category.type.value][category.group]
+        entry = group.setdefault(
+            category.key,
+            {
+                "category": _category_payload(category),
+                "signed_total": 0.0,
+                "display_total": 0.0,
+                "count": 0,
+                "entries": [],
+            },
+        )
+        entry["signed_total"] += signed_amount
+        entry["display_total"] = _display_total(category.type, entry["signed_total"])
+        entry["count"] += 1
+        entry["entries"].append(cls._transaction_entry(row))
+
+    @classmethod
+    def _summary_payload(
+        cls,
+        grouped: dict[str, dict[str, dict[str, dict[str, object]]]],
+        unclassified: dict[str, object],
+    ) -> dict[str, object]:
+        return {
+            "income": cls._finalize_summary_groups(grouped["income"]),
+            "expense": cls._finalize_summary_groups(grouped["expense"]),
+            "unclassified": unclassified,
+        }
+
+    @staticmethod
+    def _monthly_amounts() -> dict[str, dict[str, dict[str, float]]]:
+        return {
+            "income": defaultdict(lambda: defaultdict(float)),
+            "expense": defaultdict(lambda: defaultdict(float)),
+        }
+
+    @staticmethod
+    def _add_monthly_amount(
+        by_type: dict[str, dict[str, dict[str, float]]],
+        category_meta: dict[str, Category],
+        category: Category,
+        row: sqlite3.Row,
+    ) -> None:
+        by_type[category.type.value][category.key][row["budget_month"]] += _money(row["amount"])
+        category_meta[category.key] = category
+
+    @classmethod
+    def _monthly_payload(
+        cls,
+        months: list[str],
+        by_type: dict[str, dict[str, dict[str, float]]],
+        category_meta: dict[str, Category],
+    ) -> dict[str, object]:
+        def build_payload(type_key: str) -> dict[str, object]:
+            keys = sorted(
+                by_type[type_key].keys(),
+                key=lambda key: category_meta[key].sort_order,
+            )
+            categories = [_category_payload(category_meta[key]) for key in keys]
+            signed_data = {
+                key: [by_type[type_key][key].get(month, 0.0) for month in months]
+                for key in keys
+            }
+            display_data = {
+                key: [
+                    _display_total(category_meta[key].type, by_type[type_key][key].get(month, 0.0))
+                    for month in months
+                ]
+                for key in keys
+            }
+            return {
+                "months": months,
+                "categories": categories,
+                "signed_data": signed_data,
+                "display_data": display_data,
+            }
+
+        income_totals = cls._monthly_totals(by_type["income"], months, category_meta, display=False)
+        expense_totals = cls._monthly_totals(by_type["expense"], months, category_meta, display=True)
+        net_totals = [income_totals[i] - expense_totals[i] for i in range(len(months))]
+
+        return {
+            "income": build_payload("income"),
+            "expense": build_payload("expense"),
+            "totals": {
+                "months": months,
+                "income": income_totals,
+                "expense": expense_totals,
+                "net": net_totals,
+            },
+        }
+
+    @staticmethod
+    def _unclassified_payload(buckets: list[tuple[Optional[str], Optional[str], int]]) -> dict[str, object]:
+        return {
+            "total": sum(count for _, _, count in buckets),
+            "buckets": [
+                {
+                    "budget_month": budget_month,
+                    "source": source,
+                    "count": count,
+                }
+                for budget_month, source, count in buckets
+            ],
+        }
+
     @staticmethod
     def _finalize_summary_groups(groups: dict[str, dict[str, dict[str, object]]]) -> list[dict[str, object]]:
         payload = []
@@ -0,0 +1,66 @@
+"""Content-addressed archive of uploaded statement files."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+
+STATEMENT_ARCHIVE_DIR = os.getenv(
+    "V2_STATEMENT_ARCHIVE_DIR",
+    os.path.join(os.getenv("DATA_DIR", os.path.dirname(os.path.dirname(__file__))), "statement_archive"),
+)
+
+
+class StatementArchive:
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def path_for(self, file_hash: str) -> Path:
+        return self.root / file_hash[:2] / f"{file_hash}.gz"
+
+    def put(self, file_bytes: bytes, file_hash: Optional[str] = None) -> str:
+        return self.put_stream(io.BytesIO(file_bytes), file_hash or hashlib.sha256(file_bytes).hexdigest())
+
+    def put_stream(self, stream: BinaryIO, file_hash: str) -> str:
+        path = self.path_for(file_hash)
+        if path.exists():
+            return file_hash
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f, gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6) as gz:
+            shutil.copyfileobj(stream, gz)
+        os.replace(tmp_name, path)
+        return file_hash
+
+    def get(self, file_hash: str) -> Optional[bytes]:
+        try:
+            payload = self.path_for(file_hash).read_bytes()
+        except FileNotFoundError:
+            return None
+        file_bytes = gzip.decompress(payload)
+        if hashlib.sha256(file_bytes).hexdigest() != file_hash:
+            raise ValueError(f"Archived statement {file_hash} is corrupt")
+        return file_bytes
+
+    def __contains__(self, file_hash: str) -> bool:
+        return self.path_for(file_hash).exists()
+
+
+_default_archive: Optional[StatementArchive] = None
+
+
+def default_archive() -> Optional[StatementArchive]:
+    global _default_archive
+    if not STATEMENT_ARCHIVE_DIR:
+        return None
+    if _default_archive is None:
+        _default_archive = StatementArchive(STATEMENT_ARCHIVE_DIR)
+    return _default_archive
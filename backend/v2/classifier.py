@@ -2,20 +2,137 @@
 
 from __future__ import annotations
 
+import functools
 import re
-from typing import Any
+from typing import Iterable, Optional, Protocol
 
-from .models import ClassificationResult, ClassificationSource, MatchType, Transaction
-from .rule_store import RuleStore
+from .models import (
+    TRANSACTION_FIELDS,
+    ClassificationResult,
+    ClassificationRule,
+    ClassificationSource,
+    MatchType,
+    Transaction,
+    TransactionBatch,
+)
+from .rule_store import (
+    RuleStore,
+    contains_tokens,
+    max_edits,
+    normalize_match_text as _normalize,
+    pattern_pieces,
+    tokenize,
+)
 
 
-def _normalize(value: Any) -> str:
-    return str(value or "").strip().casefold()
+_SEPARATOR = "\x00"
+
+UNCLASSIFIED = ClassificationResult(
+    category_key=None,
+    source=ClassificationSource.UNKNOWN,
+    confidence=0.0,
+)
+
+
+class BatchClassifier(Protocol):
+    def classify_batch(self, batch: TransactionBatch) -> list[ClassificationResult]: ...
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(pattern: str) -> Optional[re.Pattern[str]]:
+    try:
+        return re.compile(pattern, flags=re.IGNORECASE)
+    except re.error:
+        return None
+
+
+def _edit_distance_within(pattern: str, text: str, limit: int) -> bool:
+    # Whether some substring of text is within ``limit`` edits of pattern. Myers' bit-parallel
+    # form of the edit distance table: bit i of the vectors holds the vertical differences of
+    # pattern row i, so each text character costs a few integer operations.
+    mask = (1 << len(pattern)) - 1
+    last = 1 << (len(pattern) - 1)
+    peq: dict[str, int] = {}
+    for idx, char in enumerate(pattern):
+        peq[char] = peq.get(char, 0) | (1 << idx)
+    positive, negative, score = mask, 0, len(pattern)
+    if score <= limit:
+        return True
+    for char in text:
+        eq = peq.get(char, 0)
+        vertical = eq | negative
+        horizontal = (((eq & positive) + positive) ^ positive) | eq
+        horizontal_positive = negative | (~(horizontal | positive) & mask)
+        horizontal_negative = positive & horizontal
+        if horizontal_positive & last:
+            score += 1
+        elif horizontal_negative & last:
+            score -= 1
+        if score <= limit:
+            return True
+        # A match may start anywhere, so nothing is shifted into the first row.
+        horizontal_positive = (horizontal_positive << 1) & mask
+        horizontal_negative = (horizontal_negative << 1) & mask
+        positive = horizontal_negative | (~(vertical | horizontal_positive) & mask)
+        negative = horizontal_positive & vertical
+    return False
+
+
+def _fuzzy_find(pattern: str, text: str, limit: int) -> bool:
+    if pattern in text:
+        return True
+    if limit == 0 or len(text) < len(pattern) - limit:
+        return False
+    # Only the text around an intact piece can hold a match, so the table covers just that.
+    for start, piece in pattern_pieces(pattern, limit):
+        found = text.find(piece)
+        while found >= 0:
+            window_start = max(found - start - limit, 0)
+            if _edit_distance_within(pattern, text[window_start:found - start + len(pattern) + limit], limit):
+                return True
+            found = text.find(piece, found + 1)
+    return False
+
+
+def _rule_result(rule: ClassificationRule) -> ClassificationResult:
+    return ClassificationResult(
+        category_key=rule.category_key,
+        source=ClassificationSource.RULE,
+        rule_key=rule.key,
+        confidence=1.0,
+    )
+
+
+def _values_match(rule: ClassificationRule, pattern: str, field_values: Iterable[str]) -> bool:
+    for field_value in field_values:
+        if not field_value:
+            continue
+
+        if rule.match_type == MatchType.CONTAINS and pattern in field_value:
+            return True
+        if rule.match_type == MatchType.EXACT and pattern == field_value:
+            return True
+        if rule.match_type == MatchType.STARTS_WITH and field_value.startswith(pattern):
+            return True
+        if rule.match_type == MatchType.TOKENS and contains_tokens(tokenize(field_value), tokenize(pattern)):
+            return True
+        if rule.match_type == MatchType.FUZZY and _fuzzy_find(pattern, field_value, max_edits(pattern, rule.similarity)):
+            return True
+        if rule.match_type == MatchType.REGEX:
+            regex = _compile(rule.pattern)
+            if regex is None:
+                return False
+            if regex.search(field_value):
+                return True
+
+    return False
 
 
 class RuleBasedClassifier:
-    def __init__(self, rule_store: RuleStore):
+    def __init__(self, rule_store: RuleStore, fallback: Optional[BatchClassifier] = None):
         self.rule_store = rule_store
+        # Second stage for rows no rule matches, e.g. the learned NaiveBayesClassifier.
+        self.fallback = fallback
 
     def classify(self, transaction: Transaction) -> ClassificationResult:
         for rule in self.rule_store.rules:
@@ -24,41 +141,112 @@ class RuleBasedClassifier:
             if rule.source_filter and rule.source_filter != transaction.source:
                 continue
             if self._matches_rule(transaction, rule):
-                return ClassificationResult(
-                    category_key=rule.category_key,
-                    source=ClassificationSource.RULE,
-                    rule_key=rule.key,
-                    confidence=1.0,
-                )
-
-        return ClassificationResult(
-            category_key=None,
-            source=ClassificationSource.UNKNOWN,
-            confidence=0.0,
-        )
+                return _rule_result(rule)
 
-    def _matches_rule(self, transaction: Transaction, rule) -> bool:
-        pattern = _normalize(rule.pattern)
-        if not pattern:
-            return False
+        if self.fallback is not None:
+            return self.fallback.classify_batch(TransactionBatch.from_transactions([transaction]))[0]
+        return UNCLASSIFIED
+
+    def classify_batch(self, batch: TransactionBatch) -> list[ClassificationResult]:
+        results = [UNCLASSIFIED] * len(batch)
+        remaining = list(range(len(batch)))
+        normalized: dict[str, list[str]] = {}
+        framed: dict[tuple[str, ...], list[str]] = {}
+        indexed: dict[tuple[MatchType, str], dict[str, list[int]]] = {}
 
-        for field_name in rule.match_fields:
-            field_value = _normalize(getattr(transaction, field_name, ""))
-            if not field_value:
+        def column(field_name: str) -> list[str]:
+            if field_name not in normalized:
+                values = getattr(batch, field_name) if field_name in TRANSACTION_FIELDS else None
+                normalized[field_name] = [_normalize(value) for value in values] if values else [""] * len(batch)
+            return normalized[field_name]
+
+        def indexed_rows(match_type: MatchType, field_name: str) -> dict[str, list[int]]:
+            # Rule key -> rows whose value the store's index for match_type pairs with it, so
+            # each fuzzy or token rule only visits its own candidates. The index is consulted
+            # once per distinct value, and only for the rows still unmatched when the first
+            # such rule needs the field.
+            if (match_type, field_name) not in indexed:
+                index = self.rule_store.trigram_index if match_type == MatchType.FUZZY else self.rule_store.token_index
+                values = column(field_name)
+                by_value: dict[str, set[str]] = {}
+                rows: dict[str, list[int]] = {}
+                for idx in remaining:
+                    value = values[idx]
+                    keys = by_value.get(value)
+                    if keys is None:
+                        keys = by_value[value] = index.candidates(value)
+                    for key in keys:
+                        rows.setdefault(key, []).append(idx)
+                indexed[match_type, field_name] = rows
+            return indexed[match_type, field_name]
+
+        # Rules are applied one at a time over the rows nothing has matched yet, which keeps
+        # "first matching rule wins" while every column is normalized once per batch.
+        for rule in self.rule_store.rules:
+            if not remaining:
+                break
+            pattern = _normalize(rule.pattern)
+            if not rule.active or not pattern:
                 continue
+            candidates = remaining
+            if rule.source_filter:
+                candidates = [idx for idx in remaining if batch.source[idx] == rule.source_filter]
 
-            if rule.match_type == MatchType.CONTAINS and pattern in field_value:
-                return True
-            if rule.match_type == MatchType.EXACT and pattern == field_value:
-                return True
-            if rule.match_type == MatchType.STARTS_WITH and field_value.startswith(pattern):
-                return True
-            if rule.match_type == MatchType.REGEX:
-                try:
-                    if re.search(rule.pattern, field_value, flags=re.IGNORECASE):
-                        return True
-                except re.error:
-                    return False
+            if rule.match_type == MatchType.TOKENS:
+                matched_rows = {
+                    idx for field_name in rule.match_fields for idx in indexed_rows(MatchType.TOKENS, field_name).get(rule.key, ())
+                }
+                hits = [idx for idx in candidates if idx in matched_rows]
+            elif rule.match_type == MatchType.FUZZY:
+                limit = max_edits(pattern, rule.similarity)
+                open_rows = set(candidates)
+                for field_name in rule.match_fields:
+                    values = column(field_name)
+                    for idx in indexed_rows(MatchType.FUZZY, field_name).get(rule.key, ()):
+                        if idx in open_rows and _fuzzy_find(pattern, values[idx], limit):
+                            open_rows.discard(idx)
+                hits = sorted(set(candidates) - open_rows)
+            elif rule.match_type == MatchType.REGEX or _SEPARATOR in pattern:
+                columns = [column(field_name) for field_name in rule.match_fields]
+                hits = [
+                    idx
+                    for idx in candidates
+                    if _values_match(rule, pattern, [values[idx] for values in columns])
+                ]
+            else:
+                # Fields joined as "\0a\0b\0" turn contains, starts-with and exact matches
+                # into one substring test per row.
+                if rule.match_fields not in framed:
+                    columns = [column(field_name) for field_name in rule.match_fields]
+                    framed[rule.match_fields] = [
+                        _SEPARATOR + _SEPARATOR.join(values) + _SEPARATOR for values in zip(*columns)
+                    ] if columns else [""] * len(batch)
+                rows = framed[rule.match_fields]
+                needle = {
+                    MatchType.CONTAINS: pattern,
+                    MatchType.STARTS_WITH: _SEPARATOR + pattern,
+                    MatchType.EXACT: _SEPARATOR + pattern + _SEPARATOR,
+                }[rule.match_type]
+                hits = [idx for idx in candidates if needle in rows[idx]]
 
-        return False
+            if hits:
+                rule_result = _rule_result(rule)
+                for idx in hits:
+                    results[idx] = rule_result
+                matched = set(hits)
+                remaining = [idx for idx in remaining if idx not in matched]
+
+        if self.fallback is not None and remaining:
+            for idx, result in zip(remaining, self.fallback.classify_batch(batch.take(remaining))):
+                results[idx] = result
+        return results
 
+    def _matches_rule(self, transaction: Transaction, rule: ClassificationRule) -> bool:
+        pattern = _normalize(rule.pattern)
+        if not pattern:
+            return False
+        return _values_match(
+            rule,
+            pattern,
+            (_normalize(getattr(transaction, field_name, "")) for field_name in rule.match_fields),
+        )
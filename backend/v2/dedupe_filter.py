@@ -0,0 +1,53 @@
+"""Bloom filter over transaction dedupe keys."""
+
+from __future__ import annotations
+
+import math
+import struct
+from typing import Iterable
+
+from .models import DEDUPE_KEY_BYTES
+
+
+_HASHES = DEDUPE_KEY_BYTES // 4
+_SLICES = struct.Struct(f"<{_HASHES}I")
+
+
+class DedupeKeyFilter:
+    """Answers "definitely new" or "maybe known" for a dedupe key.
+
+    Dedupe keys already are uniformly distributed hashes, so the bit positions are just
+    the key's 32-bit slices. A false "maybe known" costs one indexed lookup; "definitely
+    new" is only trusted as far as ``INSERT OR IGNORE`` still backs it up.
+    """
+
+    def __init__(self, capacity: int, bits_per_key: int = 10):
+        self.capacity = max(capacity, 1)
+        self.size = max(self.capacity * bits_per_key, 64)
+        self.count = 0
+        self._bits = bytearray(math.ceil(self.size / 8))
+
+    @property
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+    def add(self, key: bytes) -> None:
+        bits = self._bits
+        size = self.size
+        for value in _SLICES.unpack_from(key):
+            position = value % size
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def add_many(self, keys: Iterable[bytes]) -> None:
+        for key in keys:
+            self.add(key)
+
+    def might_contain(self, key: bytes) -> bool:
+        bits = self._bits
+        size = self.size
+        for value in _SLICES.unpack_from(key):
+            position = value % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
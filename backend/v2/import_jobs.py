@@ -0,0 +1,292 @@
+"""Background statement import jobs persisted in SQLite."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+
+from .classifier import RuleBasedClassifier
+from .importer import duplicate_file_payload, import_statement
+from .storage import DuplicateImportError, TransactionRepository, init_v2_db
+
+
+TERMINAL_STATUSES = ("done", "failed")
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+_process_owner: Optional[tuple[int, str]] = None
+
+
+def _owner_id() -> str:
+    # A random id per process boot. Host name and pid repeat after a container restart, so
+    # they cannot tell a dead owner from a live one; liveness comes from heartbeat_at instead.
+    global _process_owner
+    if _process_owner is None or _process_owner[0] != os.getpid():
+        _process_owner = (os.getpid(), uuid.uuid4().hex)
+    return _process_owner[1]
+
+
+class ImportJobStore:
+    def __init__(self, db_path: str | Path, uploads_dir: str | Path):
+        self.db_path = str(db_path)
+        self.uploads_dir = Path(uploads_dir)
+        self.uploads_dir.mkdir(parents=True, exist_ok=True)
+        init_v2_db(self.db_path)
+
+    def create(self, source: str, filename: str, stream: BinaryIO) -> str:
+        job_id = uuid.uuid4().hex
+        upload_path = self.uploads_dir / f"{job_id}.upload"
+        tmp_path = upload_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(stream, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, upload_path)
+
+        now = _now()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(
+                """
+                INSERT INTO v2_import_jobs (
+                    id, source, filename, upload_path, status, stage, created_at, updated_at
+                ) VALUES (?, ?, ?, ?, 'queued', 'queued', ?, ?)
+                """,
+                (job_id, source, filename, str(upload_path), now, now),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return job_id
+
+    def get(self, job_id: str) -> dict[str, object] | None:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute("SELECT * FROM v2_import_jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._row_to_api(row) if row is not None else None
+        finally:
+            conn.close()
+
+    def claim(self, job_id: str) -> bool:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cur = conn.execute(
+                """
+                UPDATE v2_import_jobs
+                SET status = 'running', owner = ?, attempts = attempts + 1, heartbeat_at = ?, updated_at = ?
+                WHERE id = ? AND status = 'queued'
+                """,
+                (_owner_id(), _now(), _now(), job_id),
+            )
+            conn.commit()
+            return cur.rowcount > 0
+        finally:
+            conn.close()
+
+    def update_progress(self, job_id: str, stage: str, processed: int, total: Optional[int]) -> None:
+        # A total of 0 is stored for "unknown" and reported as null.
+        self._update(job_id, stage=stage, processed=processed, total=total or 0)
+
+    def set_import_batch(self, job_id: str, import_batch_id: int) -> None:
+        self._update(job_id, import_batch_id=import_batch_id)
+
+    def complete(self, job_id: str, result: dict[str, object]) -> None:
+        self._update(
+            job_id,
+            status="done",
+            stage="done",
+            result=json.dumps(result, ensure_ascii=False),
+            owner=None,
+        )
+        self._remove_upload(job_id)
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._update(job_id, status="failed", stage="failed", error=error, owner=None)
+        self._remove_upload(job_id)
+
+    def upload_path(self, job_id: str) -> Path:
+        return self.uploads_dir / f"{job_id}.upload"
+
+    def heartbeat(self) -> None:
+        # Marks the jobs this process is running as alive.
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(
+                "UPDATE v2_import_jobs SET heartbeat_at = ? WHERE status = 'running' AND owner = ?",
+                (_now(), _owner_id()),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def recover(self, stale_after: timedelta, *, all_queued: bool = True) -> list[str]:
+        # Re-queues running jobs whose owner has not sent a heartbeat within stale_after and
+        # returns the queued jobs to run: all of them, or only those nobody touched within
+        # stale_after, whose creator died before running them.
+        cutoff = (datetime.now(timezone.utc) - stale_after).isoformat()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                orphaned = [
+                    row[0]
+                    for row in conn.execute(
+                        """
+                        SELECT id FROM v2_import_jobs
+                        WHERE status = 'running' AND COALESCE(heartbeat_at, updated_at) < ?
+                        """,
+                        (cutoff,),
+                    )
+                ]
+                conn.executemany(
+                    """
+                    UPDATE v2_import_jobs
+                    SET status = 'queued', stage = 'queued', owner = NULL, updated_at = ?
+                    WHERE id = ? AND status = 'running'
+                    """,
+                    [(_now(), job_id) for job_id in orphaned],
+                )
+            rows = conn.execute(
+                """
+                SELECT id FROM v2_import_jobs
+                WHERE status = 'queued' AND (? OR updated_at < ?)
+                ORDER BY created_at
+                """,
+                (all_queued, cutoff),
+            ).fetchall()
+            return list(dict.fromkeys([*orphaned, *(row[0] for row in rows)]))
+        finally:
+            conn.close()
+
+    def _update(self, job_id: str, **values: object) -> None:
+        values["updated_at"] = _now()
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(
+                f"UPDATE v2_import_jobs SET {assignments} WHERE id = ?",
+                [*values.values(), job_id],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _remove_upload(self, job_id: str) -> None:
+        try:
+            self.upload_path(job_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _row_to_api(row: sqlite3.Row) -> dict[str, object]:
+        total = int(row["total"] or 0)
+        processed = int(row["processed"] or 0)
+        return {
+            "job_id": row["id"],
+            "source": row["source"],
+            "filename": row["filename"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "processed": processed,
+            "total": total or None,
+            "progress": (processed / total) if total else (1.0 if row["status"] == "done" else None),
+            "import_batch_id": row["import_batch_id"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+
+class ImportJobRunner:
+    def __init__(
+        self,
+        store: ImportJobStore,
+        classifier_factory: Callable[[], RuleBasedClassifier],
+        *,
+        max_workers: int = 2,
+        heartbeat_interval: timedelta = timedelta(seconds=30),
+        stale_after: timedelta = timedelta(minutes=2),
+    ):
+        self.store = store
+        self.classifier_factory = classifier_factory
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="v2-import")
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep, name="v2-import-sweep", daemon=True)
+
+    def start(self) -> list[str]:
+        # Resumes every queued or interrupted job, then keeps heartbeating this process's jobs
+        # and picking up those of workers that died later on.
+        job_ids = self.recover()
+        self._sweeper.start()
+        return job_ids
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def submit(self, job_id: str) -> None:
+        self._executor.submit(self._run, job_id)
+
+    def recover(self, *, all_queued: bool = True) -> list[str]:
+        with self._lock:
+            job_ids = self.store.recover(self.stale_after, all_queued=all_queued)
+            for job_id in job_ids:
+                self.submit(job_id)
+            return job_ids
+
+    def _sweep(self) -> None:
+        while not self._stopped.wait(self.heartbeat_interval.total_seconds()):
+            try:
+                self.store.heartbeat()
+                self.recover(all_queued=False)
+            except Exception:
+                # Whatever failed only delays this round. Ending the thread would stop the
+                # heartbeat, and other workers would take over jobs still running here.
+                logger.exception("Import job heartbeat and recovery round failed")
+
+    def _run(self, job_id: str) -> None:
+        if not self.store.claim(job_id):
+            return
+
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        repo = TransactionRepository(self.store.db_path)
+        try:
+            # A previous attempt may have died half way through; start over from a clean batch.
+            if job["import_batch_id"] is not None:
+                repo.rollback_import_batch(int(job["import_batch_id"]))
+
+            with open(self.store.upload_path(job_id), "rb") as stream:
+                summary = import_statement(
+                    repo,
+                    self.classifier_factory(),
+                    source=str(job["source"]),
+                    filename=str(job["filename"] or ""),
+                    stream=stream,
+                    progress=lambda stage, done, total: self.store.update_progress(job_id, stage, done, total),
+                    on_batch_created=lambda batch_id: self.store.set_import_batch(job_id, batch_id),
+                )
+            self.store.complete(job_id, summary.as_api_payload())
+        except DuplicateImportError as e:
+            self.store.complete(job_id, duplicate_file_payload(e.import_batch_id))
+        except Exception as e:
+            self.store.fail(job_id, str(e))
@@ -0,0 +1,333 @@
+"""Statement import pipeline shared by synchronous uploads and background jobs."""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import itertools
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import Executor, as_completed
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import BinaryIO, Callable, Iterable, Optional
+
+from .archive import default_archive
+from .classifier import RuleBasedClassifier
+from .models import Transaction, TransactionBatch
+from .parsers import SIGNATURES, parse_statement, parse_statement_iter, resolve_source
+from .parsers.pdf_text import record_page_progress
+from .storage import DuplicateImportError, TransactionRepository
+
+
+# (stage, done, total): how far the parser has read the upload, in bytes or PDF pages, or
+# rows when given a list. total is None when there is nothing to measure against.
+ProgressCallback = Callable[[str, int, Optional[int]], None]
+ReadPosition = Callable[[], Optional[tuple[int, int]]]
+
+MAX_ZIP_MEMBERS = 200
+MAX_ZIP_UNCOMPRESSED_BYTES = 256 * 1024 * 1024
+
+# All imports in this process funnel their writes through one lock, so SQLite
+# sees a single writer instead of several threads fighting over the database lock.
+_WRITE_LOCK = threading.Lock()
+
+
+@dataclass
+class ImportSummary:
+    import_batch_id: int
+    parsed: int
+    inserted_ids: list[int] = field(default_factory=list)
+    skipped_duplicates: int = 0
+    classified: int = 0
+
+    def as_api_payload(self) -> dict[str, object]:
+        return {
+            "duplicate_file": False,
+            "import_batch_id": self.import_batch_id,
+            "inserted": len(self.inserted_ids),
+            "skipped_duplicates": self.skipped_duplicates,
+            "parsed": self.parsed,
+            "classified": self.classified,
+            "unclassified": len(self.inserted_ids) - self.classified,
+            "ids": self.inserted_ids,
+        }
+
+
+def duplicate_file_payload(import_batch_id: int) -> dict[str, object]:
+    return {
+        "duplicate_file": True,
+        "import_batch_id": import_batch_id,
+        "inserted": 0,
+        "skipped_duplicates": 0,
+        "parsed": 0,
+        "classified": 0,
+        "unclassified": 0,
+        "ids": [],
+    }
+
+
+class UploadTooLargeError(ValueError):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the maximum size of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+def spool_upload(
+    stream: BinaryIO,
+    *,
+    max_bytes: int,
+    spool_bytes: int = 1024 * 1024,
+    chunk_size: int = 64 * 1024,
+) -> tuple[BinaryIO, str]:
+    """Copy ``stream`` into a spooled temp file while hashing it.
+
+    Small uploads stay in memory and larger ones go to disk. Returns the spooled
+    file rewound to the start, and the sha256 hex digest.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            digest.update(chunk)
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled, digest.hexdigest()
+
+
+def import_statement(
+    repo: TransactionRepository,
+    classifier: RuleBasedClassifier,
+    *,
+    source: str,
+    filename: str,
+    stream: BinaryIO,
+    file_hash: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+    on_batch_created: Optional[Callable[[int], None]] = None,
+) -> ImportSummary:
+    if file_hash is None:
+        file_hash = hashlib.file_digest(stream, "sha256").hexdigest()
+        stream.seek(0)
+    existing_batch_id = repo.find_import_batch(source, file_hash)
+    if existing_batch_id is not None:
+        raise DuplicateImportError(existing_batch_id)
+
+    if progress is not None:
+        progress("parsing", 0, None)
+    with record_page_progress() as pages:
+        position = _read_position(source, stream, pages)
+        transactions = parse_statement_iter(source, stream)
+        summary = store_transactions(
+            repo,
+            classifier,
+            source=source,
+            filename=filename,
+            file_hash=file_hash,
+            transactions=transactions,
+            progress=progress,
+            on_batch_created=on_batch_created,
+            position=position,
+        )
+    stream.seek(0)
+    archive_upload(repo, summary.import_batch_id, file_hash, stream)
+    return summary
+
+
+def _read_position(source: str, stream: BinaryIO, pages: dict[str, int]) -> ReadPosition:
+    # How far the parser has got: pages read of a PDF, bytes read of anything else. The
+    # CSV parsers read through a text wrapper, so the byte position runs at most one
+    # buffer ahead of the rows seen so far.
+    if SIGNATURES[source].kind == "pdf":
+        return lambda: (pages["done"], pages["count"]) if pages["count"] else None
+    start = stream.tell()
+    size = stream.seek(0, io.SEEK_END) - start
+    stream.seek(start)
+    return lambda: (min(stream.tell() - start, size), size) if size else None
+
+
+def archive_upload(repo: TransactionRepository, import_batch_id: int, file_hash: str, stream: BinaryIO) -> None:
+    archive = default_archive()
+    if archive is None:
+        return
+    archive.put_stream(stream, file_hash)
+    repo.mark_import_batch_archived(import_batch_id)
+
+
+def store_transactions(
+    repo: TransactionRepository,
+    classifier: RuleBasedClassifier,
+    *,
+    source: str,
+    filename: str,
+    file_hash: str,
+    transactions: Iterable[Transaction],
+    progress: Optional[ProgressCallback] = None,
+    on_batch_created: Optional[Callable[[int], None]] = None,
+    chunk_size: int = 500,
+    position: Optional[ReadPosition] = None,
+) -> ImportSummary:
+    # ``transactions`` may be a lazy parser stream; only ``chunk_size`` rows are held at a
+    # time, and progress comes from ``position`` since the row count is not known up front.
+    def report_inserted() -> None:
+        if progress is None:
+            return
+        read = position() if position is not None else None
+        if read is not None:
+            progress("inserting", *read)
+        else:
+            progress("inserting", summary.parsed, expected or None)
+
+    expected = len(transactions) if isinstance(transactions, list) else 0
+    # Rows are folded into columnar batches as the parser yields them, so no chunk keeps
+    # a Transaction object (and its raw_data dict) per row alive.
+    batches = TransactionBatch.chunked(transactions, chunk_size)
+    first_batch = next(batches, None)
+
+    with _WRITE_LOCK:
+        import_batch_id = repo.create_import_batch(
+            source=source,
+            filename=filename,
+            file_hash=file_hash,
+            transaction_count=expected,
+        )
+    if on_batch_created is not None:
+        on_batch_created(import_batch_id)
+
+    summary = ImportSummary(import_batch_id=import_batch_id, parsed=0)
+    try:
+        for batch in itertools.chain([first_batch] if first_batch is not None else [], batches):
+            parsed = len(batch)
+            # Overlapping exports make most rows of a re-upload duplicates; drop the stored
+            # ones before spending classification and writes on them.
+            batch.prepare_for_import()
+            known = repo.known_dedupe_keys(batch.dedupe_key)
+            if known:
+                batch = batch.take([idx for idx, key in enumerate(batch.dedupe_key) if key not in known])
+                summary.skipped_duplicates += parsed - len(batch)
+            batch.apply_classifications(classifier.classify_batch(batch))
+            batch.assign_import_batch(import_batch_id)
+            with _WRITE_LOCK:
+                inserted_ids = repo.insert_batch(batch)
+            for category_key, inserted_id in zip(batch.category_key, inserted_ids):
+                if inserted_id is None:
+                    summary.skipped_duplicates += 1
+                else:
+                    summary.inserted_ids.append(inserted_id)
+                    if category_key:
+                        summary.classified += 1
+            summary.parsed += parsed
+            report_inserted()
+    except Exception:
+        # A parse error late in the stream must not leave a half-imported batch behind.
+        with _WRITE_LOCK:
+            repo.rollback_import_batch(import_batch_id)
+        raise
+
+    with _WRITE_LOCK:
+        repo.update_import_batch_counts(
+            import_batch_id=import_batch_id,
+            inserted_count=len(summary.inserted_ids),
+            duplicate_count=summary.skipped_duplicates,
+            transaction_count=summary.parsed,
+        )
+    return summary
+
+
+def expand_uploads(uploads: list[tuple[str, bytes, Optional[str]]]) -> list[tuple[str, bytes, Optional[str]]]:
+    # Items are (filename, file_bytes, sha256 hex digest or None). Archive members have no
+    # digest yet; the archive's own digest says nothing about them.
+    expanded = []
+    for filename, file_bytes, file_hash in uploads:
+        if not zipfile.is_zipfile(io.BytesIO(file_bytes)):
+            expanded.append((filename, file_bytes, file_hash))
+            continue
+
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as archive:
+            members = [
+                info
+                for info in archive.infolist()
+                if not info.is_dir()
+                and not PurePosixPath(info.filename).name.startswith(".")
+                and not info.filename.startswith("__MACOSX/")
+            ]
+            if len(members) > MAX_ZIP_MEMBERS:
+                raise ValueError(f"{filename}: too many files in archive ({len(members)})")
+            if sum(info.file_size for info in members) > MAX_ZIP_UNCOMPRESSED_BYTES:
+                raise ValueError(f"{filename}: archive is too large when extracted")
+            for info in members:
+                expanded.append((f"{filename}/{info.filename}", archive.read(info), None))
+    return expanded
+
+
+def import_statements_parallel(
+    repo: TransactionRepository,
+    classifier: RuleBasedClassifier,
+    uploads: list[tuple[str, Optional[str], bytes, Optional[str]]],
+    executor: Executor,
+) -> list[dict[str, object]]:
+    """Parse uploads concurrently in ``executor`` and write them one by one as they finish.
+
+    ``uploads`` holds ``(filename, source, file_bytes, file_hash)``; a ``None`` source is
+    detected from the file contents, a given one is checked against them, and a ``None``
+    hash is computed here. The result list keeps the order of ``uploads``.
+    """
+    results: list[dict[str, object]] = [{} for _ in uploads]
+    sources: list[Optional[str]] = []
+    file_hashes: list[str] = []
+    futures = {}
+    for idx, (filename, requested_source, file_bytes, file_hash) in enumerate(uploads):
+        file_hashes.append(file_hash or hashlib.sha256(file_bytes).hexdigest())
+        # Sniffing is cheap, so unknown or mismatched files are rejected before they reach the pool.
+        try:
+            source = resolve_source(requested_source, io.BytesIO(file_bytes))
+        except Exception as e:
+            sources.append(None)
+            results[idx] = {"filename": filename, "source": requested_source, "ok": False, "detail": str(e)}
+            continue
+        sources.append(source)
+        # Files imported before are reported without spending a parse on them.
+        existing_batch_id = repo.find_import_batch(source, file_hashes[idx])
+        if existing_batch_id is not None:
+            results[idx] = {"filename": filename, "source": source, **duplicate_file_payload(existing_batch_id), "ok": True}
+            continue
+        futures[executor.submit(parse_statement, source, file_bytes)] = idx
+
+    for future in as_completed(futures):
+        idx = futures[future]
+        filename, _, file_bytes, _ = uploads[idx]
+        source = sources[idx]
+        file_hash = file_hashes[idx]
+        entry: dict[str, object] = {"filename": filename, "source": source}
+        try:
+            transactions = future.result()
+            summary = store_transactions(
+                repo,
+                classifier,
+                source=source,
+                filename=filename,
+                file_hash=file_hash,
+                transactions=transactions,
+            )
+            archive_upload(repo, summary.import_batch_id, file_hash, io.BytesIO(file_bytes))
+            entry.update(summary.as_api_payload())
+            entry["ok"] = True
+        except DuplicateImportError as e:
+            entry.update(duplicate_file_payload(e.import_batch_id))
+            entry["ok"] = True
+        except Exception as e:
+            entry["ok"] = False
+            entry["detail"] = str(e)
+        results[idx] = entry
+    return results
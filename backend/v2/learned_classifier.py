@@ -0,0 +1,136 @@
+"""Naive Bayes fallback for transactions no classification rule matches.
+
+The model is the per-category feature counts of manually classified rows that
+``TransactionRepository`` keeps up to date with every manual edit, so training after an edit
+is a handful of counter updates and loading the model is two small table reads. Scoring a
+batch is one gather and one segmented sum over a (categories x features) log-likelihood
+matrix, followed by a softmax that yields real probabilities.
+"""
+
+from __future__ import annotations
+
+import itertools
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .models import ClassificationResult, ClassificationSource, TransactionBatch, label_features
+from .storage import TransactionRepository
+
+
+# Laplace smoothing for features a category has never been seen with.
+ALPHA = 1.0
+# Naive Bayes probabilities are overconfident, so only near-certain predictions are kept;
+# everything else stays unclassified for triage.
+MIN_CONFIDENCE = 0.95
+MIN_DOCUMENTS = 2
+# Share of a row's features that must have been seen in the labels before it is scored at
+# all. One shared word in an otherwise unknown description is not evidence enough, and the
+# probability would mostly reflect that word, however confident it looks.
+MIN_KNOWN_SHARE = 0.5
+
+_UNCLASSIFIED = ClassificationResult(category_key=None, source=ClassificationSource.UNKNOWN, confidence=0.0)
+
+
+class _Model:
+    def __init__(
+        self,
+        documents: list[tuple[str, int]],
+        features: list[tuple[str, int, int]],
+        category_keys: Optional[set[str]],
+    ):
+        self.categories = sorted(
+            category_key
+            for category_key, count in documents
+            if count >= MIN_DOCUMENTS and (category_keys is None or category_key in category_keys)
+        )
+        category_index = {category_key: idx for idx, category_key in enumerate(self.categories)}
+        category_idx, feature_values, counts = np.array(
+            [
+                (category_index[category_key], feature, count)
+                for category_key, feature, count in features
+                if category_key in category_index
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 3).T
+        self.vocabulary, feature_idx = np.unique(feature_values, return_inverse=True)
+
+        vocabulary_size = len(self.vocabulary)
+        counts_matrix = np.zeros((len(self.categories), vocabulary_size))
+        counts_matrix[category_idx, feature_idx] = counts
+        totals = counts_matrix.sum(axis=1, keepdims=True)
+        log_likelihood = np.log(counts_matrix + ALPHA) - np.log(totals + ALPHA * vocabulary_size)
+        # Features outside the vocabulary are left out of the sum, through one extra column of
+        # zeros. Scoring them with the smoothing term would favour the category with the fewest
+        # training tokens for every unknown word.
+        self.log_likelihood = np.hstack([log_likelihood, np.zeros((len(self.categories), 1))])
+        document_counts = dict(documents)
+        priors = np.array([document_counts[category_key] for category_key in self.categories], dtype=np.float64)
+        self.log_prior = np.log(priors / priors.sum()) if len(priors) else priors
+
+    def predict(self, feature_lists: list[list[int]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Returns (rows with MIN_KNOWN_SHARE of their features seen in the labels, best
+        # category per such row, its probability).
+        lengths = np.fromiter(map(len, feature_lists), dtype=np.int64, count=len(feature_lists))
+        rows = np.flatnonzero(lengths)
+        flat = np.fromiter(itertools.chain.from_iterable(feature_lists), dtype=np.int64, count=int(lengths.sum()))
+        if not len(flat) or len(self.categories) < 2:
+            return rows[:0], rows[:0], np.zeros(0)
+
+        columns = np.searchsorted(self.vocabulary, flat)
+        known = columns < len(self.vocabulary)
+        known[known] = self.vocabulary[columns[known]] == flat[known]
+        columns[~known] = len(self.vocabulary)
+
+        # Features of a row are contiguous in ``flat``, so one reduceat sums each row's
+        # log likelihoods for every category at once.
+        starts = (np.cumsum(lengths) - lengths)[rows]
+        known_counts = np.add.reduceat(known.astype(np.int64), starts)
+        seen = (known_counts > 0) & (known_counts >= MIN_KNOWN_SHARE * lengths[rows])
+        rows = rows[seen]
+        if not len(rows):
+            return rows, rows, np.zeros(0)
+        scores = np.add.reduceat(self.log_likelihood[:, columns], starts, axis=1)[:, seen] + self.log_prior[:, None]
+        scores -= scores.max(axis=0)
+        probabilities = np.exp(scores)
+        probabilities /= probabilities.sum(axis=0)
+        best = probabilities.argmax(axis=0)
+        return rows, best, probabilities[best, np.arange(len(rows))]
+
+
+class NaiveBayesClassifier:
+    """Classifies whole batches from manual labels; see ``RuleBasedClassifier(fallback=...)``."""
+
+    def __init__(
+        self,
+        repo: TransactionRepository,
+        category_keys: Optional[Iterable[str]] = None,
+        *,
+        min_confidence: float = MIN_CONFIDENCE,
+    ):
+        self.repo = repo
+        self.category_keys = set(category_keys) if category_keys is not None else None
+        self.min_confidence = min_confidence
+        self._model: Optional[_Model] = None
+
+    @property
+    def model(self) -> _Model:
+        # Loaded on first use: services are built per request, most of which never classify.
+        if self._model is None:
+            self._model = _Model(*self.repo.label_counts(), self.category_keys)
+        return self._model
+
+    def classify_batch(self, batch: TransactionBatch) -> list[ClassificationResult]:
+        results = [_UNCLASSIFIED] * len(batch)
+        model = self.model
+        rows, best, confidence = model.predict(
+            [label_features(description, counterparty) for description, counterparty in zip(batch.description, batch.counterparty)]
+        )
+        for idx, category_idx, probability in zip(rows.tolist(), best.tolist(), confidence.tolist()):
+            if probability >= self.min_confidence:
+                results[idx] = ClassificationResult(
+                    category_key=model.categories[category_idx],
+                    source=ClassificationSource.MODEL,
+                    confidence=probability,
+                )
+        return results
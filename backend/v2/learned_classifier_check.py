@@ -0,0 +1,115 @@
+"""Regression checks for the learned fallback classifier.
+
+Run from the backend directory::
+
+    python -m v2.learned_classifier_check    # exit status 1 on any failed case
+
+Each case labels transactions manually in a temporary database, the way the triage UI
+does, and checks what ``NaiveBayesClassifier`` makes of new descriptions: merchants it has
+seen must be recognised, and merchants it has not seen must stay unclassified however the
+labelled categories are balanced.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Optional
+
+from .learned_classifier import NaiveBayesClassifier
+from .models import ClassificationSource, Transaction, TransactionBatch
+from .storage import TransactionRepository
+
+
+@dataclass(frozen=True)
+class LabelCase:
+    name: str
+    # (description pattern with {n} for a running number, category_key, labelled rows)
+    labels: tuple[tuple[str, str, int], ...]
+    # (description, expected category_key or None for unclassified)
+    expected: tuple[tuple[str, Optional[str]], ...]
+
+
+CASES = (
+    LabelCase(
+        "unseen merchants next to a small category",
+        labels=(("REWE MARKT {n}", "groceries", 100), ("NETFLIX.COM {n}", "subscriptions", 5)),
+        expected=(
+            ("UNKNOWN SHOP 4711", None),
+            ("Tankstelle Aral 12", None),
+            ("Amazon Marketplace 123 456", None),
+            ("REWE MARKT 98765", "groceries"),
+        ),
+    ),
+    LabelCase(
+        "one shared word is not enough",
+        labels=(("EDEKA CENTER KARTENZAHLUNG {n}", "groceries", 20), ("SHELL TANKSTELLE {n}", "fuel", 20)),
+        expected=(
+            ("EDEKA CENTER KARTENZAHLUNG 55", "groceries"),
+            ("SHELL TANKSTELLE 9", "fuel"),
+            ("Zahlung Kino 4711", None),
+            ("CENTER PARKS 1", None),
+        ),
+    ),
+)
+
+
+def _transaction(description: str, number: int) -> Transaction:
+    return Transaction(
+        booking_date=f"2024-{number % 12 + 1:02d}-{number % 28 + 1:02d}",
+        value_date=None,
+        amount=Decimal(f"-{number % 97 + 1}.{number % 100:02d}"),
+        currency="EUR",
+        description=description,
+        counterparty=None,
+        source="dkb_giro",
+        source_account=None,
+        external_id=f"check-{number}",
+        raw_data={},
+    )
+
+
+def check_case(case: LabelCase, db_path: str) -> list[str]:
+    repo = TransactionRepository(db_path)
+    number = 0
+    for pattern, category_key, count in case.labels:
+        transactions = []
+        for _ in range(count):
+            number += 1
+            transactions.append(_transaction(pattern.format(n=10000 + number * 37), number))
+        ids = [tx_id for tx_id in repo.insert_many(transactions) if tx_id is not None]
+        repo.set_manual_category_many(ids, category_key)
+
+    batch = TransactionBatch.from_transactions(
+        _transaction(description, idx) for idx, (description, _) in enumerate(case.expected)
+    )
+    problems = []
+    for (description, expected), result in zip(case.expected, NaiveBayesClassifier(repo).classify_batch(batch)):
+        if result.category_key != expected:
+            problems.append(
+                f"{description!r}: expected {expected or 'unclassified'}, got {result.category_key or 'unclassified'}"
+                f" ({result.source.value}, confidence {result.confidence:.4f})"
+            )
+        elif expected and result.source != ClassificationSource.MODEL:
+            problems.append(f"{description!r}: expected source model, got {result.source.value}")
+    return problems
+
+
+def main() -> int:
+    failed = 0
+    for case in CASES:
+        with tempfile.TemporaryDirectory(prefix="learned-classifier-check-") as tmp:
+            problems = check_case(case, os.path.join(tmp, "transactions.db"))
+        print(f"{'FAIL' if problems else 'ok':<5}{case.name}")
+        for problem in problems:
+            print(f"       {problem}")
+        failed += bool(problems)
+    print(f"{len(CASES) - failed} of {len(CASES)} cases ok")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
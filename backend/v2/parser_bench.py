@@ -0,0 +1,211 @@
+"""Throughput benchmark for the statement parsers on synthetic statements.
+
+Run from the backend directory::
+
+    python -m v2.parser_bench                              # compare against the stored baseline
+    python -m v2.parser_bench --sizes 100,1000,10000,100000 --source dkb_giro
+    python -m v2.parser_bench --save-baseline              # after an intended performance change
+
+Every case runs in a fresh process so peak RSS belongs to that parse alone, and with
+the PDF text cache disabled so every run extracts its pages. Throughput is the best of
+plain runs of the public parser. Stage times come from one more run inside
+``common.record_stage_seconds``, whose hooks in the real parser code add some overhead:
+``decode`` (bytes to text lines or PDF page objects), ``extract`` (CSV rows or page
+text), ``regex`` (date and amount parsing of CSV cells; PDF parsers match and build in
+one step, so it is not reported for them) and ``model`` (the rest of that run, mostly
+building ``Transaction`` objects).
+
+Baselines in ``data/parser_bench_baseline.json`` are machine specific; refresh them
+with ``--save-baseline`` on the machine that runs the comparison.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from .parsers import PARSERS
+from .parsers.common import record_stage_seconds
+from .statement_fixtures import GENERATORS, generate_statement
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
+BASELINE_PATH = os.path.join(BACKEND_DIR, "data", "parser_bench_baseline.json")
+DEFAULT_SIZES = (100, 1000, 10000)
+
+PDF_SOURCES = {"amex", "deutsche_bank_miles_more"}
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _parse_seconds(source: str, file_bytes: bytes) -> tuple[int, float]:
+    started = time.perf_counter()
+    parsed = PARSERS[source](file_bytes)
+    return len(parsed), time.perf_counter() - started
+
+
+def _stage_seconds(source: str, file_bytes: bytes) -> dict[str, Optional[float]]:
+    started = time.perf_counter()
+    with record_stage_seconds() as seconds:
+        PARSERS[source](file_bytes)
+    timed = time.perf_counter() - started
+    stages: dict[str, Optional[float]] = dict(seconds)
+    stages["model"] = timed - sum(seconds.values())
+    if source in PDF_SOURCES:
+        stages["regex"] = None
+    stages["timed"] = timed
+    return stages
+
+
+def run_case(source: str, rows: int, fixture_path: str, repeat: int, min_time: float) -> dict[str, object]:
+    file_bytes = Path(fixture_path).read_bytes()
+    rss_before = _peak_rss_mb()
+
+    best: Optional[float] = None
+    parsed = 0
+    runs = 0
+    spent = 0.0
+    while runs < max(repeat, 1) and (runs == 0 or spent < min_time):
+        parsed, seconds = _parse_seconds(source, file_bytes)
+        runs += 1
+        spent += seconds
+        if best is None or seconds < best:
+            best = seconds
+
+    assert best is not None
+    peak = _peak_rss_mb()
+    stages = {**_stage_seconds(source, file_bytes), "total": best}
+    return {
+        "source": source,
+        "rows": rows,
+        "parsed": parsed,
+        "bytes": len(file_bytes),
+        "runs": runs,
+        "rows_per_s": round(parsed / best, 1) if best else 0.0,
+        "seconds": {name: None if value is None else round(value, 4) for name, value in stages.items()},
+        "peak_rss_mb": round(peak, 1),
+        "parse_rss_mb": round(max(peak - rss_before, 0.0), 1),
+    }
+
+
+def load_baseline(path: str) -> dict[str, dict[str, float]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("cases", {})
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path: str, results: list[dict[str, object]]) -> None:
+    cases = load_baseline(path)
+    for result in results:
+        cases[f"{result['source']}:{result['rows']}"] = {
+            "rows_per_s": result["rows_per_s"],
+            "parse_rss_mb": result["parse_rss_mb"],
+        }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"cases": dict(sorted(cases.items()))}, f, indent=2)
+        f.write("\n")
+
+
+def regressions(
+    results: list[dict[str, object]],
+    baseline: dict[str, dict[str, float]],
+    tolerance: float,
+) -> list[str]:
+    problems = []
+    for result in results:
+        key = f"{result['source']}:{result['rows']}"
+        if result["parsed"] != result["rows"]:
+            problems.append(f"{key}: parsed {result['parsed']} of {result['rows']} generated rows")
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result["rows_per_s"] < base["rows_per_s"] * (1 - tolerance):
+            problems.append(f"{key}: {result['rows_per_s']} rows/s, baseline {base['rows_per_s']}")
+        # Small parses barely move RSS; allow a couple of MB of noise on top of the tolerance.
+        if result["parse_rss_mb"] > base["parse_rss_mb"] * (1 + tolerance) + 2:
+            problems.append(f"{key}: {result['parse_rss_mb']} MB peak RSS growth, baseline {base['parse_rss_mb']}")
+    return problems
+
+
+def _format_table(results: list[dict[str, object]]) -> str:
+    header = f"{'source':<26}{'rows':>8}{'rows/s':>12}{'total s':>10}{'decode':>9}{'extract':>9}{'regex':>9}{'model':>9}{'timed s':>10}{'rss MB':>9}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        seconds = {name: "-" if value is None else f"{value:.3f}" for name, value in result["seconds"].items()}
+        lines.append(
+            f"{result['source']:<26}{result['rows']:>8}{result['rows_per_s']:>12.0f}{seconds['total']:>10}"
+            f"{seconds['decode']:>9}{seconds['extract']:>9}{seconds['regex']:>9}{seconds['model']:>9}{seconds['timed']:>10}"
+            f"{result['parse_rss_mb']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the v2 statement parsers on synthetic statements.")
+    parser.add_argument("--source", action="append", choices=sorted(GENERATORS), help="repeatable; default all")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES), help="comma separated row counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="best of up to this many runs per case")
+    parser.add_argument("--min-time", type=float, default=2.0, help="stop repeating a case after this many seconds")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown or RSS growth")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--json", action="store_true", help="print the full results as JSON")
+    args = parser.parse_args(argv)
+
+    sources = args.source or sorted(GENERATORS)
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    # Read by the spawned case processes when they import the parsers: every run has to
+    # extract its pages rather than read the previous run's text from the cache.
+    os.environ["V2_PDF_TEXT_CACHE_MAX_BYTES"] = "0"
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="parser-bench-") as tmp:
+        # One fresh process per case, so each peak RSS reading belongs to a single parse.
+        with ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=1,
+        ) as executor:
+            for source in sources:
+                for rows in sizes:
+                    fixture_path = os.path.join(tmp, f"{source}-{rows}")
+                    Path(fixture_path).write_bytes(generate_statement(source, rows, seed=args.seed))
+                    result = executor.submit(run_case, source, rows, fixture_path, args.repeat, args.min_time).result()
+                    results.append(result)
+                    print(f"{source} {rows}: {result['rows_per_s']:.0f} rows/s", file=sys.stderr)
+
+    if args.json:
+        json.dump({"results": results}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print(_format_table(results))
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        return 0
+
+    problems = regressions(results, load_baseline(args.baseline), args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
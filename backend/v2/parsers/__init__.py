@@ -2,11 +2,17 @@
 
 from __future__ import annotations
 
+from typing import BinaryIO, Iterator, Optional
+
+import pdfplumber
+
 from ..models import Transaction
-from .amex import parse_amex_pdf
-from .deutsche_bank import parse_deutsche_bank_credit_pdf
-from .dkb import parse_dkb_giro_csv
-from .revolut import parse_revolut_csv
+from . import amex, deutsche_bank, dkb, revolut
+from .amex import iter_amex_pdf, parse_amex_pdf
+from .common import SNIFF_BYTES, SourceSignature
+from .deutsche_bank import iter_deutsche_bank_credit_pdf, parse_deutsche_bank_credit_pdf
+from .dkb import iter_dkb_giro_csv, parse_dkb_giro_csv
+from .revolut import iter_revolut_csv, parse_revolut_csv
 
 
 PARSERS = {
@@ -16,6 +22,20 @@ PARSERS = {
     "revolut": parse_revolut_csv,
 }
 
+STREAM_PARSERS = {
+    "amex": iter_amex_pdf,
+    "deutsche_bank_miles_more": iter_deutsche_bank_credit_pdf,
+    "dkb_giro": iter_dkb_giro_csv,
+    "revolut": iter_revolut_csv,
+}
+
+SIGNATURES: dict[str, SourceSignature] = {
+    "amex": amex.SIGNATURE,
+    "deutsche_bank_miles_more": deutsche_bank.SIGNATURE,
+    "dkb_giro": dkb.SIGNATURE,
+    "revolut": revolut.SIGNATURE,
+}
+
 
 def parse_statement(source: str, file_bytes: bytes) -> list[Transaction]:
     parser = PARSERS.get(source)
@@ -24,6 +44,62 @@ def parse_statement(source: str, file_bytes: bytes) -> list[Transaction]:
     return parser(file_bytes)
 
 
+def parse_statement_iter(source: str, stream: BinaryIO) -> Iterator[Transaction]:
+    parser = STREAM_PARSERS.get(source)
+    if parser is None:
+        raise ValueError(f"Unknown v2 statement source: {source}")
+    return parser(stream)
+
+
 def supported_sources() -> list[str]:
     return sorted(PARSERS.keys())
 
+
+class SourceMismatchError(ValueError):
+    pass
+
+
+def _first_page_text(stream: BinaryIO) -> str:
+    try:
+        with pdfplumber.open(stream, pages=[1]) as pdf:
+            return (pdf.pages[0].extract_text() or "") if pdf.pages else ""
+    except Exception:
+        # A damaged PDF simply matches no signature; the parser reports the real error.
+        return ""
+
+
+def sniff(stream: BinaryIO) -> tuple[str, str]:
+    """Return the file kind and the text signatures are matched against; rewinds ``stream``."""
+    start = stream.tell()
+    try:
+        head = stream.read(SNIFF_BYTES)
+        # The PDF spec allows junk before the header as long as it starts within the first KB.
+        if b"%PDF-" in head[:1024]:
+            stream.seek(start)
+            return "pdf", _first_page_text(stream)
+        return "csv", head.decode("utf-8-sig", errors="ignore")
+    finally:
+        stream.seek(start)
+
+
+def matching_sources(kind: str, text: str) -> list[str]:
+    return [source for source, signature in SIGNATURES.items() if signature.matches(kind, text)]
+
+
+def resolve_source(source: Optional[str], stream: BinaryIO) -> str:
+    """Detect the source of ``stream`` or check it against the requested one, without parsing."""
+    if source is not None and source not in SIGNATURES:
+        raise ValueError(f"Unknown v2 statement source: {source}")
+
+    kind, text = sniff(stream)
+    matches = matching_sources(kind, text)
+    if source is None:
+        if len(matches) != 1:
+            raise ValueError("Could not detect statement source")
+        return matches[0]
+
+    signature = SIGNATURES[source]
+    if source in matches or (signature.kind == kind and not signature.strict and not matches):
+        return source
+    detected = matches[0] if len(matches) == 1 else f"an unrecognized {kind.upper()} file"
+    raise SourceMismatchError(f"File does not match statement source {source}; it looks like {detected}")
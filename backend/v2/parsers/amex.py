@@ -2,23 +2,26 @@
 
 from __future__ import annotations
 
-import io
 import re
 from datetime import datetime
-
-import pdfplumber
+from typing import BinaryIO, Iterable, Iterator
 
 from ..models import Transaction
-from .common import clean_text, compact_external_id, parse_amount
+from .common import SourceSignature, clean_text, compact_external_id, parse_amount
+from .pdf_text import extract_pdf_pages, iter_pdf_pages
 
 
+SIGNATURE = SourceSignature("pdf", ("American Express",), strict=False)
 LINE_RE = re.compile(
     r"^(?P<sale>\d{2}\.\d{2})(?:\s+(?P<booking>\d{2}\.\d{2}))?\s+(?P<description>.+?)\s+(?P<amount>-?\d{1,3}(?:\.\d{3})*,\d{2}|-?\d+,\d{2})$"
 )
 
 
+_STATEMENT_DATE_RE = re.compile(r"\b(\d{2})\.(\d{2})\.(\d{2})\b")
+
+
 def _statement_date(text: str) -> datetime:
-    match = re.search(r"\b(\d{2})\.(\d{2})\.(\d{2})\b", text)
+    match = _STATEMENT_DATE_RE.search(text)
     if match:
         day, month, year = match.groups()
         return datetime(2000 + int(year), int(month), int(day))
@@ -34,16 +37,36 @@ def _date_from_day_month(value: str, statement_date: datetime) -> str:
 
 
 def parse_amex_pdf(file_bytes: bytes) -> list[Transaction]:
-    transactions = []
-    all_text = []
-    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-        for page in pdf.pages:
-            all_text.append(page.extract_text() or "")
+    return list(_iter_transactions(extract_pdf_pages(file_bytes, source="amex")))
+
+
+def iter_amex_pdf(stream: BinaryIO) -> Iterator[Transaction]:
+    return _iter_transactions(iter_pdf_pages(stream, source="amex"))
 
-    text = "\n".join(all_text)
-    statement_date = _statement_date(text)
 
-    for line in text.splitlines():
+def _iter_transactions(pages: Iterable[str]) -> Iterator[Transaction]:
+    # The statement date sits near the top of the statement, ahead of the booking lines,
+    # so only the lines seen before it is found have to be held back.
+    statement_date = None
+    pending: list[str] = []
+    for page_text in pages:
+        lines = page_text.splitlines()
+        if statement_date is None:
+            if _STATEMENT_DATE_RE.search(page_text):
+                statement_date = _statement_date(page_text)
+                lines = pending + lines
+                pending = []
+            else:
+                pending.extend(lines)
+                continue
+        yield from _parse_lines(lines, statement_date)
+
+    if statement_date is None:
+        yield from _parse_lines(pending, datetime.now())
+
+
+def _parse_lines(lines: Iterable[str], statement_date: datetime) -> Iterator[Transaction]:
+    for line in lines:
         line = clean_text(line)
         match = LINE_RE.match(line)
         if not match:
@@ -62,19 +85,15 @@ def parse_amex_pdf(file_bytes: bytes) -> list[Transaction]:
         booking_date = _date_from_day_month(booking_raw, statement_date)
         value_date = _date_from_day_month(match.group("sale"), statement_date)
 
-        transactions.append(
-            Transaction(
-                booking_date=booking_date,
-                value_date=value_date,
-                amount=amount,
-                currency="EUR",
-                description=description,
-                counterparty=description,
-                source="amex",
-                source_account="American Express",
-                external_id=compact_external_id(booking_date, amount, description),
-                raw_data={"line": line},
-            )
+        yield Transaction(
+            booking_date=booking_date,
+            value_date=value_date,
+            amount=amount,
+            currency="EUR",
+            description=description,
+            counterparty=description,
+            source="amex",
+            source_account="American Express",
+            external_id=compact_external_id(booking_date, amount, description),
+            raw_data={"line": line},
         )
-
-    return transactions
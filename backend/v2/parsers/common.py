@@ -2,14 +2,55 @@
 
 from __future__ import annotations
 
+import contextvars
+import io
 import re
-from datetime import datetime
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime
 from decimal import Decimal, InvalidOperation
-from typing import Optional
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, TypeVar
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_AMOUNT_STRIP_RE = re.compile(r"[^0-9,.\-]")
+_THOUSANDS_ONLY_RE = re.compile(r"^-?\d{1,3}(?:\.\d{3})+$")
+_COMMA_DECIMAL_RE = re.compile(r"^-?(?:\d{1,3}(?:\.\d{3})*|\d+),\d+$")
+_DOT_DECIMAL_RE = re.compile(r"^-?\d+(?:\.\d{1,2})?$")
+
+SCHEMA_SAMPLE_ROWS = 50
+SNIFF_BYTES = 8192
+
+DateParser = Callable[[object], Optional[str]]
+AmountParser = Callable[[object], Decimal]
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class SourceSignature:
+    """Cheap content check a source declares so uploads can be routed before parsing.
+
+    ``kind`` is ``"csv"`` (markers are matched against the first ``SNIFF_BYTES``) or
+    ``"pdf"`` (markers are matched against the first page's text). A non-``strict``
+    signature only confirms a source; missing markers are not treated as a mismatch.
+    """
+
+    kind: str
+    markers: tuple[str, ...]
+    strict: bool = True
+
+    def matches(self, kind: str, text: str) -> bool:
+        return kind == self.kind and all(marker in text for marker in self.markers)
 
 
 def clean_text(value: object) -> str:
-    return re.sub(r"\s+", " ", str(value or "").replace("\u00a0", " ")).strip()
+    text = str(value or "")
+    # Most cells hold no tabs, newlines, NBSPs or double spaces; skip the regex for those.
+    if text.isprintable() and "  " not in text:
+        return text.strip()
+    return _WHITESPACE_RE.sub(" ", text.replace("\u00a0", " ")).strip()
 
 
 def parse_date(value: object, formats: tuple[str, ...]) -> Optional[str]:
@@ -29,13 +70,13 @@ def parse_amount(value: object) -> Decimal:
     if not text:
         return Decimal("0")
 
-    text = re.sub(r"[^0-9,.\-]", "", text)
+    text = _AMOUNT_STRIP_RE.sub("", text)
     if not text or text == "-":
         return Decimal("0")
 
     if "," in text:
         text = text.replace(".", "").replace(",", ".")
-    elif "." in text and re.match(r"^-?\d{1,3}(?:\.\d{3})+$", text):
+    elif "." in text and _THOUSANDS_ONLY_RE.match(text):
         text = text.replace(".", "")
 
     try:
@@ -45,6 +86,212 @@ def parse_amount(value: object) -> Decimal:
 
 
 def compact_external_id(*parts: object) -> str:
-    text = "|".join(clean_text(part) for part in parts if clean_text(part))
+    text = "|".join(part for part in map(clean_text, parts) if part)
     return text[:300]
 
+
+def _iso(year: str, month: str, day: str) -> Optional[str]:
+    if not (year.isascii() and year.isdigit() and month.isascii() and month.isdigit() and day.isascii() and day.isdigit()):
+        return None
+    if year[0] == "0":
+        return None
+    try:
+        date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+    return f"{year}-{month}-{day}"
+
+
+def _fast_ymd(text: str) -> Optional[str]:
+    if len(text) != 10 or text[4] != "-" or text[7] != "-":
+        return None
+    return _iso(text[0:4], text[5:7], text[8:10])
+
+
+def _fast_ymd_hms(text: str) -> Optional[str]:
+    if len(text) != 19 or text[10] != " " or text[13] != ":" or text[16] != ":":
+        return None
+    hour, minute, second = text[11:13], text[14:16], text[17:19]
+    if not (hour + minute + second).isascii() or not (hour + minute + second).isdigit():
+        return None
+    if int(hour) > 23 or int(minute) > 59 or int(second) > 59:
+        return None
+    return _fast_ymd(text[:10])
+
+
+def _fast_dmy(text: str) -> Optional[str]:
+    if len(text) != 10 or text[2] != "." or text[5] != ".":
+        return None
+    return _iso(text[6:10], text[3:5], text[0:2])
+
+
+def _fast_dmy_short(text: str) -> Optional[str]:
+    if len(text) != 8 or text[2] != "." or text[5] != ".":
+        return None
+    short_year = text[6:8]
+    if not (short_year.isascii() and short_year.isdigit()):
+        return None
+    # Same pivot as strptime's %y: 69-99 -> 19xx, 00-68 -> 20xx.
+    century = "19" if int(short_year) >= 69 else "20"
+    return _iso(century + short_year, text[3:5], text[0:2])
+
+
+_FAST_DATE_PARSERS: dict[str, Callable[[str], Optional[str]]] = {
+    "%Y-%m-%d": _fast_ymd,
+    "%Y-%m-%d %H:%M:%S": _fast_ymd_hms,
+    "%d.%m.%Y": _fast_dmy,
+    "%d.%m.%y": _fast_dmy_short,
+}
+
+
+def infer_date_parser(samples: Iterable[object], formats: tuple[str, ...]) -> DateParser:
+    """Pick the fast path for the format most sample cells use.
+
+    Cells the fast path does not recognize go through ``parse_date`` with every format.
+    """
+    texts = [sample.strip() for sample in samples if isinstance(sample, str) and sample.strip()]
+    best_fast = None
+    best_hits = 0
+    for fmt in formats:
+        fast = _FAST_DATE_PARSERS.get(fmt)
+        if fast is None:
+            continue
+        hits = sum(1 for text in texts if fast(text) is not None)
+        if hits > best_hits:
+            best_fast, best_hits = fast, hits
+
+    if best_fast is None:
+        return lambda value: parse_date(value, formats)
+
+    def parse(value: object) -> Optional[str]:
+        if isinstance(value, str):
+            result = best_fast(value.strip())
+            if result is not None:
+                return result
+        return parse_date(value, formats)
+
+    return parse
+
+
+def infer_amount_parser(samples: Iterable[object]) -> AmountParser:
+    """Detect whether a column uses ``1.234,56`` or ``1234.56`` and build a matching fast path."""
+    texts = [sample.strip() for sample in samples if isinstance(sample, str) and sample.strip()]
+    comma_hits = sum(1 for text in texts if "," in text and _COMMA_DECIMAL_RE.match(text))
+    dot_hits = sum(1 for text in texts if "," not in text and _DOT_DECIMAL_RE.match(text))
+
+    if comma_hits >= dot_hits and comma_hits:
+
+        def parse(value: object) -> Decimal:
+            if isinstance(value, str):
+                text = value.strip()
+                if _COMMA_DECIMAL_RE.match(text):
+                    return Decimal(text.replace(".", "").replace(",", "."))
+            return parse_amount(value)
+
+        return parse
+
+    if dot_hits:
+
+        def parse(value: object) -> Decimal:
+            if isinstance(value, str):
+                text = value.strip()
+                if _DOT_DECIMAL_RE.match(text):
+                    return Decimal(text)
+            return parse_amount(value)
+
+        return parse
+
+    return parse_amount
+
+
+@contextmanager
+def text_lines(stream: BinaryIO) -> Iterator[io.TextIOWrapper]:
+    wrapper = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="ignore", newline="")
+    try:
+        yield wrapper
+    finally:
+        # Hand the binary stream back to the caller instead of closing it with the wrapper.
+        wrapper.detach()
+
+
+class _StageClock:
+    # Seconds per stage, excluding time spent in a stage nested inside another one.
+    def __init__(self, seconds: dict[str, float]):
+        self.seconds = seconds
+        self.stack: list[str] = []
+        self.mark = time.perf_counter()
+
+    def enter(self, stage: str) -> None:
+        now = time.perf_counter()
+        if self.stack:
+            self.seconds[self.stack[-1]] += now - self.mark
+        self.stack.append(stage)
+        self.mark = now
+
+    def leave(self) -> None:
+        now = time.perf_counter()
+        self.seconds[self.stack.pop()] += now - self.mark
+        self.mark = now
+
+
+_stage_clock: contextvars.ContextVar[Optional[_StageClock]] = contextvars.ContextVar("parser_stage_clock", default=None)
+
+
+@contextmanager
+def record_stage_seconds() -> Iterator[dict[str, float]]:
+    """Collect the seconds parsers spend per stage inside the block, for the parser benchmark.
+
+    ``decode`` is bytes to text lines or PDF page objects, ``extract`` CSV rows or page
+    text, ``regex`` date and amount parsing of CSV cells. Parsers only pay for the timing
+    while a block is active.
+    """
+    seconds = {"decode": 0.0, "extract": 0.0, "regex": 0.0}
+    token = _stage_clock.set(_StageClock(seconds))
+    try:
+        yield seconds
+    finally:
+        _stage_clock.reset(token)
+
+
+def stage_done(stage: str, started: float) -> float:
+    # Adds the time since ``started`` to ``stage``; for stages that do not nest.
+    now = time.perf_counter()
+    clock = _stage_clock.get()
+    if clock is not None:
+        clock.seconds[stage] += now - started
+    return now
+
+
+def timed(stage: str, func: Callable[..., T]) -> Callable[..., T]:
+    clock = _stage_clock.get()
+    if clock is None:
+        return func
+
+    def timed_func(*args, **kwargs):
+        clock.enter(stage)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            clock.leave()
+
+    return timed_func
+
+
+def timed_iter(stage: str, items: Iterable[T]) -> Iterator[T]:
+    clock = _stage_clock.get()
+    if clock is None:
+        return iter(items)
+
+    def timed_items() -> Iterator[T]:
+        iterator = iter(items)
+        while True:
+            clock.enter(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                clock.leave()
+            yield item
+
+    return timed_items()
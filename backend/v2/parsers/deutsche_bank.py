@@ -2,41 +2,45 @@
 
 from __future__ import annotations
 
-import io
 import re
-
-import pdfplumber
+from typing import BinaryIO, Iterable, Iterator
 
 from ..models import Transaction
-from .common import clean_text, compact_external_id, parse_amount, parse_date
+from .common import SourceSignature, clean_text, compact_external_id, parse_amount, parse_date
+from .pdf_text import extract_pdf_pages, iter_pdf_pages
 
 
+SIGNATURE = SourceSignature("pdf", ("Miles & More",), strict=False)
 LINE_RE = re.compile(
     r"^(?P<receipt>\d{2}\.\d{2}\.\d{4})\s+(?P<booking>\d{2}\.\d{2}\.\d{4})\s+(?P<description>.+?)\s+(?P<amount>-?\d{1,3}(?:\.\d{3})*,\d{2}|-?\d+,\d{2})$"
 )
 
 
 def parse_deutsche_bank_credit_pdf(file_bytes: bytes) -> list[Transaction]:
-    transactions = []
-    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-        text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-
-    for line in text.splitlines():
-        line = clean_text(line)
-        match = LINE_RE.match(line)
-        if not match:
-            continue
-
-        description = clean_text(match.group("description"))
-        if description.casefold().startswith("saldo"):
-            continue
-
-        booking_date = parse_date(match.group("booking"), ("%d.%m.%Y",))
-        value_date = parse_date(match.group("receipt"), ("%d.%m.%Y",))
-        amount = parse_amount(match.group("amount"))
-
-        transactions.append(
-            Transaction(
+    return list(_iter_transactions(extract_pdf_pages(file_bytes, source="deutsche_bank_miles_more")))
+
+
+def iter_deutsche_bank_credit_pdf(stream: BinaryIO) -> Iterator[Transaction]:
+    return _iter_transactions(iter_pdf_pages(stream, source="deutsche_bank_miles_more"))
+
+
+def _iter_transactions(pages: Iterable[str]) -> Iterator[Transaction]:
+    for page_text in pages:
+        for line in page_text.splitlines():
+            line = clean_text(line)
+            match = LINE_RE.match(line)
+            if not match:
+                continue
+
+            description = clean_text(match.group("description"))
+            if description.casefold().startswith("saldo"):
+                continue
+
+            booking_date = parse_date(match.group("booking"), ("%d.%m.%Y",))
+            value_date = parse_date(match.group("receipt"), ("%d.%m.%Y",))
+            amount = parse_amount(match.group("amount"))
+
+            yield Transaction(
                 booking_date=booking_date,
                 value_date=value_date,
                 amount=amount,
@@ -48,7 +52,3 @@ def parse_deutsche_bank_credit_pdf(file_bytes: bytes) -> list[Transaction]:
                 external_id=compact_external_id(booking_date, amount, description),
                 raw_data={"line": line},
             )
-        )
-
-    return transactions
-
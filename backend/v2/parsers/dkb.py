@@ -4,66 +4,96 @@ from __future__ import annotations
 
 import csv
 import io
+import itertools
+from typing import BinaryIO, Iterator, Optional
 
 from ..models import Transaction
-from .common import clean_text, compact_external_id, parse_amount, parse_date
+from .common import (
+    SCHEMA_SAMPLE_ROWS,
+    AmountParser,
+    DateParser,
+    SourceSignature,
+    clean_text,
+    compact_external_id,
+    infer_amount_parser,
+    infer_date_parser,
+    text_lines,
+    timed,
+    timed_iter,
+)
 
 
-def parse_dkb_giro_csv(file_bytes: bytes) -> list[Transaction]:
-    text = file_bytes.decode("utf-8-sig", errors="ignore")
-    lines = [line for line in text.splitlines() if line.strip()]
+SIGNATURE = SourceSignature("csv", ("Buchungsdatum", "Betrag", "Verwendungszweck"))
+DATE_FORMATS = ("%d.%m.%y", "%d.%m.%Y", "%Y-%m-%d")
 
-    header_idx = None
-    for idx, line in enumerate(lines):
-        if "Buchungsdatum" in line and "Betrag" in line and "Verwendungszweck" in line:
-            header_idx = idx
-            break
-    if header_idx is None:
-        raise ValueError("DKB CSV: Tabellenkopf nicht gefunden.")
 
-    reader = csv.DictReader(io.StringIO("\n".join(lines[header_idx:])), delimiter=";")
-    transactions = []
-    for row in reader:
-        booking_date = parse_date(row.get("Buchungsdatum"), ("%d.%m.%y", "%d.%m.%Y", "%Y-%m-%d"))
-        value_date = parse_date(row.get("Wertstellung"), ("%d.%m.%y", "%d.%m.%Y", "%Y-%m-%d"))
-        amount = parse_amount(row.get("Betrag (€)"))
-        payer = clean_text(row.get("Zahlungspflichtige*r"))
-        payee = clean_text(row.get("Zahlungsempfänger*in"))
-        transaction_type = clean_text(row.get("Umsatztyp")).casefold()
-        if transaction_type == "eingang":
-            counterparty = payer or payee
-        elif transaction_type == "ausgang":
-            counterparty = payee or payer
-        elif amount > 0:
-            counterparty = payer or payee
-        elif amount < 0:
-            counterparty = payee or payer
-        else:
-            counterparty = payee or payer
-        description = clean_text(row.get("Verwendungszweck") or counterparty)
+def parse_dkb_giro_csv(file_bytes: bytes) -> list[Transaction]:
+    return list(iter_dkb_giro_csv(io.BytesIO(file_bytes)))
 
-        if not booking_date and not description:
-            continue
 
-        transactions.append(
-            Transaction(
-                booking_date=booking_date,
-                value_date=value_date,
-                amount=amount,
-                currency="EUR",
-                description=description,
-                counterparty=counterparty or None,
-                source="dkb_giro",
-                source_account="DKB Giro",
-                external_id=compact_external_id(
-                    row.get("Kundenreferenz"),
-                    row.get("Mandatsreferenz"),
-                    booking_date,
-                    amount,
-                    description,
-                ),
-                raw_data={str(k): clean_text(v) for k, v in row.items()},
-            )
+def iter_dkb_giro_csv(stream: BinaryIO) -> Iterator[Transaction]:
+    with text_lines(stream) as text:
+        lines = (line for line in timed_iter("decode", text) if line.strip())
+        header = next(
+            (line for line in lines if "Buchungsdatum" in line and "Betrag" in line and "Verwendungszweck" in line),
+            None,
         )
+        if header is None:
+            raise ValueError("DKB CSV: Tabellenkopf nicht gefunden.")
+
+        reader = timed_iter("extract", csv.DictReader(itertools.chain([header], lines), delimiter=";"))
+        head = list(itertools.islice(reader, SCHEMA_SAMPLE_ROWS))
+        parse_booking_date = timed("regex", infer_date_parser([row.get("Buchungsdatum") for row in head], DATE_FORMATS))
+        parse_value_date = timed("regex", infer_date_parser([row.get("Wertstellung") for row in head], DATE_FORMATS))
+        parse_amount_cell = timed("regex", infer_amount_parser([row.get("Betrag (€)") for row in head]))
+        for row in itertools.chain(head, reader):
+            transaction = _row_to_transaction(row, parse_booking_date, parse_value_date, parse_amount_cell)
+            if transaction is not None:
+                yield transaction
+
+
+def _row_to_transaction(
+    row: dict[str, str],
+    parse_booking_date: DateParser,
+    parse_value_date: DateParser,
+    parse_amount_cell: AmountParser,
+) -> Optional[Transaction]:
+    booking_date = parse_booking_date(row.get("Buchungsdatum"))
+    value_date = parse_value_date(row.get("Wertstellung"))
+    amount = parse_amount_cell(row.get("Betrag (€)"))
+    payer = clean_text(row.get("Zahlungspflichtige*r"))
+    payee = clean_text(row.get("Zahlungsempfänger*in"))
+    transaction_type = clean_text(row.get("Umsatztyp")).casefold()
+    if transaction_type == "eingang":
+        counterparty = payer or payee
+    elif transaction_type == "ausgang":
+        counterparty = payee or payer
+    elif amount > 0:
+        counterparty = payer or payee
+    elif amount < 0:
+        counterparty = payee or payer
+    else:
+        counterparty = payee or payer
+    description = clean_text(row.get("Verwendungszweck") or counterparty)
+
+    if not booking_date and not description:
+        return None
 
-    return transactions
+    return Transaction(
+        booking_date=booking_date,
+        value_date=value_date,
+        amount=amount,
+        currency="EUR",
+        description=description,
+        counterparty=counterparty or None,
+        source="dkb_giro",
+        source_account="DKB Giro",
+        external_id=compact_external_id(
+            row.get("Kundenreferenz"),
+            row.get("Mandatsreferenz"),
+            booking_date,
+            amount,
+            description,
+        ),
+        raw_data={str(k): clean_text(v) for k, v in row.items()},
+    )
@@ -0,0 +1,140 @@
+"""On-disk cache of extracted PDF page text, keyed by file content."""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import zlib
+from pathlib import Path
+from typing import Optional
+
+import pdfplumber
+
+
+PDF_TEXT_CACHE_DIR = os.getenv(
+    "V2_PDF_TEXT_CACHE_DIR",
+    os.path.join(os.getenv("DATA_DIR", os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), "pdf_text_cache"),
+)
+PDF_TEXT_CACHE_MAX_BYTES = int(os.getenv("V2_PDF_TEXT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Other processes write to the same directory, so the running size is re-read from disk
+# after this many writes even while this process's own estimate stays under the limit.
+PDF_TEXT_CACHE_RESCAN_WRITES = 256
+# Eviction trims to this share of max_bytes, so the next writes do not trigger it again.
+EVICT_TO_SHARE = 0.9
+
+
+class PdfTextCache:
+    def __init__(self, root: str | Path, max_bytes: int, extractor_version: str = pdfplumber.__version__):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.extractor_version = extractor_version
+        self._lock = threading.Lock()
+        # Bytes on disk as of the last scan plus what this process has written since;
+        # None until the first eviction check scans the directory.
+        self._size: Optional[int] = None
+        self._writes_since_scan = 0
+
+    def _path(self, file_hash: str, page_index: int) -> Path:
+        return self.root / file_hash[:2] / f"{file_hash}.{self.extractor_version}.{page_index}.z"
+
+    def _manifest_path(self, file_hash: str) -> Path:
+        return self.root / file_hash[:2] / f"{file_hash}.{self.extractor_version}.pages.z"
+
+    def get_pages(self, file_hash: str) -> Optional[list[str]]:
+        # All page texts of a file whose page count is recorded, so a full hit needs no PDF.
+        path = self._manifest_path(file_hash)
+        try:
+            page_count = int(zlib.decompress(path.read_bytes()))
+        except FileNotFoundError:
+            return None
+        except (zlib.error, ValueError):
+            path.unlink(missing_ok=True)
+            return None
+        pages = []
+        for page_index in range(page_count):
+            text = self.get(file_hash, page_index)
+            if text is None:
+                return None
+            pages.append(text)
+        os.utime(path)
+        return pages
+
+    def put_page_count(self, file_hash: str, page_count: int) -> None:
+        self._write(self._manifest_path(file_hash), zlib.compress(str(page_count).encode("ascii")))
+
+    def get(self, file_hash: str, page_index: int) -> Optional[str]:
+        path = self._path(file_hash, page_index)
+        try:
+            payload = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            text = zlib.decompress(payload).decode("utf-8")
+        except (zlib.error, UnicodeDecodeError):
+            path.unlink(missing_ok=True)
+            return None
+        # Bump mtime so eviction drops the least recently used entries first.
+        os.utime(path)
+        return text
+
+    def put_many(self, file_hash: str, pages: dict[int, str], *, evict: bool = True) -> None:
+        for page_index, text in pages.items():
+            self._write(self._path(file_hash, page_index), zlib.compress(text.encode("utf-8"), 6))
+        if evict:
+            self.evict()
+
+    def _write(self, path: Path, payload: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_name, path)
+        with self._lock:
+            if self._size is not None:
+                self._size += len(payload)
+            self._writes_since_scan += 1
+
+    def evict(self) -> None:
+        # Only scans the directory once the running size estimate exceeds max_bytes, or
+        # every PDF_TEXT_CACHE_RESCAN_WRITES writes to catch up with other processes.
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            if (
+                self._size is not None
+                and self._size <= self.max_bytes
+                and self._writes_since_scan < PDF_TEXT_CACHE_RESCAN_WRITES
+            ):
+                return
+            self._writes_since_scan = 0
+        entries = []
+        total = 0
+        for path in self.root.glob("*/*.z"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICT_TO_SHARE
+            for _, size, path in sorted(entries):
+                path.unlink(missing_ok=True)
+                total -= size
+                if total <= target:
+                    break
+        with self._lock:
+            self._size = total
+
+
+_default_cache: Optional[PdfTextCache] = None
+
+
+def default_cache() -> Optional[PdfTextCache]:
+    global _default_cache
+    if not PDF_TEXT_CACHE_DIR or PDF_TEXT_CACHE_MAX_BYTES <= 0:
+        return None
+    if _default_cache is None:
+        _default_cache = PdfTextCache(PDF_TEXT_CACHE_DIR, PDF_TEXT_CACHE_MAX_BYTES)
+    return _default_cache
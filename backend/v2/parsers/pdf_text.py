@@ -0,0 +1,181 @@
+"""Page text extraction for PDF statement parsers."""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+import pdfplumber
+
+from .common import stage_done
+from .pdf_cache import PdfTextCache, default_cache
+
+
+PAGE_PARALLEL_SOURCES = {
+    source.strip()
+    for source in os.getenv("V2_PDF_PARALLEL_SOURCES", "amex,deutsche_bank_miles_more").split(",")
+    if source.strip()
+}
+PAGE_PARALLEL_MIN_PAGES = int(os.getenv("V2_PDF_PARALLEL_MIN_PAGES", "12"))
+PAGE_PARALLEL_WORKERS = int(os.getenv("V2_PDF_PARALLEL_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_page_progress: contextvars.ContextVar[Optional[dict[str, int]]] = contextvars.ContextVar("pdf_page_progress", default=None)
+
+
+@contextlib.contextmanager
+def record_page_progress() -> Iterator[dict[str, int]]:
+    # Pages iter_pdf_pages has read ("done") out of the PDF's page count ("count") inside
+    # the block, for import progress.
+    progress = {"done": 0, "count": 0}
+    token = _page_progress.set(progress)
+    try:
+        yield progress
+    finally:
+        _page_progress.reset(token)
+
+
+def _counted_pages(pages: Iterable[str], page_count: int) -> Iterator[str]:
+    progress = _page_progress.get()
+    if progress is not None:
+        progress["count"] = page_count
+    for text in pages:
+        if progress is not None:
+            progress["done"] += 1
+        yield text
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PAGE_PARALLEL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _extract_pages(file_bytes: bytes, page_indexes: list[int]) -> list[str]:
+    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+        return [pdf.pages[idx].extract_text() or "" for idx in page_indexes]
+
+
+def _split(items: list[int], parts: int) -> list[list[int]]:
+    size, extra = divmod(len(items), parts)
+    chunks = []
+    start = 0
+    for part in range(parts):
+        stop = start + size + (1 if part < extra else 0)
+        if stop > start:
+            chunks.append(items[start:stop])
+        start = stop
+    return chunks
+
+
+def use_page_parallel(source: Optional[str], page_count: int) -> bool:
+    return (
+        source in PAGE_PARALLEL_SOURCES
+        and page_count >= PAGE_PARALLEL_MIN_PAGES
+        and PAGE_PARALLEL_WORKERS > 1
+        # Already inside a worker process (for example a multi-file import); do not nest pools.
+        and multiprocessing.parent_process() is None
+    )
+
+
+def extract_pdf_pages(
+    file_bytes: bytes,
+    *,
+    source: Optional[str] = None,
+    cache: Optional[PdfTextCache] = None,
+) -> list[str]:
+    cache = cache or default_cache()
+    file_hash = hashlib.sha256(file_bytes).hexdigest() if cache else ""
+    if cache:
+        cached = cache.get_pages(file_hash)
+        if cached is not None:
+            return cached
+
+    started = time.perf_counter()
+    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+        page_count = len(pdf.pages)
+        started = stage_done("decode", started)
+        pages: list[Optional[str]] = [cache.get(file_hash, idx) if cache else None for idx in range(page_count)]
+        missing = [idx for idx, text in enumerate(pages) if text is None]
+        if cache is not None and not missing:
+            cache.put_page_count(file_hash, page_count)
+            return pages
+        parallel = use_page_parallel(source, len(missing))
+        if not parallel:
+            for idx in missing:
+                pages[idx] = pdf.pages[idx].extract_text() or ""
+
+    if parallel:
+        pool = _get_pool()
+        chunks = _split(missing, min(PAGE_PARALLEL_WORKERS, len(missing)))
+        futures = [pool.submit(_extract_pages, file_bytes, chunk) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            for idx, text in zip(chunk, future.result()):
+                pages[idx] = text
+    stage_done("extract", started)
+
+    if cache:
+        cache.put_many(file_hash, {idx: pages[idx] for idx in missing}, evict=False)
+        cache.put_page_count(file_hash, page_count)
+        cache.evict()
+    return pages
+
+
+def iter_pdf_pages(
+    stream: BinaryIO,
+    *,
+    source: Optional[str] = None,
+    cache: Optional[PdfTextCache] = None,
+) -> Iterator[str]:
+    cache = cache or default_cache()
+    file_hash = ""
+    if cache:
+        file_hash = hashlib.file_digest(stream, "sha256").hexdigest()
+        stream.seek(0)
+        cached = cache.get_pages(file_hash)
+        if cached is not None:
+            yield from _counted_pages(cached, len(cached))
+            return
+
+    with pdfplumber.open(stream) as pdf:
+        page_count = len(pdf.pages)
+        if use_page_parallel(source, page_count):
+            # Workers need the bytes themselves; the page texts are small next to the PDF.
+            stream.seek(0)
+            yield from _counted_pages(extract_pdf_pages(stream.read(), source=source, cache=cache), page_count)
+            return
+
+        extracted = False
+        progress = _page_progress.get()
+        if progress is not None:
+            progress["count"] = page_count
+        for idx, page in enumerate(pdf.pages):
+            text = cache.get(file_hash, idx) if cache else None
+            if text is None:
+                text = page.extract_text() or ""
+                extracted = True
+                if cache:
+                    cache.put_many(file_hash, {idx: text}, evict=False)
+            page.flush_cache()
+            if progress is not None:
+                progress["done"] += 1
+            yield text
+
+    if cache:
+        cache.put_page_count(file_hash, page_count)
+        if extracted:
+            cache.evict()
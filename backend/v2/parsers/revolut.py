@@ -4,46 +4,88 @@ from __future__ import annotations
 
 import csv
 import io
+import itertools
+from typing import BinaryIO, Iterator, Optional
 
 from ..models import Transaction
-from .common import clean_text, compact_external_id, parse_amount, parse_date
+from .common import (
+    SCHEMA_SAMPLE_ROWS,
+    AmountParser,
+    DateParser,
+    SourceSignature,
+    clean_text,
+    compact_external_id,
+    infer_amount_parser,
+    infer_date_parser,
+    text_lines,
+    timed,
+    timed_iter,
+)
+
+
+SNIFF_CHARS = 8192
+SIGNATURE = SourceSignature("csv", ("Datum des Beginns", "Datum des Abschlusses", "Beschreibung", "Betrag"))
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
 
 
 def parse_revolut_csv(file_bytes: bytes) -> list[Transaction]:
-    text = file_bytes.decode("utf-8-sig", errors="ignore")
-    sample = text[:8192]
-    delimiter = "\t" if sample.count("\t") >= max(sample.count(";"), sample.count(",")) else (";" if sample.count(";") > sample.count(",") else ",")
-    reader = csv.DictReader(io.StringIO(text), delimiter=delimiter)
-
-    required = {"Datum des Beginns", "Datum des Abschlusses", "Beschreibung", "Betrag", "Währung"}
-    missing = required - set(reader.fieldnames or [])
-    if missing:
-        raise ValueError(f"Revolut CSV: erwartete Spalten fehlen: {', '.join(sorted(missing))}")
-
-    transactions = []
-    for row in reader:
-        booking_date = parse_date(row.get("Datum des Beginns"), ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"))
-        value_date = parse_date(row.get("Datum des Abschlusses"), ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"))
-        description = clean_text(row.get("Beschreibung"))
-        amount = parse_amount(row.get("Betrag"))
-
-        if not booking_date and not description:
-            continue
-
-        transactions.append(
-            Transaction(
-                booking_date=booking_date or value_date,
-                value_date=value_date,
-                amount=amount,
-                currency=clean_text(row.get("Währung")) or "EUR",
-                description=description,
-                counterparty=description or None,
-                source="revolut",
-                source_account=clean_text(row.get("Produkt")) or "Revolut",
-                external_id=compact_external_id(booking_date, value_date, amount, description),
-                raw_data={str(k): clean_text(v) for k, v in row.items()},
-            )
-        )
-
-    return transactions
+    return list(iter_revolut_csv(io.BytesIO(file_bytes)))
+
+
+def iter_revolut_csv(stream: BinaryIO) -> Iterator[Transaction]:
+    with text_lines(stream) as text:
+        sniffed: list[str] = []
+        sniffed_chars = 0
+        lines = timed_iter("decode", text)
+        for line in lines:
+            sniffed.append(line)
+            sniffed_chars += len(line)
+            if sniffed_chars >= SNIFF_CHARS:
+                break
+
+        sample = "".join(sniffed)[:SNIFF_CHARS]
+        delimiter = "\t" if sample.count("\t") >= max(sample.count(";"), sample.count(",")) else (";" if sample.count(";") > sample.count(",") else ",")
+        reader = csv.DictReader(itertools.chain(sniffed, lines), delimiter=delimiter)
+
+        required = {"Datum des Beginns", "Datum des Abschlusses", "Beschreibung", "Betrag", "Währung"}
+        missing = required - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"Revolut CSV: erwartete Spalten fehlen: {', '.join(sorted(missing))}")
+
+        rows = timed_iter("extract", reader)
+        head = list(itertools.islice(rows, SCHEMA_SAMPLE_ROWS))
+        parse_booking_date = timed("regex", infer_date_parser([row.get("Datum des Beginns") for row in head], DATE_FORMATS))
+        parse_value_date = timed("regex", infer_date_parser([row.get("Datum des Abschlusses") for row in head], DATE_FORMATS))
+        parse_amount_cell = timed("regex", infer_amount_parser([row.get("Betrag") for row in head]))
+        for row in itertools.chain(head, rows):
+            transaction = _row_to_transaction(row, parse_booking_date, parse_value_date, parse_amount_cell)
+            if transaction is not None:
+                yield transaction
+
+
+def _row_to_transaction(
+    row: dict[str, str],
+    parse_booking_date: DateParser,
+    parse_value_date: DateParser,
+    parse_amount_cell: AmountParser,
+) -> Optional[Transaction]:
+    booking_date = parse_booking_date(row.get("Datum des Beginns"))
+    value_date = parse_value_date(row.get("Datum des Abschlusses"))
+    description = clean_text(row.get("Beschreibung"))
+    amount = parse_amount_cell(row.get("Betrag"))
+
+    if not booking_date and not description:
+        return None
 
+    return Transaction(
+        booking_date=booking_date or value_date,
+        value_date=value_date,
+        amount=amount,
+        currency=clean_text(row.get("Währung")) or "EUR",
+        description=description,
+        counterparty=description or None,
+        source="revolut",
+        source_account=clean_text(row.get("Produkt")) or "Revolut",
+        external_id=compact_external_id(booking_date, value_date, amount, description),
+        raw_data={str(k): clean_text(v) for k, v in row.items()},
+    )
@@ -0,0 +1,437 @@
+"""EXPLAIN QUERY PLAN checks for the SQL issued by the v2 repository and analytics code.
+
+Run from the backend directory::
+
+    python -m v2.query_plan_check              # exit status 1 on any plan regression
+    python -m v2.query_plan_check --verbose    # print every checked statement and its plan
+
+Each case calls one ``TransactionRepository`` or ``AnalyticsService`` method against a
+database seeded with synthetic statements, records the SQL that method sends to SQLite
+and checks the plans: the indexes the case names must be used, and a full ``SCAN`` of
+``v2_transactions`` fails the case unless the case states why it is acceptable. Public
+methods without a case fail the run too, so a new query cannot go unchecked.
+
+No ``ANALYZE`` is run, because the application never runs it either.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Callable, Iterator, Optional
+
+from .analytics import AnalyticsService
+from .category_store import CategoryStore
+from .classifier import RuleBasedClassifier
+from .importer import store_transactions
+from .models import Transaction, TransactionBatch
+from .parsers import parse_statement_iter
+from .rule_store import RuleStore
+from .statement_fixtures import generate_statement
+from .storage import TransactionRepository
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
+CATEGORIES_PATH = os.path.join(BACKEND_DIR, "data", "categories.v2.json")
+RULES_PATH = os.path.join(BACKEND_DIR, "data", "classification_rules.v2.json")
+SEED_SOURCES = ("dkb_giro", "revolut")
+
+_PLANNED_RE = re.compile(r"^\s*(SELECT|UPDATE|DELETE|WITH|INSERT\b.*\bSELECT)\b", re.IGNORECASE | re.DOTALL)
+_ALIAS_RE = re.compile(r"\bv2_transactions\s+(?:AS\s+)?(?!WHERE|ORDER|GROUP|LIMIT|SET|ON|JOIN|LEFT|INDEXED)(\w+)", re.IGNORECASE)
+
+
+@dataclass
+class Fixture:
+    repo: TransactionRepository
+    analytics: AnalyticsService
+    import_batch_id: int
+    rollback_batch_id: int
+    transaction_id: int
+    transaction_ids: list[int]
+    dedupe_keys: list[bytes]
+    category_key: str
+    counterparty_key: str
+    budget_month: str
+    source: str
+
+
+@dataclass(frozen=True)
+class PlanCase:
+    method: str
+    label: str
+    call: Callable[[Fixture], object]
+    indexes: tuple[str, ...] = ()
+    # Why a full scan of v2_transactions is acceptable for this call; None means it is not.
+    scan: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.method}({self.label})"
+
+
+@dataclass
+class PlanResult:
+    case: PlanCase
+    plans: list[tuple[str, list[str]]]
+    problems: list[str]
+
+
+def _transaction(idx: int) -> Transaction:
+    return Transaction(
+        booking_date="2024-06-03",
+        value_date="2024-06-03",
+        amount=Decimal("-1.00") - idx,
+        currency="EUR",
+        description=f"QUERY PLAN CHECK {idx}",
+        source="query_plan_check",
+        raw_data={"line": f"query plan check {idx}"},
+    )
+
+
+# Mutating cases come last so the read cases all see the same seeded data.
+CASES: tuple[PlanCase, ...] = (
+    PlanCase(
+        "TransactionRepository.__init__", "",
+        lambda f: TransactionRepository(f.repo.db_path), ("idx_v2_tx_dedupe_key", "idx_v2_tx_category_month"),
+    ),
+    PlanCase("TransactionRepository.find_import_batch", "", lambda f: f.repo.find_import_batch("dkb_giro", "0" * 64)),
+    PlanCase("TransactionRepository.get_import_batch", "", lambda f: f.repo.get_import_batch(f.import_batch_id)),
+    PlanCase(
+        "TransactionRepository.list_import_batches", "",
+        lambda f: f.repo.list_import_batches(), ("idx_v2_tx_import_batch_id",),
+    ),
+    PlanCase(
+        "TransactionRepository.batch_transactions", "",
+        lambda f: f.repo.batch_transactions(f.import_batch_id), ("idx_v2_tx_import_batch_id",),
+    ),
+    PlanCase(
+        "TransactionRepository.known_dedupe_keys", "",
+        lambda f: f.repo.known_dedupe_keys(f.dedupe_keys), ("idx_v2_tx_dedupe_key",),
+    ),
+    PlanCase("TransactionRepository.get", "", lambda f: f.repo.get(f.transaction_id)),
+    PlanCase("TransactionRepository.get_raw_data", "", lambda f: f.repo.get_raw_data(f.transaction_id)),
+    PlanCase(
+        "TransactionRepository.list", "budget_month",
+        lambda f: f.repo.list(budget_month=f.budget_month), ("idx_v2_tx_budget_month",),
+    ),
+    PlanCase(
+        "TransactionRepository.list", "year",
+        lambda f: f.repo.list(year=f.budget_month[:4]), ("idx_v2_tx_budget_month",),
+    ),
+    PlanCase(
+        "TransactionRepository.list", "year, month",
+        lambda f: f.repo.list(year=f.budget_month[:4], month=f.budget_month[5:]), ("idx_v2_tx_budget_month",),
+    ),
+    PlanCase(
+        "TransactionRepository.list", "",
+        lambda f: f.repo.list(),
+        ("idx_v2_tx_budget_month",),
+        scan="walks idx_v2_tx_budget_month in display order and stops after LIMIT",
+    ),
+    PlanCase(
+        "TransactionRepository.list", "month",
+        lambda f: f.repo.list(month=f.budget_month[5:]),
+        scan="a month across all years matches by substr(budget_month)",
+    ),
+    PlanCase(
+        "TransactionRepository.list", "unclassified",
+        lambda f: f.repo.list(classified="unclassified"), ("idx_v2_tx_unclassified",),
+    ),
+    PlanCase(
+        "TransactionRepository.list_ids", "budget_month, source",
+        lambda f: f.repo.list_ids(budget_month=f.budget_month, source=f.source),
+    ),
+    PlanCase(
+        "TransactionRepository.list_ids", "source",
+        lambda f: f.repo.list_ids(source=f.source), ("idx_v2_tx_source",),
+    ),
+    PlanCase(
+        "TransactionRepository.unclassified_descriptions", "",
+        lambda f: f.repo.unclassified_descriptions(), ("idx_v2_tx_unclassified",),
+    ),
+    PlanCase(
+        "TransactionRepository.manual_labels", "",
+        lambda f: f.repo.manual_labels(),
+        scan="reads every manually classified row, which only rule suggestions need",
+    ),
+    PlanCase("TransactionRepository.label_counts", "", lambda f: f.repo.label_counts()),
+    PlanCase(
+        "AnalyticsService.details", "budget_month",
+        lambda f: f.analytics.details(category_key=f.category_key, budget_month=f.budget_month, limit=50),
+        ("idx_v2_tx_category_month",),
+    ),
+    PlanCase(
+        "AnalyticsService.details", "from_month, to_month",
+        lambda f: f.analytics.details(category_key=f.category_key, from_month="2022-01", to_month="2023-12"),
+        ("idx_v2_tx_category_month",),
+    ),
+    PlanCase(
+        "AnalyticsService.summary", "year",
+        lambda f: f.analytics.summary(year=f.budget_month[:4]), ("idx_v2_tx_budget_month",),
+    ),
+    PlanCase(
+        "AnalyticsService.summary", "year, month",
+        lambda f: f.analytics.summary(year=f.budget_month[:4], month=f.budget_month[5:]), ("idx_v2_tx_budget_month",),
+    ),
+    PlanCase(
+        "AnalyticsService.summary", "",
+        lambda f: f.analytics.summary(),
+        scan="reads every classified row",
+    ),
+    PlanCase(
+        "AnalyticsService.unclassified", "year",
+        lambda f: f.analytics.unclassified(year=f.budget_month[:4]), ("idx_v2_tx_unclassified",),
+    ),
+    PlanCase(
+        "AnalyticsService.unclassified", "",
+        lambda f: f.analytics.unclassified(), ("idx_v2_tx_unclassified",),
+    ),
+    PlanCase(
+        "AnalyticsService.unclassified_groups", "",
+        lambda f: f.analytics.unclassified_groups(), ("idx_v2_tx_unclassified_counterparty",),
+    ),
+    PlanCase(
+        "AnalyticsService.unclassified_groups", "year, source",
+        lambda f: f.analytics.unclassified_groups(year=f.budget_month[:4], source=f.source),
+        ("idx_v2_tx_unclassified_counterparty",),
+    ),
+    PlanCase("AnalyticsService.monthly", "", lambda f: f.analytics.monthly(), scan="aggregates every classified row"),
+    PlanCase(
+        "AnalyticsService.dashboard", "year",
+        lambda f: f.analytics.dashboard(year=f.budget_month[:4]),
+        ("idx_v2_tx_budget_month",),
+        scan="the monthly view aggregates every classified row",
+    ),
+    PlanCase(
+        "TransactionRepository.create_import_batch", "",
+        lambda f: f.repo.create_import_batch("query_plan_check", "check.csv", "1" * 64, 0),
+    ),
+    PlanCase(
+        "TransactionRepository.update_import_batch_counts", "",
+        lambda f: f.repo.update_import_batch_counts(f.import_batch_id, 1, 0),
+    ),
+    PlanCase("TransactionRepository.mark_import_batch_archived", "", lambda f: f.repo.mark_import_batch_archived(f.import_batch_id)),
+    PlanCase("TransactionRepository.insert", "", lambda f: f.repo.insert(_transaction(0))),
+    PlanCase("TransactionRepository.insert_many", "", lambda f: f.repo.insert_many([_transaction(1), _transaction(2)])),
+    PlanCase(
+        "TransactionRepository.insert_batch", "",
+        lambda f: f.repo.insert_batch(TransactionBatch.from_transactions([_transaction(3), _transaction(4)])),
+    ),
+    PlanCase(
+        "TransactionRepository.apply_batch_replay", "",
+        lambda f: f.repo.apply_batch_replay(
+            f.import_batch_id,
+            delete_ids=f.transaction_ids[:2],
+            transactions=[_transaction(5)],
+            transaction_count=1,
+        ),
+        ("idx_v2_tx_import_batch_id",),
+    ),
+    PlanCase("TransactionRepository.set_manual_category", "", lambda f: f.repo.set_manual_category(f.transaction_id, f.category_key)),
+    PlanCase(
+        "TransactionRepository.set_manual_category_many", "",
+        lambda f: f.repo.set_manual_category_many(f.transaction_ids, f.category_key),
+    ),
+    PlanCase(
+        "TransactionRepository.classify_counterparty", "",
+        lambda f: f.repo.classify_counterparty(f.counterparty_key, f.category_key),
+        ("idx_v2_tx_unclassified_counterparty",),
+    ),
+    PlanCase("TransactionRepository.delete", "", lambda f: f.repo.delete(f.transaction_id)),
+    PlanCase("TransactionRepository.delete_many", "", lambda f: f.repo.delete_many(f.transaction_ids)),
+    PlanCase(
+        "TransactionRepository.rollback_import_batch", "",
+        lambda f: f.repo.rollback_import_batch(f.rollback_batch_id), ("idx_v2_tx_import_batch_id",),
+    ),
+)
+
+
+@contextlib.contextmanager
+def capture_statements() -> Iterator[list[str]]:
+    # Every repository and analytics method opens its own connection through
+    # sqlite3.connect(); tracing those connections records the statements with their
+    # parameters bound, ready for EXPLAIN QUERY PLAN.
+    statements: list[str] = []
+    connect = sqlite3.connect
+
+    def traced_connect(*args, **kwargs) -> sqlite3.Connection:
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    sqlite3.connect = traced_connect
+    try:
+        yield statements
+    finally:
+        sqlite3.connect = connect
+
+
+def seed_database(db_path: str, rows: int, seed: int = 0) -> Fixture:
+    category_store = CategoryStore.from_json_file(CATEGORIES_PATH)
+    classifier = RuleBasedClassifier(RuleStore.from_json_file(RULES_PATH, category_store=category_store))
+    repo = TransactionRepository(db_path)
+
+    batch_ids = []
+    for offset, source in enumerate((*SEED_SOURCES, SEED_SOURCES[0])):
+        # The last, small batch is the one the rollback case removes.
+        file_bytes = generate_statement(source, rows if offset < len(SEED_SOURCES) else 20, seed=seed + offset)
+        summary = store_transactions(
+            repo,
+            classifier,
+            source=source,
+            filename=f"{source}-{offset}",
+            file_hash=hashlib.sha256(file_bytes).hexdigest(),
+            transactions=parse_statement_iter(source, io.BytesIO(file_bytes)),
+        )
+        batch_ids.append(summary.import_batch_id)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        category_key, budget_month = conn.execute(
+            """
+            SELECT category_key, budget_month
+            FROM v2_transactions
+            WHERE category_key IS NOT NULL AND budget_month IS NOT NULL
+            GROUP BY category_key, budget_month
+            ORDER BY COUNT(*) DESC
+            LIMIT 1
+            """
+        ).fetchone()
+        (counterparty_key,) = conn.execute(
+            """
+            SELECT counterparty_key
+            FROM v2_transactions
+            WHERE category_key IS NULL
+            GROUP BY counterparty_key
+            ORDER BY COUNT(*) DESC
+            LIMIT 1
+            """
+        ).fetchone()
+        sample = conn.execute(
+            "SELECT id, dedupe_key FROM v2_transactions WHERE import_batch_id = ? ORDER BY id LIMIT 10",
+            (batch_ids[0],),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    return Fixture(
+        repo=repo,
+        analytics=AnalyticsService(db_path, category_store),
+        import_batch_id=batch_ids[0],
+        rollback_batch_id=batch_ids[-1],
+        transaction_id=sample[-1][0],
+        transaction_ids=[row[0] for row in sample[2:-1]],
+        dedupe_keys=[row[1] for row in sample] + [b"\x00" * 16],
+        category_key=category_key,
+        counterparty_key=counterparty_key,
+        budget_month=budget_month,
+        source=SEED_SOURCES[0],
+    )
+
+
+def _plan_lines(conn: sqlite3.Connection, statement: str) -> list[str]:
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+    return [row[3] for row in rows]
+
+
+def _partial_indexes(conn: sqlite3.Connection) -> set[str]:
+    return {row[1] for row in conn.execute("PRAGMA index_list(v2_transactions)") if row[4]}
+
+
+def _full_scans(statement: str, plan: list[str], partial_indexes: set[str]) -> list[str]:
+    # Scanning a partial index only visits the rows its WHERE clause admits.
+    names = {"v2_transactions", *(alias for alias in _ALIAS_RE.findall(statement))}
+    return [
+        line
+        for line in plan
+        if line.startswith("SCAN ")
+        and line.split()[1] in names
+        and not any(re.search(rf"INDEX {index}\b", line) for index in partial_indexes)
+    ]
+
+
+def check_case(case: PlanCase, fixture: Fixture, conn: sqlite3.Connection) -> PlanResult:
+    with capture_statements() as statements:
+        case.call(fixture)
+
+    plans = []
+    for statement in dict.fromkeys(statements):
+        if "v2_" not in statement or not _PLANNED_RE.match(statement):
+            continue
+        plans.append((" ".join(statement.split()), _plan_lines(conn, statement)))
+
+    problems = []
+    used = " ".join(line for _, plan in plans for line in plan)
+    for index in case.indexes:
+        if not re.search(rf"\b{index}\b", used):
+            problems.append(f"does not use {index}")
+    if case.scan is None:
+        partial_indexes = _partial_indexes(conn)
+        for statement, plan in plans:
+            for line in _full_scans(statement, plan, partial_indexes):
+                problems.append(f"{line}: {statement[:160]}")
+    return PlanResult(case, plans, problems)
+
+
+def uncovered_methods(cases: tuple[PlanCase, ...] = CASES) -> list[str]:
+    covered = {case.method for case in cases}
+    public = [
+        f"{cls.__name__}.{name}"
+        for cls in (TransactionRepository, AnalyticsService)
+        for name, value in vars(cls).items()
+        if callable(value) and not name.startswith("_")
+    ]
+    return [name for name in public if name not in covered]
+
+
+def run_checks(rows: int, seed: int = 0) -> tuple[list[PlanResult], list[str]]:
+    with tempfile.TemporaryDirectory(prefix="query-plan-check-") as tmp:
+        db_path = os.path.join(tmp, "transactions.db")
+        fixture = seed_database(db_path, rows, seed=seed)
+        conn = sqlite3.connect(db_path)
+        try:
+            results = [check_case(case, fixture, conn) for case in CASES]
+        finally:
+            conn.close()
+    return results, uncovered_methods()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the query plans of the v2 repository and analytics SQL.")
+    parser.add_argument("--rows", type=int, default=2000, help="rows per seeded statement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="print every checked statement and its plan")
+    args = parser.parse_args(argv)
+
+    results, uncovered = run_checks(args.rows, seed=args.seed)
+    failed = 0
+    for result in results:
+        status = "FAIL" if result.problems else "ok"
+        note = f"  [scan allowed: {result.case.scan}]" if result.case.scan else ""
+        print(f"{status:<5}{result.case.name}{note}")
+        for problem in result.problems:
+            print(f"       {problem}")
+        if args.verbose:
+            for statement, plan in result.plans:
+                print(f"       > {statement[:200]}")
+                for line in plan:
+                    print(f"           {line}")
+        failed += bool(result.problems)
+    for name in uncovered:
+        print(f"FAIL {name}: no query plan case")
+
+    print(f"{len(results) - failed} of {len(results)} cases ok, {len(uncovered)} uncovered methods", file=sys.stderr)
+    return 1 if failed or uncovered else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
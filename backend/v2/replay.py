@@ -0,0 +1,208 @@
+"""Re-parse archived statements with the current parsers and reconcile stored rows.
+
+Run from the backend directory::
+
+    python -m v2.replay --batch 12 --batch 13          # report differences only
+    python -m v2.replay --source amex --apply          # re-import every archived Amex batch
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .archive import StatementArchive, default_archive
+from .category_store import CategoryStore
+from .classifier import RuleBasedClassifier
+from .models import ClassificationResult, ClassificationSource, Transaction
+from .parsers import parse_statement
+from .rule_store import RuleStore
+from .storage import TransactionRepository
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
+
+
+@dataclass
+class BatchReplay:
+    import_batch_id: int
+    source: str
+    filename: Optional[str]
+    status: str = "ok"
+    error: Optional[str] = None
+    unchanged: int = 0
+    added: list[Transaction] = field(default_factory=list)
+    removed: list[dict[str, object]] = field(default_factory=list)
+    kept_manual: list[dict[str, object]] = field(default_factory=list)
+    carried_manual: int = 0
+    parsed: int = 0
+
+    def as_report(self) -> dict[str, object]:
+        return {
+            "import_batch_id": self.import_batch_id,
+            "source": self.source,
+            "filename": self.filename,
+            "status": self.status,
+            "error": self.error,
+            "parsed": self.parsed,
+            "unchanged": self.unchanged,
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "carried_manual": self.carried_manual,
+            "kept_manual": [row["id"] for row in self.kept_manual],
+        }
+
+
+def _parse_for_replay(source: str, file_bytes: bytes) -> list[Transaction]:
+    transactions = parse_statement(source, file_bytes)
+    for tx in transactions:
+        tx.prepare_for_import()
+    return transactions
+
+
+def _carry_over_manual(replay: BatchReplay, removed: list[dict[str, object]]) -> list[dict[str, object]]:
+    # A parser fix usually changes the description, and with it the dedupe key, but keeps
+    # date and amount. Move a manual category onto the new row when that match is unambiguous.
+    candidates: dict[tuple[object, str], list[Transaction]] = {}
+    for tx in replay.added:
+        candidates.setdefault((tx.booking_date, str(tx.amount)), []).append(tx)
+
+    deletable = []
+    for row in removed:
+        if row["classification_source"] != ClassificationSource.MANUAL.value:
+            deletable.append(row)
+            continue
+        matches = candidates.get((row["booking_date"], str(row["amount"])), [])
+        if len(matches) == 1 and matches[0].classification_source != ClassificationSource.MANUAL:
+            matches[0].apply_classification(
+                ClassificationResult(
+                    category_key=row["category_key"],
+                    source=ClassificationSource.MANUAL,
+                    confidence=1.0,
+                )
+            )
+            replay.carried_manual += 1
+            deletable.append(row)
+        else:
+            replay.kept_manual.append(row)
+    return deletable
+
+
+def plan_replay(
+    repo: TransactionRepository,
+    archive: StatementArchive,
+    import_batch_ids: list[int],
+    executor: Executor,
+) -> list[BatchReplay]:
+    plans = []
+    futures = {}
+    for import_batch_id in import_batch_ids:
+        batch = repo.get_import_batch(import_batch_id)
+        if batch is None:
+            plans.append(BatchReplay(import_batch_id, "", None, status="not_found"))
+            continue
+        plan = BatchReplay(import_batch_id, str(batch["source"]), batch["filename"])
+        plans.append(plan)
+        file_bytes = archive.get(str(batch["file_hash"]))
+        if file_bytes is None:
+            plan.status = "not_archived"
+            continue
+        futures[import_batch_id] = executor.submit(_parse_for_replay, plan.source, file_bytes)
+
+    for plan in plans:
+        future = futures.get(plan.import_batch_id)
+        if future is None:
+            continue
+        try:
+            transactions = future.result()
+        except Exception as e:
+            plan.status = "failed"
+            plan.error = str(e)
+            continue
+
+        plan.parsed = len(transactions)
+        existing = repo.batch_transactions(plan.import_batch_id)
+        existing_keys = {row["dedupe_key"] for row in existing}
+        new_keys = {tx.dedupe_key for tx in transactions}
+        plan.unchanged = len(existing_keys & new_keys)
+        plan.added = [tx for tx in transactions if tx.dedupe_key not in existing_keys]
+        plan.removed = _carry_over_manual(plan, [row for row in existing if row["dedupe_key"] not in new_keys])
+    return plans
+
+
+def apply_replay(repo: TransactionRepository, classifier: RuleBasedClassifier, plan: BatchReplay) -> dict[str, int]:
+    for tx in plan.added:
+        if tx.classification_source != ClassificationSource.MANUAL:
+            tx.apply_classification(classifier.classify(tx))
+    inserted_ids = repo.apply_batch_replay(
+        plan.import_batch_id,
+        delete_ids=[int(row["id"]) for row in plan.removed],
+        transactions=plan.added,
+        transaction_count=plan.parsed,
+    )
+    inserted = sum(1 for tx_id in inserted_ids if tx_id is not None)
+    return {"deleted": len(plan.removed), "inserted": inserted, "skipped_duplicates": len(inserted_ids) - inserted}
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    data_dir = os.getenv("DATA_DIR", BACKEND_DIR)
+    parser = argparse.ArgumentParser(description="Re-parse archived v2 statements with the current parsers.")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", os.path.join(data_dir, "transactions.db")))
+    parser.add_argument("--archive-dir", default=None, help="defaults to V2_STATEMENT_ARCHIVE_DIR")
+    parser.add_argument(
+        "--categories",
+        default=os.getenv("V2_CATEGORIES_PATH", os.path.join(BACKEND_DIR, "data", "categories.v2.json")),
+    )
+    rules_path = os.path.join(data_dir, "classification_rules.v2.json")
+    if not os.path.exists(rules_path):
+        rules_path = os.path.join(BACKEND_DIR, "data", "classification_rules.v2.json")
+    parser.add_argument("--rules", default=os.getenv("V2_RULES_PATH", rules_path))
+    parser.add_argument("--batch", type=int, action="append", default=[], help="import batch id (repeatable)")
+    parser.add_argument("--source", help="replay every archived batch of this source")
+    parser.add_argument("--apply", action="store_true", help="write the differences instead of only reporting them")
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count() or 1, 4))
+    args = parser.parse_args(argv)
+
+    repo = TransactionRepository(args.db)
+    archive = StatementArchive(args.archive_dir) if args.archive_dir else default_archive()
+    if archive is None:
+        parser.error("no statement archive configured")
+
+    batch_ids = list(args.batch)
+    if args.source:
+        batch_ids.extend(
+            int(batch["id"])
+            for batch in repo.list_import_batches(source=args.source, limit=1_000_000)
+            if batch["archived_at"]
+        )
+    if not batch_ids:
+        parser.error("select batches with --batch or --source")
+
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        plans = plan_replay(repo, archive, sorted(set(batch_ids)), executor)
+
+    classifier = None
+    if args.apply:
+        category_store = CategoryStore.from_json_file(args.categories)
+        classifier = RuleBasedClassifier(RuleStore.from_json_file(args.rules, category_store=category_store))
+
+    reports = []
+    for plan in plans:
+        report = plan.as_report()
+        if classifier is not None and plan.status == "ok":
+            report["applied"] = apply_replay(repo, classifier, plan)
+        reports.append(report)
+
+    json.dump({"applied": args.apply, "batches": reports}, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+    return 0 if all(plan.status == "ok" for plan in plans) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,19 +2,198 @@
 
 from __future__ import annotations
 
+import contextlib
+import fcntl
+import functools
+import hashlib
 import json
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter, defaultdict
 from pathlib import Path
+from typing import Any, Iterable, Iterator
 
 from .category_store import CategoryStore
 from .models import ClassificationRule, MatchType
 
 
+def normalize_match_text(value: Any) -> str:
+    # Rule patterns and transaction fields are compared in this form.
+    return str(value or "").strip().casefold()
+
+
+def max_edits(pattern: str, similarity: float) -> int:
+    return int((1.0 - similarity) * len(pattern) + 1e-9)
+
+
+@functools.lru_cache(maxsize=1024)
+def pattern_pieces(pattern: str, limit: int) -> tuple[tuple[int, str], ...]:
+    # limit + 1 disjoint pieces of pattern with their offsets. A substring within limit edits
+    # of pattern leaves at least one of them intact.
+    size = len(pattern) / (limit + 1)
+    return tuple(
+        (round(idx * size), pattern[round(idx * size):round((idx + 1) * size)]) for idx in range(limit + 1)
+    )
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[start:start + 3] for start in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Trigram to fuzzy rule postings, to find the rules a field value may match.
+
+    A substring within ``k`` edits of a pattern still contains all but ``3 * k`` of the
+    pattern's distinct trigrams, as one edit touches at most three of them. Rules whose
+    pattern shares fewer trigrams with a value cannot match it; only the rest need the
+    edit distance check. Patterns too short for that bound are candidates when the value
+    contains one of their ``pattern_pieces``.
+    """
+
+    def __init__(self, rules: Iterable[ClassificationRule]):
+        self.postings: dict[str, list[str]] = defaultdict(list)
+        self.required: dict[str, int] = {}
+        self.unfiltered: dict[str, tuple[str, ...]] = {}
+        for rule in rules:
+            pattern = normalize_match_text(rule.pattern)
+            if not pattern:
+                continue
+            pattern_trigrams = trigrams(pattern)
+            required = len(pattern_trigrams) - 3 * max_edits(pattern, rule.similarity)
+            if required <= 0:
+                limit = max_edits(pattern, rule.similarity)
+                self.unfiltered[rule.key] = tuple(piece for _, piece in pattern_pieces(pattern, limit))
+                continue
+            self.required[rule.key] = required
+            for trigram in pattern_trigrams:
+                self.postings[trigram].append(rule.key)
+
+    def __bool__(self) -> bool:
+        return bool(self.required or self.unfiltered)
+
+    def candidates(self, text: str) -> set[str]:
+        postings = self.postings
+        shared = Counter(key for trigram in trigrams(text) if trigram in postings for key in postings[trigram])
+        required = self.required
+        keys = {key for key, count in shared.items() if count >= required[key]}
+        for key, pieces in self.unfiltered.items():
+            if any(piece in text for piece in pieces):
+                keys.add(key)
+        return keys
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text)
+
+
+def contains_tokens(tokens: list[str], pattern_tokens: list[str]) -> bool:
+    size = len(pattern_tokens)
+    return bool(size) and any(tokens[start:start + size] == pattern_tokens for start in range(len(tokens) - size + 1))
+
+
+class TokenIndex:
+    """First pattern token to TOKENS rules.
+
+    A value is tokenized once and only the rules whose first token occurs in it are checked
+    for their whole token sequence at that position, so "bahn" matches "deutsche bahn" but
+    not "bahnhof" or "autobahn".
+    """
+
+    def __init__(self, rules: Iterable[ClassificationRule]):
+        self.rules_by_token: dict[str, list[tuple[str, list[str]]]] = defaultdict(list)
+        for rule in rules:
+            pattern_tokens = tokenize(normalize_match_text(rule.pattern))
+            if pattern_tokens:
+                self.rules_by_token[pattern_tokens[0]].append((rule.key, pattern_tokens))
+
+    def __bool__(self) -> bool:
+        return bool(self.rules_by_token)
+
+    def candidates(self, text: str) -> set[str]:
+        # Unlike TrigramIndex candidates, these are already verified matches.
+        tokens = tokenize(text)
+        rules_by_token = self.rules_by_token
+        keys = set()
+        for start, token in enumerate(tokens):
+            for key, pattern_tokens in rules_by_token.get(token, ()):
+                if len(pattern_tokens) == 1 or tokens[start:start + len(pattern_tokens)] == pattern_tokens:
+                    keys.add(key)
+        return keys
+
+
+def pattern_rule(pattern: str, category_key: str) -> ClassificationRule:
+    # A contains rule keyed after its pattern, as created from triage and rule suggestions.
+    # The slug only keeps ASCII letters and digits, so a short hash of the whole pattern
+    # keeps keys apart for patterns that differ in other characters ("möller", "müller").
+    slug = re.sub(r"[^a-z0-9]+", "-", pattern.casefold()).strip("-")[:40]
+    digest = hashlib.sha256(pattern.encode("utf-8")).hexdigest()[:8]
+    return ClassificationRule(
+        key=f"rule.{slug}-{digest}" if slug else f"rule.{digest}",
+        pattern=pattern,
+        category_key=category_key,
+    )
+
+
+@contextlib.contextmanager
+def _locked(path: str | Path) -> Iterator[None]:
+    # Exclusive lock on a sidecar file; the rules file itself is replaced, not rewritten.
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _replace_file(path: str | Path, write, mode_from: str | Path | None = None) -> None:
+    # Readers see either the old or the new file, never a partial one. mkstemp creates the
+    # file private, so the permissions of the file being replaced are carried over.
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        shutil.copymode(mode_from or path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _rule_payload(rule: ClassificationRule) -> dict[str, object]:
+    payload: dict[str, object] = {
+        "key": rule.key,
+        "pattern": rule.pattern,
+        "match_type": rule.match_type.value,
+        "match_fields": list(rule.match_fields),
+        "category_key": rule.category_key,
+        "source_filter": rule.source_filter,
+        "priority": rule.priority,
+        "active": rule.active,
+    }
+    if rule.match_type == MatchType.FUZZY:
+        payload["similarity"] = rule.similarity
+    return payload
+
+
 class RuleStore:
     def __init__(self, rules: list[ClassificationRule]):
         self.rules = sorted(
             rules,
             key=lambda rule: (-rule.priority, rule.key),
         )
+        # Built once per store, so a batch only checks the fuzzy and token rules a field value
+        # may match.
+        self.trigram_index = TrigramIndex(
+            rule for rule in self.rules if rule.active and rule.match_type == MatchType.FUZZY
+        )
+        self.token_index = TokenIndex(
+            rule for rule in self.rules if rule.active and rule.match_type == MatchType.TOKENS
+        )
 
     @classmethod
     def from_json_file(
@@ -33,6 +212,9 @@ class RuleStore:
                 raise ValueError(
                     f"Rule {item.get('key', '<unknown>')} references unknown category {category_key}"
                 )
+            similarity = float(item.get("similarity", 0.8))
+            if not 0.0 < similarity <= 1.0:
+                raise ValueError(f"Rule {item.get('key', '<unknown>')} has similarity {similarity} outside (0, 1]")
 
             rules.append(
                 ClassificationRule(
@@ -44,24 +226,49 @@ class RuleStore:
                     source_filter=item.get("source_filter"),
                     priority=int(item.get("priority", 100)),
                     active=bool(item.get("active", True)),
+                    similarity=similarity,
                 )
             )
         return cls(rules)
 
+    @staticmethod
+    def seed_json_file(path: str | Path, bundled_path: str | Path) -> None:
+        # Copies the rules shipped with the app to the writable rules file on first start.
+        if os.path.exists(path) or os.path.abspath(path) == os.path.abspath(bundled_path):
+            return
+        with _locked(path):
+            if not os.path.exists(path):
+                with open(bundled_path, "rb") as bundled:
+                    _replace_file(path, lambda f: shutil.copyfileobj(bundled, f), mode_from=bundled_path)
+
+    @staticmethod
+    def append_to_json_file(path: str | Path, rule: ClassificationRule) -> None:
+        # Every gunicorn worker appends to the same file, so the read-modify-write is locked.
+        with _locked(path):
+            RuleStore._append_locked(path, rule)
+
+    @staticmethod
+    def _append_locked(path: str | Path, rule: ClassificationRule) -> None:
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        rules = payload.setdefault("rules", [])
+        if any(item.get("key") == rule.key for item in rules):
+            raise ValueError(f"Rule {rule.key} already exists")
+        rules.append(_rule_payload(rule))
+
+        # Same layout as the hand-edited file: one rule per line.
+        lines = [
+            f"  {json.dumps(name)}: {json.dumps(value, ensure_ascii=False)},"
+            for name, value in payload.items()
+            if name != "rules"
+        ]
+        rule_lines = ",\n".join(
+            "    { " + json.dumps(item, ensure_ascii=False)[1:-1] + " }" for item in rules
+        )
+        text = "{\n" + "\n".join(lines) + '\n  "rules": [\n' + rule_lines + "\n  ]\n}\n"
+
+        _replace_file(path, lambda f: f.write(text.encode("utf-8")))
+
     def as_api_payload(self) -> dict[str, list[dict[str, object]]]:
-        return {
-            "rules": [
-                {
-                    "key": rule.key,
-                    "pattern": rule.pattern,
-                    "match_type": rule.match_type.value,
-                    "match_fields": list(rule.match_fields),
-                    "category_key": rule.category_key,
-                    "source_filter": rule.source_filter,
-                    "priority": rule.priority,
-                    "active": rule.active,
-                }
-                for rule in self.rules
-            ]
-        }
+        return {"rules": [_rule_payload(rule) for rule in self.rules]}
 
@@ -0,0 +1,222 @@
+"""Rule suggestions from clusters of similar unclassified descriptions.
+
+Descriptions that differ only in reference numbers ("REWE SAGT DANKE 4711...") are grouped
+exactly once digits are masked; the remaining near-duplicates are found with MinHash
+signatures over character shingles and locality-sensitive hashing, which only compares
+descriptions that share a band of their signature. Each cluster yields a contains pattern
+(the longest digit-free token run every member shares) and, where manually classified rows
+fall into the same cluster, the category most of them carry.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import operator
+import re
+import struct
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Optional
+
+from .models import ClassificationRule, normalize_dedupe_text
+from .rule_store import pattern_rule
+
+
+SHINGLE_SIZE = 4
+NUM_PERMUTATIONS = 32
+# 16 bands of 2 rows put pairs with an estimated similarity around 0.25 into a shared
+# bucket half of the time; the similarity check below then keeps only the close ones.
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+MIN_PATTERN_LENGTH = 4
+# Descriptions a cluster pattern is derived from, and the share of them it has to occur in,
+# so one typo does not cut the pattern short. The match count still covers every row.
+PATTERN_SAMPLE = 50
+PATTERN_SUPPORT = 0.8
+
+# One shake_128 digest per shingle yields all of its independent 32-bit hash values.
+_SHINGLE_HASHES = struct.Struct(f"<{NUM_PERMUTATIONS}I")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+@dataclass(frozen=True)
+class RuleSuggestion:
+    pattern: str
+    category_key: Optional[str]
+    # Share of the cluster's manually classified rows that carry category_key.
+    category_confidence: float
+    labelled: int
+    count: int
+    matched: int
+    signed_total: float
+    examples: tuple[str, ...]
+
+    def rule(self) -> Optional[ClassificationRule]:
+        return pattern_rule(self.pattern, self.category_key) if self.category_key else None
+
+    def as_api_payload(self) -> dict[str, object]:
+        rule = self.rule()
+        return {
+            "pattern": self.pattern,
+            "category_key": self.category_key,
+            "category_confidence": self.category_confidence,
+            "labelled": self.labelled,
+            "count": self.count,
+            "matched": self.matched,
+            "signed_total": self.signed_total,
+            "examples": list(self.examples),
+            "rule_key": rule.key if rule else None,
+        }
+
+
+class _ShingleHashes(dict):
+    # Descriptions share most of their shingles, so each one is hashed once.
+    def __missing__(self, shingle: str) -> tuple[int, ...]:
+        hashes = self[shingle] = _SHINGLE_HASHES.unpack(
+            hashlib.shake_128(shingle.encode("utf-8")).digest(_SHINGLE_HASHES.size)
+        )
+        return hashes
+
+
+def _signatures(texts: list[str]) -> list[tuple[int, ...]]:
+    shingle_hashes = _ShingleHashes()
+    signatures = []
+    for text in texts:
+        shingles = {text[start:start + SHINGLE_SIZE] for start in range(max(len(text) - SHINGLE_SIZE + 1, 1))}
+        hashes = list(map(shingle_hashes.__getitem__, shingles))
+        signatures.append(hashes[0] if len(hashes) == 1 else tuple(map(min, *hashes)))
+    return signatures
+
+
+class _DisjointSet:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, item: int) -> int:
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a: int, b: int) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def _cluster(signatures: list[tuple[int, ...]], similarity: float) -> _DisjointSet:
+    clusters = _DisjointSet(len(signatures))
+    required = similarity * NUM_PERMUTATIONS
+    for band in range(BANDS):
+        start = band * ROWS_PER_BAND
+        end = start + ROWS_PER_BAND
+        buckets: dict[tuple[int, ...], int] = {}
+        for idx, signature in enumerate(signatures):
+            # Each bucket member is checked against the bucket's first member only, which
+            # keeps a band linear even when many descriptions collide.
+            first = buckets.setdefault(signature[start:end], idx)
+            if first == idx or clusters.find(first) == clusters.find(idx):
+                continue
+            if sum(map(operator.eq, signatures[first], signature)) >= required:
+                clusters.union(first, idx)
+    return clusters
+
+
+def _common_pattern(texts: list[str]) -> Optional[str]:
+    # Runs of tokens found in nearly every text, preferring one the texts start with since
+    # descriptions lead with the merchant, then the longest. Runs never cross a digit, as
+    # digits are the reference numbers that vary: "dm fil.37372 karlsruhe" offers "dm fil."
+    # and "karlsruhe".
+    required = PATTERN_SUPPORT * len(texts)
+    shortest = min(texts, key=len)
+    candidates = []
+    for segment in _DIGITS_RE.split(shortest):
+        tokens = segment.split()
+        for start in range(len(tokens)):
+            for end in range(start + 1, len(tokens) + 1):
+                candidate = " ".join(tokens[start:end])
+                if len(candidate) >= MIN_PATTERN_LENGTH and any(char.isalpha() for char in candidate):
+                    candidates.append(candidate)
+    ranked = sorted(dict.fromkeys(candidates), key=lambda candidate: (not shortest.startswith(candidate), -len(candidate)))
+    for candidate in ranked:
+        if sum(candidate in text for text in texts) >= required:
+            return candidate
+    return None
+
+
+def _money(value: object) -> Decimal:
+    try:
+        return Decimal(str(value or "0"))
+    except InvalidOperation:
+        return Decimal(0)
+
+
+def suggest_rules(
+    unclassified: Iterable[tuple[str, object]],
+    labelled: Iterable[tuple[str, str]] = (),
+    *,
+    min_cluster_size: int = 3,
+    limit: int = 50,
+    similarity: float = 0.5,
+) -> list[RuleSuggestion]:
+    """Clusters ``(description, amount)`` rows and proposes one rule per cluster.
+
+    ``labelled`` holds ``(description, category_key)`` pairs of manually classified rows;
+    they join the clusters but only vote on the category.
+    """
+    # Rows whose descriptions match once digits are masked are one item from here on.
+    rows_by_key: dict[str, list[tuple[str, Decimal]]] = defaultdict(list)
+    for description, amount in unclassified:
+        text = normalize_dedupe_text(description)
+        if text:
+            rows_by_key[_DIGITS_RE.sub("#", text)].append((text, _money(amount)))
+    votes_by_key: dict[str, Counter[str]] = defaultdict(Counter)
+    for description, category_key in labelled:
+        text = normalize_dedupe_text(description)
+        if text and category_key:
+            votes_by_key[_DIGITS_RE.sub("#", text)][category_key] += 1
+
+    keys = list(rows_by_key) + [key for key in votes_by_key if key not in rows_by_key]
+    clusters = _cluster(_signatures(keys), similarity)
+
+    members: dict[int, list[str]] = defaultdict(list)
+    for idx, key in enumerate(keys):
+        members[clusters.find(idx)].append(key)
+
+    # Clusters that end up with the same pattern would create the same rule.
+    rows_by_pattern: dict[str, list[tuple[str, Decimal]]] = defaultdict(list)
+    votes_by_pattern: dict[str, Counter[str]] = defaultdict(Counter)
+    for cluster_keys in members.values():
+        rows = [row for key in cluster_keys for row in rows_by_key.get(key, ())]
+        if len(rows) < min_cluster_size:
+            continue
+        texts = list(dict.fromkeys(text for text, _ in rows))
+        pattern = _common_pattern(texts[::max(len(texts) // PATTERN_SAMPLE, 1)][:PATTERN_SAMPLE])
+        if pattern is None:
+            continue
+        rows_by_pattern[pattern].extend(rows)
+        for key in cluster_keys:
+            votes_by_pattern[pattern].update(votes_by_key.get(key, {}))
+
+    suggestions = []
+    for pattern, rows in rows_by_pattern.items():
+        votes = votes_by_pattern[pattern]
+        labelled_count = sum(votes.values())
+        category_key, category_votes = votes.most_common(1)[0] if votes else (None, 0)
+        suggestions.append(
+            RuleSuggestion(
+                pattern=pattern,
+                category_key=category_key,
+                category_confidence=category_votes / labelled_count if labelled_count else 0.0,
+                labelled=labelled_count,
+                count=len(rows),
+                matched=sum(1 for text, _ in rows if pattern in text),
+                signed_total=float(sum(amount for _, amount in rows)),
+                examples=tuple(dict.fromkeys(text for text, _ in rows[:20]))[:3],
+            )
+        )
+
+    suggestions.sort(key=lambda suggestion: (-suggestion.count, suggestion.pattern))
+    return suggestions[:limit]
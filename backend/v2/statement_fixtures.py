@@ -0,0 +1,193 @@
+"""Synthetic statement files shaped like the real exports of each supported source.
+
+Everything is generated from local templates and a seeded RNG, so the same
+``(source, rows, seed)`` always yields the same bytes.
+"""
+
+from __future__ import annotations
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Callable
+
+
+MERCHANTS = (
+    ("REWE Markt GmbH", "REWE SAGT DANKE {n}"),
+    ("EDEKA Center", "EDEKA CENTER KARTENZAHLUNG {n}"),
+    ("Lidl Vertriebs GmbH", "LIDL DIENSTLEISTUNG {n}"),
+    ("ALDI SUED", "ALDI SUED FILIALE {n}"),
+    ("dm-drogerie markt", "DM FIL.{n} KARLSRUHE"),
+    ("Amazon EU S.a.r.l.", "AMZN Mktp DE {n}"),
+    ("PayPal Europe", "PP.{n}.PP . SPOTIFY, Ihr Einkauf bei SPOTIFY"),
+    ("Deutsche Bahn AG", "DB Vertrieb GmbH Fahrkarte {n}"),
+    ("Shell Deutschland", "SHELL {n} TANKSTELLE"),
+    ("Stadtwerke Karlsruhe", "Abschlag Strom Kundennr. {n}"),
+    ("Vodafone GmbH", "Vodafone Rechnung {n}"),
+    ("Allianz Versicherungs-AG", "Beitrag Hausrat Vertrag {n}"),
+    ("Netflix International", "NETFLIX.COM {n}"),
+    ("Lufthansa", "LUFTHANSA TICKET {n}"),
+    ("IKEA Deutschland", "IKEA KARLSRUHE {n}"),
+    ("Apotheke am Markt", "APOTHEKE AM MARKT {n}"),
+    ("Arbeitgeber GmbH", "Gehalt {n}"),
+    ("Vermieter Schmidt", "Miete Wohnung {n}"),
+)
+
+
+def _german_amount(value: Decimal) -> str:
+    sign = "-" if value < 0 else ""
+    whole, cents = f"{abs(value):.2f}".split(".")
+    groups = []
+    while len(whole) > 3:
+        groups.insert(0, whole[-3:])
+        whole = whole[:-3]
+    groups.insert(0, whole)
+    return f"{sign}{'.'.join(groups)},{cents}"
+
+
+def _amount(rng: random.Random, merchant: str) -> Decimal:
+    if merchant == "Arbeitgeber GmbH":
+        return Decimal(rng.randint(250000, 480000)) / 100
+    if merchant == "Vermieter Schmidt":
+        return -Decimal(rng.randint(80000, 140000)) / 100
+    return -Decimal(rng.randint(99, 25000)) / 100
+
+
+def _rows(rows: int, seed: int, start: date, span_days: int) -> list[tuple[date, date, str, str, Decimal]]:
+    # Dates advance by a few bookings per day and wrap around after ``span_days``.
+    rng = random.Random(seed)
+    result = []
+    offset = 0
+    for _ in range(rows):
+        offset += rng.random() < 0.35
+        day = start + timedelta(days=offset % span_days)
+        merchant, template = rng.choice(MERCHANTS)
+        description = template.format(n=rng.randint(1000, 99999))
+        result.append((day, day + timedelta(days=rng.randint(0, 2)), merchant, description, _amount(rng, merchant)))
+    return result
+
+
+def dkb_giro_csv(rows: int, seed: int = 0) -> bytes:
+    lines = [
+        '"Konto";"Girokonto DE12 1203 0000 1234 5678 90"',
+        '""',
+        f'"Kontostand vom {date(2024, 12, 31):%d.%m.%Y}:";"1.234,56 €"',
+        '""',
+        '"Buchungsdatum";"Wertstellung";"Status";"Zahlungspflichtige*r";"Zahlungsempfänger*in";"Verwendungszweck";'
+        '"Umsatztyp";"IBAN";"Betrag (€)";"Gläubiger-ID";"Mandatsreferenz";"Kundenreferenz"',
+    ]
+    for booked, valued, merchant, description, amount in _rows(rows, seed, date(2022, 1, 1), 3 * 365):
+        incoming = amount > 0
+        lines.append(
+            ";".join(
+                f'"{cell}"'
+                for cell in (
+                    f"{booked:%d.%m.%y}",
+                    f"{valued:%d.%m.%y}",
+                    "Gebucht",
+                    merchant if incoming else "Max Mustermann",
+                    "Max Mustermann" if incoming else merchant,
+                    description,
+                    "Eingang" if incoming else "Ausgang",
+                    "DE89370400440532013000",
+                    _german_amount(amount),
+                    "",
+                    "",
+                    "",
+                )
+            )
+        )
+    return ("\n".join(lines) + "\n").encode("utf-8-sig")
+
+
+def revolut_csv(rows: int, seed: int = 0) -> bytes:
+    lines = ["Art,Produkt,Datum des Beginns,Datum des Abschlusses,Beschreibung,Betrag,Gebühr,Währung,Status,Saldo"]
+    balance = Decimal("1000.00")
+    rng = random.Random(seed + 1)
+    for booked, valued, merchant, _, amount in _rows(rows, seed, date(2022, 1, 1), 3 * 365):
+        balance += amount
+        started = f"{booked:%Y-%m-%d} {rng.randint(6, 22):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        finished = f"{valued:%Y-%m-%d} {rng.randint(6, 22):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        kind = "Überweisung" if amount > 0 else "Kartenzahlung"
+        description = merchant.replace(",", " ")
+        lines.append(f"{kind},Aktuell,{started},{finished},{description},{amount:.2f},0.00,EUR,ABGESCHLOSSEN,{balance:.2f}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+LINES_PER_PAGE = 60
+
+
+def _pdf_document(pages: list[list[str]]) -> bytes:
+    # Minimal single-font PDF; pdfplumber extracts each shown string as one text line.
+    objects: list[bytes] = [b""] * 2
+    objects[0] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+    kids = []
+    for lines in pages:
+        ops = ["BT /F1 8 Tf 36 810 Td 13 TL"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        content = "\n".join(ops).encode("cp1252")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 1 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, len(objects), xref)
+    return bytes(out)
+
+
+def _paginate(header: list[str], body: list[str], footer: str) -> list[list[str]]:
+    per_page = LINES_PER_PAGE - len(header) - 1
+    pages = []
+    for start in range(0, max(len(body), 1), per_page):
+        pages.append([*header, *body[start : start + per_page], footer.format(page=len(pages) + 1)])
+    return pages
+
+
+def amex_pdf(rows: int, seed: int = 0) -> bytes:
+    statement_date = date(2024, 12, 5)
+    header = ["American Express Gold Card", f"Monatsabrechnung vom {statement_date:%d.%m.%y}", "Umsätze Max Mustermann"]
+    body = ["Saldo des laufenden Monats 0,00"]
+    for booked, valued, _, description, amount in _rows(rows, seed, statement_date - timedelta(days=330), 328):
+        if amount > 0:
+            description, amount = "Zahlung/Überweisung erhalten", -amount
+        body.append(f"{booked:%d.%m} {valued:%d.%m} {description.upper()} {_german_amount(abs(amount))}")
+    return _pdf_document(_paginate(header, body, "Seite {page} American Express Europe S.A."))
+
+
+def deutsche_bank_credit_pdf(rows: int, seed: int = 0) -> bytes:
+    header = ["Deutsche Bank Miles & More Kreditkarte", "Kartenabrechnung", "Belegdatum Buchungsdatum Umsatz Betrag EUR"]
+    body = ["Saldo letzte Abrechnung 0,00"]
+    for booked, valued, _, description, amount in _rows(rows, seed, date(2024, 1, 1), 365):
+        body.append(f"{booked:%d.%m.%Y} {valued:%d.%m.%Y} {description} {_german_amount(amount)}")
+    return _pdf_document(_paginate(header, body, "Seite {page}"))
+
+
+GENERATORS: dict[str, Callable[..., bytes]] = {
+    "amex": amex_pdf,
+    "deutsche_bank_miles_more": deutsche_bank_credit_pdf,
+    "dkb_giro": dkb_giro_csv,
+    "revolut": revolut_csv,
+}
+
+
+def generate_statement(source: str, rows: int, seed: int = 0) -> bytes:
+    generator = GENERATORS.get(source)
+    if generator is None:
+        raise ValueError(f"No statement generator for source: {source}")
+    return generator(rows, seed)
@@ -2,14 +2,26 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
 import sqlite3
+import threading
+import zlib
+from collections import Counter
 from datetime import datetime, timezone
 from decimal import Decimal
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
-from .models import ClassificationSource, Transaction
+from .dedupe_filter import DedupeKeyFilter
+from .models import (
+    DEDUPE_KEY_BYTES,
+    ClassificationSource,
+    Transaction,
+    TransactionBatch,
+    counterparty_key,
+    label_features,
+)
 
 
 def init_v2_db(db_path: str | Path) -> None:
@@ -36,7 +48,7 @@ def init_v2_db(db_path: str | Path) -> None:
             CREATE TABLE IF NOT EXISTS v2_transactions (
                 id INTEGER PRIMARY KEY,
                 import_batch_id INTEGER,
-                dedupe_key TEXT,
+                dedupe_key BLOB,
                 budget_month TEXT,
                 booking_date TEXT,
                 value_date TEXT,
@@ -44,10 +56,10 @@ def init_v2_db(db_path: str | Path) -> None:
                 currency TEXT NOT NULL DEFAULT 'EUR',
                 description TEXT NOT NULL,
                 counterparty TEXT,
+                counterparty_key TEXT,
                 source TEXT,
                 source_account TEXT,
                 external_id TEXT,
-                raw_data TEXT NOT NULL DEFAULT '{}',
                 category_key TEXT,
                 classification_source TEXT NOT NULL DEFAULT 'unknown',
                 classification_rule_key TEXT,
@@ -58,19 +70,110 @@ def init_v2_db(db_path: str | Path) -> None:
             )
             """
         )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS v2_transaction_raw (
+                transaction_id INTEGER PRIMARY KEY,
+                data BLOB NOT NULL
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS v2_tx_delete_raw AFTER DELETE ON v2_transactions
+            BEGIN
+                DELETE FROM v2_transaction_raw WHERE transaction_id = OLD.id;
+            END
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS v2_import_jobs (
+                id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                filename TEXT,
+                upload_path TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                stage TEXT NOT NULL DEFAULT 'queued',
+                processed INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                import_batch_id INTEGER,
+                result TEXT,
+                error TEXT,
+                owner TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_v2_import_jobs_status ON v2_import_jobs (status)")
+        _ensure_column(cur, "v2_import_jobs", "heartbeat_at", "TEXT")
+        _ensure_column(cur, "v2_import_batches", "archived_at", "TEXT")
         _ensure_column(cur, "v2_transactions", "import_batch_id", "INTEGER")
-        _ensure_column(cur, "v2_transactions", "dedupe_key", "TEXT")
+        _ensure_column(cur, "v2_transactions", "dedupe_key", "BLOB")
         _ensure_column(cur, "v2_transactions", "budget_month", "TEXT")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_v2_tx_booking_date ON v2_transactions (booking_date)")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_v2_tx_budget_month ON v2_transactions (budget_month)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_v2_tx_category_key ON v2_transactions (category_key)")
+        # Covers the details drill-down: equality on category, range on month, rows already in
+        # display order and every output column in the index. It also makes a plain
+        # category_key index redundant.
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_v2_tx_category_month ON v2_transactions (
+                category_key, budget_month, value_date, booking_date, id,
+                amount, currency, description, counterparty, source
+            )
+            """
+        )
+        cur.execute("DROP INDEX IF EXISTS idx_v2_tx_category_key")
+        # Unclassified rows are exactly category_key IS NULL (blank keys are never stored), so
+        # the triage list and the bucket counts only ever touch this small partial index.
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_v2_tx_unclassified ON v2_transactions (budget_month, source, id)
+            WHERE category_key IS NULL
+            """
+        )
+        _migrate_counterparty_keys(conn)
+        # Triage groups of unclassified rows by counterparty, aggregated from the index alone.
+        # category_key is listed so SQLite treats the index as covering.
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_v2_tx_unclassified_counterparty ON v2_transactions (
+                counterparty_key, budget_month, source, booking_date, value_date, amount, category_key
+            )
+            WHERE category_key IS NULL
+            """
+        )
         cur.execute("CREATE INDEX IF NOT EXISTS idx_v2_tx_source ON v2_transactions (source)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_v2_tx_import_batch_id ON v2_transactions (import_batch_id)")
         cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_v2_tx_dedupe_key ON v2_transactions (dedupe_key)")
+        _migrate_dedupe_keys(conn)
+        _migrate_blank_category_keys(conn)
+        _migrate_label_counts(conn)
+        _migrate_raw_data(conn)
         conn.commit()
     finally:
         conn.close()
 
 
+def vacuum_v2_db(db_path: str | Path, *, timeout: float = 300.0) -> tuple[int, int]:
+    """Rebuild the database file; returns its size in bytes before and after.
+
+    Needs every other connection to finish first, so it waits up to ``timeout`` seconds for
+    them and belongs in ``python -m v2.vacuum``, never in worker start-up, where it would hold
+    the other workers past their default five second busy timeout.
+    """
+    before = Path(db_path).stat().st_size
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return before, Path(db_path).stat().st_size
+
+
 def _ensure_column(cur: sqlite3.Cursor, table_name: str, column_name: str, column_type: str) -> None:
     rows = cur.execute(f"PRAGMA table_info({table_name})").fetchall()
     existing = {row[1] for row in rows}
@@ -78,6 +181,258 @@ def _ensure_column(cur: sqlite3.Cursor, table_name: str, column_name: str, colum
         cur.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
 
 
+def _dedupe_blob(key: str) -> bytes:
+    try:
+        return bytes.fromhex(key)[:DEDUPE_KEY_BYTES]
+    except ValueError:
+        return hashlib.sha256(key.encode("utf-8")).digest()[:DEDUPE_KEY_BYTES]
+
+
+def _migrate_dedupe_keys(conn: sqlite3.Connection) -> None:
+    # Older databases hold 64-character hex keys as TEXT. TEXT sorts before every BLOB, so
+    # this probe is a single step on the unique index once everything has been converted.
+    if conn.execute("SELECT 1 FROM v2_transactions WHERE dedupe_key < x'' LIMIT 1").fetchone() is None:
+        return
+    conn.create_function("v2_dedupe_blob", 1, _dedupe_blob, deterministic=True)
+    conn.execute("UPDATE v2_transactions SET dedupe_key = v2_dedupe_blob(dedupe_key) WHERE typeof(dedupe_key) = 'text'")
+
+
+def _category_key(value: Optional[str]) -> Optional[str]:
+    return value if value and value.strip() else None
+
+
+def _migrate_blank_category_keys(conn: sqlite3.Connection) -> None:
+    # Older databases may hold "" or whitespace-only keys for unclassified rows. Such keys
+    # sort before "!", so the probe is a short range on idx_v2_tx_category_month.
+    blank = "category_key < '!' AND trim(category_key, char(32, 9, 10, 13)) = ''"
+    if conn.execute(f"SELECT 1 FROM v2_transactions WHERE {blank} LIMIT 1").fetchone() is None:
+        return
+    conn.execute(f"UPDATE v2_transactions SET category_key = NULL WHERE {blank}")
+
+
+def _migrate_counterparty_keys(conn: sqlite3.Connection) -> None:
+    # Older databases lack the column; add and fill it under one write lock so no row is
+    # left without a key.
+    def has_column() -> bool:
+        return any(row[1] == "counterparty_key" for row in conn.execute("PRAGMA table_info(v2_transactions)"))
+
+    if has_column():
+        return
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+        if has_column():
+            return
+    conn.execute("ALTER TABLE v2_transactions ADD COLUMN counterparty_key TEXT")
+    conn.create_function("v2_counterparty_key", 2, counterparty_key, deterministic=True)
+    conn.execute("UPDATE v2_transactions SET counterparty_key = v2_counterparty_key(counterparty, description)")
+
+
+# Features of labels counted before letterless tokens were left out; nearly every label
+# with a reference number produced one of them.
+_STALE_LABEL_FEATURES = (zlib.crc32(b"d #"), zlib.crc32(b"c #"))
+
+
+def _migrate_label_counts(conn: sqlite3.Connection) -> None:
+    # Per-category feature counts of manually classified rows, which the learned classifier
+    # is built from. They are kept up to date with every manual edit; a database that predates
+    # them, or holds counts of an older feature set, is counted once here.
+    def is_current() -> bool:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'v2_label_features'").fetchone() is None:
+            return False
+        # One primary key lookup per category.
+        stale = conn.execute(
+            """
+            SELECT 1 FROM v2_label_categories AS c
+            WHERE EXISTS (
+                SELECT 1 FROM v2_label_features AS f
+                WHERE f.category_key = c.category_key AND f.feature IN (?, ?)
+            )
+            LIMIT 1
+            """,
+            _STALE_LABEL_FEATURES,
+        ).fetchone()
+        return stale is None
+
+    if is_current():
+        return
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+        if is_current():
+            return
+    conn.execute("DROP TABLE IF EXISTS v2_label_categories")
+    conn.execute("DROP TABLE IF EXISTS v2_label_features")
+    conn.execute(
+        """
+        CREATE TABLE v2_label_categories (
+            category_key TEXT PRIMARY KEY,
+            documents INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE v2_label_features (
+            category_key TEXT NOT NULL,
+            feature INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (category_key, feature)
+        ) WITHOUT ROWID
+        """
+    )
+    labels = conn.execute(
+        "SELECT description, counterparty, category_key FROM v2_transactions WHERE classification_source = ?",
+        (ClassificationSource.MANUAL.value,),
+    )
+    _update_label_counts(conn, removed=(), added=labels)
+
+
+def _manual_labels(rows: Iterable[tuple[object, ...]]) -> list[tuple[str, Optional[str], str]]:
+    # (description, counterparty, category_key) of the manually classified rows among
+    # (description, counterparty, category_key, classification_source) rows.
+    return [
+        (description, counterparty, category_key)
+        for description, counterparty, category_key, classification_source in rows
+        if classification_source == ClassificationSource.MANUAL.value and category_key
+    ]
+
+
+def _update_label_counts(
+    conn: sqlite3.Connection,
+    *,
+    removed: Iterable[tuple[str, Optional[str], str]],
+    added: Iterable[tuple[str, Optional[str], str]],
+) -> None:
+    documents: Counter[str] = Counter()
+    features: Counter[tuple[str, int]] = Counter()
+    for sign, labels in ((-1, removed), (1, added)):
+        for description, counterparty, category_key in labels:
+            documents[category_key] += sign
+            for feature in label_features(description, counterparty):
+                features[category_key, feature] += sign
+    # Relabelling a row to the category it already has cancels out here.
+    conn.executemany(
+        """
+        INSERT INTO v2_label_categories (category_key, documents) VALUES (?, ?)
+        ON CONFLICT (category_key) DO UPDATE SET documents = documents + excluded.documents
+        """,
+        [(category_key, delta) for category_key, delta in documents.items() if delta],
+    )
+    conn.executemany(
+        """
+        INSERT INTO v2_label_features (category_key, feature, count) VALUES (?, ?, ?)
+        ON CONFLICT (category_key, feature) DO UPDATE SET count = count + excluded.count
+        """,
+        [(category_key, feature, delta) for (category_key, feature), delta in features.items() if delta],
+    )
+    conn.executemany(
+        "DELETE FROM v2_label_categories WHERE category_key = ? AND documents <= 0",
+        [(category_key,) for category_key, delta in documents.items() if delta < 0],
+    )
+    conn.executemany(
+        "DELETE FROM v2_label_features WHERE category_key = ? AND feature = ? AND count <= 0",
+        [key for key, delta in features.items() if delta < 0],
+    )
+
+
+# Preset zlib dictionary for the source row JSON: a few hundred bytes per row compress
+# poorly on their own, but most of each row is the same column names. Compressed rows
+# record this dictionary's checksum, so never edit it; add a second one instead.
+_RAW_ZDICT = "".join(
+    f'"{name}": "'
+    for name in (
+        "line",
+        "Art", "Produkt", "Datum des Beginns", "Datum des Abschlusses", "Beschreibung",
+        "Gebühr", "Währung", "Saldo",
+        "Betrag (€)", "Buchungsdatum", "Gläubiger-ID", "IBAN", "Kundenreferenz", "Mandatsreferenz",
+        "Status", "Umsatztyp", "Verwendungszweck", "Wertstellung", "Zahlungsempfänger*in",
+        "Zahlungspflichtige*r", "Betrag",
+    )
+).encode("utf-8")
+
+
+# Without ANALYZE the planner reads unclassified rows through the category_key IS NULL range
+# of the wide idx_v2_tx_category_month; the partial index is a fraction of its size and
+# already in budget month order.
+UNCLASSIFIED_TABLE_SQL = "v2_transactions INDEXED BY idx_v2_tx_unclassified"
+
+
+def budget_period_sql(year: Optional[str], month: Optional[str]) -> tuple[list[str], list[object]]:
+    # Budget months are always "YYYY-MM": a year is a prefix range and a year plus month an
+    # equality, both seekable on idx_v2_tx_budget_month. Only a month across all years needs
+    # substr() and therefore a scan.
+    if year and month:
+        return ["budget_month = ?"], [f"{year}-{month.zfill(2)}"]
+    if year:
+        return ["budget_month >= ?", "budget_month < ?"], [f"{year}-", f"{year}."]
+    if month:
+        return ["substr(budget_month, 6, 2) = ?"], [month.zfill(2)]
+    return [], []
+
+
+def _compress_raw(raw_json: str) -> bytes:
+    compressor = zlib.compressobj(zdict=_RAW_ZDICT)
+    return compressor.compress(raw_json.encode("utf-8")) + compressor.flush()
+
+
+def _decompress_raw(data: Optional[bytes]) -> dict[str, object]:
+    if not data:
+        return {}
+    decompressor = zlib.decompressobj(zdict=_RAW_ZDICT)
+    return json.loads(decompressor.decompress(data) + decompressor.flush())
+
+
+def _migrate_raw_data(conn: sqlite3.Connection) -> bool:
+    # Older databases keep the source row JSON inline in v2_transactions. Move it into the
+    # compressed side table once and drop the column, which rewrites the main table. The
+    # file only shrinks once rebuilt with ``python -m v2.vacuum``.
+    def has_raw_column() -> bool:
+        return any(row[1] == "raw_data" for row in conn.execute("PRAGMA table_info(v2_transactions)"))
+
+    if not has_raw_column():
+        return False
+    if not conn.in_transaction:
+        # Another worker may be migrating the same file; re-check under the write lock.
+        conn.execute("BEGIN IMMEDIATE")
+        if not has_raw_column():
+            return False
+    conn.create_function("v2_compress_raw", 1, _compress_raw, deterministic=True)
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO v2_transaction_raw (transaction_id, data)
+        SELECT id, v2_compress_raw(raw_data)
+        FROM v2_transactions
+        WHERE raw_data IS NOT NULL AND raw_data <> '{}'
+        """
+    )
+    conn.execute("ALTER TABLE v2_transactions DROP COLUMN raw_data")
+    return True
+
+
+DEDUPE_FILTER_MIN_CAPACITY = 100_000
+
+_DEDUPE_FILTERS: dict[str, DedupeKeyFilter] = {}
+_DEDUPE_FILTERS_LOCK = threading.Lock()
+
+_INSERT_SQL = """
+    INSERT OR IGNORE INTO v2_transactions (
+        import_batch_id, dedupe_key, budget_month,
+        booking_date, value_date, amount, currency, description, counterparty, counterparty_key,
+        source, source_account, external_id, category_key,
+        classification_source, classification_rule_key, classification_confidence,
+        created_at, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Everything but raw_data, which lives compressed in v2_transaction_raw and is only read
+# for a single transaction.
+_TRANSACTION_COLUMNS = """
+    id, import_batch_id, dedupe_key, budget_month, booking_date, value_date, amount, currency,
+    description, counterparty, source, source_account, external_id, category_key,
+    classification_source, classification_rule_key, classification_confidence,
+    created_at, updated_at
+"""
+
+
 class DuplicateImportError(Exception):
     def __init__(self, import_batch_id: int):
         super().__init__("Import file was already processed")
@@ -122,63 +477,223 @@ class TransactionRepository:
         finally:
             conn.close()
 
-    def update_import_batch_counts(self, import_batch_id: int, inserted_count: int, duplicate_count: int) -> None:
+    def find_import_batch(self, source: str, file_hash: str) -> Optional[int]:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute(
+                "SELECT id FROM v2_import_batches WHERE source = ? AND file_hash = ?",
+                (source, file_hash),
+            ).fetchone()
+            return int(row[0]) if row else None
+        finally:
+            conn.close()
+
+    def update_import_batch_counts(
+        self,
+        import_batch_id: int,
+        inserted_count: int,
+        duplicate_count: int,
+        transaction_count: Optional[int] = None,
+    ) -> None:
         conn = sqlite3.connect(self.db_path)
         try:
             conn.execute(
                 """
                 UPDATE v2_import_batches
-                SET inserted_count = ?, duplicate_count = ?
+                SET inserted_count = ?,
+                    duplicate_count = ?,
+                    transaction_count = COALESCE(?, transaction_count)
                 WHERE id = ?
                 """,
-                (inserted_count, duplicate_count, import_batch_id),
+                (inserted_count, duplicate_count, transaction_count, import_batch_id),
             )
             conn.commit()
         finally:
             conn.close()
 
-    def insert(self, transaction: Transaction) -> Optional[int]:
-        transaction.prepare_for_import()
-        transaction.touch_for_insert()
+    def list_import_batches(self, *, source: str | None = None, limit: int = 200, offset: int = 0) -> list[dict[str, object]]:
+        where_sql = " WHERE b.source = ?" if source else ""
+        params: list[object] = [source] if source else []
+        params.extend([limit, offset])
+
         conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
         try:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                INSERT OR IGNORE INTO v2_transactions (
-                    import_batch_id, dedupe_key, budget_month,
-                    booking_date, value_date, amount, currency, description, counterparty,
-                    source, source_account, external_id, raw_data, category_key,
-                    classification_source, classification_rule_key, classification_confidence,
-                    created_at, updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            rows = conn.execute(
+                f"""
+                SELECT b.id, b.source, b.filename, b.file_hash, b.imported_at,
+                       b.transaction_count, b.inserted_count, b.duplicate_count, b.archived_at,
+                       (
+                           SELECT COUNT(*)
+                           FROM v2_transactions t
+                           WHERE t.import_batch_id = b.id
+                       ) AS current_count
+                FROM v2_import_batches b
+                {where_sql}
+                ORDER BY b.id DESC
+                LIMIT ? OFFSET ?
                 """,
-                (
-                    transaction.import_batch_id,
-                    transaction.dedupe_key,
-                    transaction.budget_month,
-                    transaction.booking_date,
-                    transaction.value_date,
-                    str(transaction.amount),
-                    transaction.currency,
-                    transaction.description,
-                    transaction.counterparty,
-                    transaction.source,
-                    transaction.source_account,
-                    transaction.external_id,
-                    json.dumps(transaction.raw_data, ensure_ascii=False, sort_keys=True),
-                    transaction.category_key,
-                    transaction.classification_source.value,
-                    transaction.classification_rule_key,
-                    transaction.classification_confidence,
-                    transaction.created_at,
-                    transaction.updated_at,
-                ),
+                params,
+            ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def get_import_batch(self, import_batch_id: int) -> dict[str, object] | None:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute("SELECT * FROM v2_import_batches WHERE id = ?", (import_batch_id,)).fetchone()
+            return dict(row) if row is not None else None
+        finally:
+            conn.close()
+
+    def mark_import_batch_archived(self, import_batch_id: int) -> None:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(
+                "UPDATE v2_import_batches SET archived_at = ? WHERE id = ?",
+                (datetime.now(timezone.utc).isoformat(), import_batch_id),
             )
             conn.commit()
-            if cur.rowcount == 0:
-                return None
-            return int(cur.lastrowid)
+        finally:
+            conn.close()
+
+    def batch_transactions(self, import_batch_id: int) -> list[dict[str, object]]:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute(
+                """
+                SELECT id, dedupe_key, booking_date, amount, description,
+                       category_key, classification_source
+                FROM v2_transactions
+                WHERE import_batch_id = ?
+                ORDER BY id
+                """,
+                (import_batch_id,),
+            ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def apply_batch_replay(
+        self,
+        import_batch_id: int,
+        *,
+        delete_ids: list[int],
+        transactions: list[Transaction],
+        transaction_count: int,
+    ) -> list[Optional[int]]:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                cur = conn.cursor()
+                removed = _manual_labels(self._label_rows(conn, delete_ids).values())
+                cur.executemany("DELETE FROM v2_transactions WHERE id = ?", [(tx_id,) for tx_id in delete_ids])
+                for transaction in transactions:
+                    transaction.import_batch_id = import_batch_id
+                    transaction.prepare_for_import()
+                    transaction.touch_for_insert()
+                inserted_ids = self._insert_rows(
+                    cur,
+                    [self._insert_params(transaction) for transaction in transactions],
+                    [transaction.dedupe_key for transaction in transactions],
+                    [self._raw_json(transaction) for transaction in transactions],
+                )
+                # Replays carry manual categories over onto the re-parsed rows.
+                added = _manual_labels(
+                    (transaction.description, transaction.counterparty, transaction.category_key, transaction.classification_source.value)
+                    for transaction, inserted_id in zip(transactions, inserted_ids)
+                    if inserted_id is not None
+                )
+                _update_label_counts(conn, removed=removed, added=added)
+                cur.execute(
+                    """
+                    UPDATE v2_import_batches
+                    SET transaction_count = ?,
+                        inserted_count = (SELECT COUNT(*) FROM v2_transactions WHERE import_batch_id = ?)
+                    WHERE id = ?
+                    """,
+                    (transaction_count, import_batch_id, import_batch_id),
+                )
+            return inserted_ids
+        finally:
+            conn.close()
+
+    def rollback_import_batch(self, import_batch_id: int) -> Optional[int]:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                existing = conn.execute(
+                    "SELECT id FROM v2_import_batches WHERE id = ?",
+                    (import_batch_id,),
+                ).fetchone()
+                if existing is None:
+                    return None
+                removed = conn.execute(
+                    """
+                    SELECT description, counterparty, category_key
+                    FROM v2_transactions
+                    WHERE import_batch_id = ? AND classification_source = ?
+                    """,
+                    (import_batch_id, ClassificationSource.MANUAL.value),
+                ).fetchall()
+                _update_label_counts(conn, removed=removed, added=())
+                cur = conn.execute(
+                    "DELETE FROM v2_transactions WHERE import_batch_id = ?",
+                    (import_batch_id,),
+                )
+                deleted = cur.rowcount
+                conn.execute("DELETE FROM v2_import_batches WHERE id = ?", (import_batch_id,))
+            return deleted
+        finally:
+            conn.close()
+
+    def insert(self, transaction: Transaction) -> Optional[int]:
+        return self.insert_many([transaction])[0]
+
+    def insert_many(self, transactions: list[Transaction]) -> list[Optional[int]]:
+        for transaction in transactions:
+            transaction.prepare_for_import()
+            transaction.touch_for_insert()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                return self._insert_rows(
+                    conn.cursor(),
+                    [self._insert_params(transaction) for transaction in transactions],
+                    [transaction.dedupe_key for transaction in transactions],
+                    [self._raw_json(transaction) for transaction in transactions],
+                )
+        finally:
+            conn.close()
+
+    def known_dedupe_keys(self, dedupe_keys: Iterable[Optional[bytes]]) -> set[bytes]:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            # Only keys the filter cannot rule out need the batched lookup; INSERT OR IGNORE
+            # still catches anything written by another process since the filter was built.
+            dedupe_filter = self._dedupe_filter(conn)
+            return self._existing_dedupe_keys(
+                conn,
+                [key for key in dedupe_keys if key is not None and dedupe_filter.might_contain(key)],
+            )
+        finally:
+            conn.close()
+
+    def insert_batch(self, batch: TransactionBatch) -> list[Optional[int]]:
+        batch.prepare_for_import()
+        batch.touch_for_insert()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                return self._insert_rows(
+                    conn.cursor(),
+                    self._batch_insert_params(batch),
+                    batch.dedupe_key,
+                    batch.raw_data,
+                )
         finally:
             conn.close()
 
@@ -187,7 +702,12 @@ class TransactionRepository:
         conn.row_factory = sqlite3.Row
         try:
             row = conn.execute(
-                "SELECT * FROM v2_transactions WHERE id = ?",
+                f"""
+                SELECT {_TRANSACTION_COLUMNS},
+                       (SELECT data FROM v2_transaction_raw WHERE transaction_id = v2_transactions.id) AS raw_data
+                FROM v2_transactions
+                WHERE id = ?
+                """,
                 (transaction_id,),
             ).fetchone()
             if row is None:
@@ -196,6 +716,24 @@ class TransactionRepository:
         finally:
             conn.close()
 
+    def get_raw_data(self, transaction_id: int) -> dict[str, object] | None:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute(
+                """
+                SELECT r.data
+                FROM v2_transactions t
+                LEFT JOIN v2_transaction_raw r ON r.transaction_id = t.id
+                WHERE t.id = ?
+                """,
+                (transaction_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            return _decompress_raw(row[0])
+        finally:
+            conn.close()
+
     def list(
         self,
         *,
@@ -207,30 +745,13 @@ class TransactionRepository:
         limit: int = 500,
         offset: int = 0,
     ) -> list[dict[str, object]]:
-        where = []
-        params: list[object] = []
-
-        if budget_month:
-            where.append("budget_month = ?")
-            params.append(budget_month)
-        else:
-            if year:
-                where.append("substr(budget_month, 1, 4) = ?")
-                params.append(year)
-            if month:
-                where.append("substr(budget_month, 6, 2) = ?")
-                params.append(month.zfill(2))
-
-        if source:
-            where.append("source = ?")
-            params.append(source)
-
-        if classified == "classified":
-            where.append("category_key IS NOT NULL AND TRIM(category_key) <> ''")
-        elif classified == "unclassified":
-            where.append("(category_key IS NULL OR TRIM(category_key) = '')")
-
-        where_sql = " WHERE " + " AND ".join(where) if where else ""
+        where_sql, params = self._filter_sql(
+            year=year,
+            month=month,
+            budget_month=budget_month,
+            source=source,
+            classified=classified,
+        )
         params.extend([limit, offset])
 
         conn = sqlite3.connect(self.db_path)
@@ -238,8 +759,8 @@ class TransactionRepository:
         try:
             rows = conn.execute(
                 f"""
-                SELECT *
-                FROM v2_transactions
+                SELECT {_TRANSACTION_COLUMNS}
+                FROM {self._table_sql(classified)}
                 {where_sql}
                 ORDER BY budget_month DESC, booking_date DESC, id DESC
                 LIMIT ? OFFSET ?
@@ -250,45 +771,364 @@ class TransactionRepository:
         finally:
             conn.close()
 
-    def set_manual_category(self, transaction_id: int, category_key: str | None) -> bool:
-        now = datetime.now(timezone.utc).isoformat()
+    def list_ids(
+        self,
+        *,
+        year: str | None = None,
+        month: str | None = None,
+        budget_month: str | None = None,
+        source: str | None = None,
+        classified: str = "all",
+    ) -> list[int]:
+        where_sql, params = self._filter_sql(
+            year=year,
+            month=month,
+            budget_month=budget_month,
+            source=source,
+            classified=classified,
+        )
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute(
+                f"SELECT id FROM {self._table_sql(classified)}{where_sql} ORDER BY id",
+                params,
+            ).fetchall()
+            return [int(row[0]) for row in rows]
+        finally:
+            conn.close()
+
+    def unclassified_descriptions(self) -> list[tuple[str, str]]:
+        # (description, amount) of every unclassified transaction, for rule suggestions.
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(
+                f"SELECT description, amount FROM {UNCLASSIFIED_TABLE_SQL} WHERE category_key IS NULL"
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def manual_labels(self) -> list[tuple[str, Optional[str], str]]:
+        # (description, counterparty, category_key) of every manually classified transaction.
         conn = sqlite3.connect(self.db_path)
         try:
-            cur = conn.execute(
+            return conn.execute(
                 """
-                UPDATE v2_transactions
-                SET category_key = ?,
-                    classification_source = ?,
-                    classification_rule_key = NULL,
-                    classification_confidence = ?,
-                    updated_at = ?
-                WHERE id = ?
+                SELECT description, counterparty, category_key
+                FROM v2_transactions
+                WHERE classification_source = ? AND category_key IS NOT NULL
                 """,
-                (
-                    category_key,
-                    ClassificationSource.MANUAL.value if category_key else ClassificationSource.UNKNOWN.value,
-                    1.0 if category_key else 0.0,
-                    now,
-                    transaction_id,
-                ),
-            )
-            conn.commit()
-            return cur.rowcount > 0
+                (ClassificationSource.MANUAL.value,),
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def label_counts(self) -> tuple[list[tuple[str, int]], list[tuple[str, int, int]]]:
+        # (category_key, documents) and (category_key, feature, count) of the manual labels.
+        conn = sqlite3.connect(self.db_path)
+        try:
+            documents = conn.execute("SELECT category_key, documents FROM v2_label_categories").fetchall()
+            features = conn.execute("SELECT category_key, feature, count FROM v2_label_features").fetchall()
+            return documents, features
+        finally:
+            conn.close()
+
+    def set_manual_category(self, transaction_id: int, category_key: str | None) -> bool:
+        category_key = _category_key(category_key)
+        now = datetime.now(timezone.utc).isoformat()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                rows = self._label_rows(conn, [transaction_id])
+                if not rows:
+                    return False
+                conn.execute(
+                    """
+                    UPDATE v2_transactions
+                    SET category_key = ?,
+                        classification_source = ?,
+                        classification_rule_key = NULL,
+                        classification_confidence = ?,
+                        updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (
+                        category_key,
+                        ClassificationSource.MANUAL.value if category_key else ClassificationSource.UNKNOWN.value,
+                        1.0 if category_key else 0.0,
+                        now,
+                        transaction_id,
+                    ),
+                )
+                self._relabel(conn, rows.values(), category_key)
+            return True
         finally:
             conn.close()
 
     def delete(self, transaction_id: int) -> bool:
         conn = sqlite3.connect(self.db_path)
         try:
-            cur = conn.execute(
-                "DELETE FROM v2_transactions WHERE id = ?",
-                (transaction_id,),
-            )
-            conn.commit()
-            return cur.rowcount > 0
+            with conn:
+                rows = self._label_rows(conn, [transaction_id])
+                if not rows:
+                    return False
+                conn.execute(
+                    "DELETE FROM v2_transactions WHERE id = ?",
+                    (transaction_id,),
+                )
+                _update_label_counts(conn, removed=_manual_labels(rows.values()), added=())
+            return True
+        finally:
+            conn.close()
+
+    def set_manual_category_many(self, transaction_ids: list[int], category_key: str | None) -> dict[int, bool]:
+        category_key = _category_key(category_key)
+        now = datetime.now(timezone.utc).isoformat()
+        classification_source = ClassificationSource.MANUAL.value if category_key else ClassificationSource.UNKNOWN.value
+        confidence = 1.0 if category_key else 0.0
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                existing = self._label_rows(conn, transaction_ids)
+                conn.executemany(
+                    """
+                    UPDATE v2_transactions
+                    SET category_key = ?,
+                        classification_source = ?,
+                        classification_rule_key = NULL,
+                        classification_confidence = ?,
+                        updated_at = ?
+                    WHERE id = ?
+                    """,
+                    [
+                        (category_key, classification_source, confidence, now, transaction_id)
+                        for transaction_id in sorted(existing)
+                    ],
+                )
+                self._relabel(conn, existing.values(), category_key)
+            return {transaction_id: transaction_id in existing for transaction_id in transaction_ids}
+        finally:
+            conn.close()
+
+    def classify_counterparty(self, counterparty_key: str, category_key: str) -> int:
+        # Manually classifies every unclassified transaction of one triage group.
+        category_key = _category_key(category_key)
+        now = datetime.now(timezone.utc).isoformat()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                rows = conn.execute(
+                    """
+                    SELECT description, counterparty, category_key, classification_source
+                    FROM v2_transactions
+                    WHERE category_key IS NULL AND counterparty_key = ?
+                    """,
+                    (counterparty_key,),
+                ).fetchall()
+                cur = conn.execute(
+                    """
+                    UPDATE v2_transactions
+                    SET category_key = ?,
+                        classification_source = ?,
+                        classification_rule_key = NULL,
+                        classification_confidence = 1.0,
+                        updated_at = ?
+                    WHERE category_key IS NULL AND counterparty_key = ?
+                    """,
+                    (category_key, ClassificationSource.MANUAL.value, now, counterparty_key),
+                )
+                self._relabel(conn, rows, category_key)
+            return cur.rowcount
+        finally:
+            conn.close()
+
+    def delete_many(self, transaction_ids: list[int]) -> dict[int, bool]:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                existing = self._label_rows(conn, transaction_ids)
+                conn.executemany(
+                    "DELETE FROM v2_transactions WHERE id = ?",
+                    [(transaction_id,) for transaction_id in sorted(existing)],
+                )
+                _update_label_counts(conn, removed=_manual_labels(existing.values()), added=())
+            return {transaction_id: transaction_id in existing for transaction_id in transaction_ids}
         finally:
             conn.close()
 
+    @staticmethod
+    def _label_rows(
+        conn: sqlite3.Connection, transaction_ids: list[int], chunk_size: int = 500
+    ) -> dict[int, tuple[str, Optional[str], Optional[str], str]]:
+        # (description, counterparty, category_key, classification_source) of the existing
+        # rows, which label count updates need from before the change.
+        unique_ids = sorted(set(transaction_ids))
+        existing: dict[int, tuple[str, Optional[str], Optional[str], str]] = {}
+        for start in range(0, len(unique_ids), chunk_size):
+            chunk = unique_ids[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"""
+                SELECT id, description, counterparty, category_key, classification_source
+                FROM v2_transactions
+                WHERE id IN ({placeholders})
+                """,
+                chunk,
+            ).fetchall()
+            existing.update((int(row[0]), row[1:]) for row in rows)
+        return existing
+
+    @staticmethod
+    def _relabel(
+        conn: sqlite3.Connection,
+        rows: Iterable[tuple[str, Optional[str], Optional[str], str]],
+        category_key: Optional[str],
+    ) -> None:
+        rows = list(rows)
+        added = [(description, counterparty, category_key) for description, counterparty, _, _ in rows] if category_key else []
+        _update_label_counts(conn, removed=_manual_labels(rows), added=added)
+
+    @staticmethod
+    def _table_sql(classified: str) -> str:
+        return UNCLASSIFIED_TABLE_SQL if classified == "unclassified" else "v2_transactions"
+
+    @staticmethod
+    def _filter_sql(
+        *,
+        year: str | None = None,
+        month: str | None = None,
+        budget_month: str | None = None,
+        source: str | None = None,
+        classified: str = "all",
+    ) -> tuple[str, list[object]]:
+        where = []
+        params: list[object] = []
+
+        if budget_month:
+            where.append("budget_month = ?")
+            params.append(budget_month)
+        else:
+            where, params = budget_period_sql(year, month)
+
+        if source:
+            where.append("source = ?")
+            params.append(source)
+
+        if classified == "classified":
+            where.append("category_key IS NOT NULL")
+        elif classified == "unclassified":
+            where.append("category_key IS NULL")
+
+        where_sql = " WHERE " + " AND ".join(where) if where else ""
+        return where_sql, params
+
+    def _insert_rows(
+        self,
+        cur: sqlite3.Cursor,
+        params: Iterable[tuple[object, ...]],
+        dedupe_keys: list[Optional[bytes]],
+        raw_data: list[str],
+    ) -> list[Optional[int]]:
+        # executemany() does not report per-row ids, so take the write lock up front and read
+        # back every row added above the previous maximum id; INSERT OR IGNORE skipped the rest.
+        if not cur.connection.in_transaction:
+            cur.execute("BEGIN IMMEDIATE")
+        last_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM v2_transactions").fetchone()[0]
+        cur.executemany(_INSERT_SQL, params)
+        new_ids = dict(cur.execute("SELECT dedupe_key, id FROM v2_transactions WHERE id > ?", (last_id,)).fetchall())
+        self._dedupe_filter(cur.connection).add_many(key for key in new_ids if key is not None)
+        # A key repeated within the same insert belongs to its first occurrence only.
+        inserted_ids = [new_ids.pop(key, None) for key in dedupe_keys]
+        cur.executemany(
+            "INSERT OR REPLACE INTO v2_transaction_raw (transaction_id, data) VALUES (?, ?)",
+            [
+                (inserted_id, _compress_raw(raw_json))
+                for inserted_id, raw_json in zip(inserted_ids, raw_data)
+                if inserted_id is not None and raw_json != "{}"
+            ],
+        )
+        return inserted_ids
+
+    def _dedupe_filter(self, conn: sqlite3.Connection) -> DedupeKeyFilter:
+        # One filter per database and process, built from the stored keys on first use and
+        # rebuilt larger once it holds more keys than it was sized for.
+        with _DEDUPE_FILTERS_LOCK:
+            dedupe_filter = _DEDUPE_FILTERS.get(self.db_path)
+            if dedupe_filter is None or dedupe_filter.full:
+                stored = conn.execute("SELECT COUNT(*) FROM v2_transactions").fetchone()[0]
+                dedupe_filter = DedupeKeyFilter(capacity=max(2 * stored, DEDUPE_FILTER_MIN_CAPACITY))
+                dedupe_filter.add_many(
+                    row[0]
+                    for row in conn.execute("SELECT dedupe_key FROM v2_transactions WHERE dedupe_key IS NOT NULL")
+                )
+                _DEDUPE_FILTERS[self.db_path] = dedupe_filter
+            return dedupe_filter
+
+    @staticmethod
+    def _existing_dedupe_keys(conn: sqlite3.Connection, keys: list[bytes], chunk_size: int = 500) -> set[bytes]:
+        unique_keys = list(set(keys))
+        existing: set[bytes] = set()
+        for start in range(0, len(unique_keys), chunk_size):
+            chunk = unique_keys[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT dedupe_key FROM v2_transactions WHERE dedupe_key IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            existing.update(row[0] for row in rows)
+        return existing
+
+    @staticmethod
+    def _batch_insert_params(batch: TransactionBatch) -> Iterator[tuple[object, ...]]:
+        return zip(
+            batch.import_batch_id,
+            batch.dedupe_key,
+            batch.budget_month,
+            batch.booking_date,
+            batch.value_date,
+            map(str, batch.amount),
+            batch.currency,
+            batch.description,
+            batch.counterparty,
+            map(counterparty_key, batch.counterparty, batch.description),
+            batch.source,
+            batch.source_account,
+            batch.external_id,
+            map(_category_key, batch.category_key),
+            (source.value for source in batch.classification_source),
+            batch.classification_rule_key,
+            batch.classification_confidence,
+            batch.created_at,
+            batch.updated_at,
+        )
+
+    @staticmethod
+    def _insert_params(transaction: Transaction) -> tuple[object, ...]:
+        return (
+            transaction.import_batch_id,
+            transaction.dedupe_key,
+            transaction.budget_month,
+            transaction.booking_date,
+            transaction.value_date,
+            str(transaction.amount),
+            transaction.currency,
+            transaction.description,
+            transaction.counterparty,
+            counterparty_key(transaction.counterparty, transaction.description),
+            transaction.source,
+            transaction.source_account,
+            transaction.external_id,
+            _category_key(transaction.category_key),
+            transaction.classification_source.value,
+            transaction.classification_rule_key,
+            transaction.classification_confidence,
+            transaction.created_at,
+            transaction.updated_at,
+        )
+
+    @staticmethod
+    def _raw_json(transaction: Transaction) -> str:
+        return json.dumps(transaction.raw_data, ensure_ascii=False, sort_keys=True)
+
     @staticmethod
     def _row_to_transaction(row: sqlite3.Row) -> Transaction:
         return Transaction(
@@ -304,7 +1144,7 @@ class TransactionRepository:
             source=row["source"],
             source_account=row["source_account"],
             external_id=row["external_id"],
-            raw_data=json.loads(row["raw_data"] or "{}"),
+            raw_data=_decompress_raw(row["raw_data"]),
             category_key=row["category_key"],
             classification_source=ClassificationSource(row["classification_source"]),
             classification_rule_key=row["classification_rule_key"],
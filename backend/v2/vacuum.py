@@ -0,0 +1,49 @@
+"""Rebuild the v2 SQLite database file to give back the space freed by migrations.
+
+Run from the backend directory, preferably while nothing is importing::
+
+    python -m v2.vacuum                    # DB_PATH, or transactions.db in DATA_DIR
+    python -m v2.vacuum --timeout 900      # wait longer for other connections to finish
+
+Moving ``raw_data`` into ``v2_transaction_raw`` leaves the pages of ``v2_transactions``
+half empty. The app no longer rebuilds the file on start-up, where it would lock the
+other gunicorn workers out, so run this once after upgrading an older database.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+from typing import Optional
+
+from .storage import init_v2_db, vacuum_v2_db
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    data_dir = os.getenv("DATA_DIR", BACKEND_DIR)
+    parser = argparse.ArgumentParser(description="Rebuild the v2 database file with VACUUM.")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", os.path.join(data_dir, "transactions.db")))
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for other connections")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"no database at {args.db}")
+    try:
+        # Runs the pending migrations first, so a database that was never opened by the
+        # current app is migrated and compacted in one go.
+        init_v2_db(args.db)
+        before, after = vacuum_v2_db(args.db, timeout=args.timeout)
+    except sqlite3.OperationalError as e:
+        print(f"vacuum failed: {e}", file=sys.stderr)
+        return 1
+    print(f"{args.db}: {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())